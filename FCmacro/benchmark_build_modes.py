@@ -0,0 +1,67 @@
+import FreeCAD as App
+
+import argparse
+import copy
+import json
+import time
+
+from freecad_functions import drawPcb, updatePartFromDiff
+
+"""
+    Benchmark of board build modes ("Sketch", "Partitioned" and "Fast"): time to draw pcb and to apply a diff moving footprints
+    Run with FreeCAD python, e.g.:
+        FreeCADCmd -c "import sys; sys.path.append('<FCmacro dir>'); import benchmark_build_modes; benchmark_build_modes.main(['data_indent.json'])"
+"""
+
+
+def getMoveDiff(pcb, count, distance):
+    """Returns diff dictionary moving first count footprints by distance (nm) in x"""
+    changed = []
+    for footprint in pcb["footprints"][:count]:
+        pos = [footprint["pos"][0] + distance, footprint["pos"][1]]
+        changed.append({footprint["kiid"]: [["pos", pos]]})
+
+    return {"footprints": {"changed": changed}}
+
+
+def benchmarkMode(pcb, build_mode, moved):
+    """
+    Draw pcb in new document and apply move diff
+    :return: dict of timings in seconds
+    """
+    pcb = copy.deepcopy(pcb)
+    doc = App.newDocument(f"Benchmark_{build_mode}")
+    try:
+        start = time.perf_counter()
+        drawPcb(doc=doc, doc_gui=None, pcb=pcb, MODELS_PATH="", build_mode=build_mode)
+        draw_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        updatePartFromDiff(doc, pcb, getMoveDiff(pcb, moved, 1000000))
+        doc.recompute()
+        diff_time = time.perf_counter() - start
+    finally:
+        App.closeDocument(doc.Name)
+
+    return {"draw": draw_time, "apply_move_diff": diff_time}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare board build modes")
+    parser.add_argument("snapshot", help="pcb dictionary JSON file")
+    parser.add_argument("--moved", type=int, default=10, help="number of footprints moved by diff")
+    args = parser.parse_args(argv)
+
+    with open(args.snapshot, "r") as f:
+        pcb = json.load(f)
+    # Models are not part of board build, leave them out
+    for footprint in pcb.get("footprints") or []:
+        footprint["3d_models"] = None
+
+    results = {mode: benchmarkMode(pcb, mode, args.moved) for mode in ("Sketch", "Partitioned", "Fast")}
+
+    print(f"{'mode':<12}{'draw [s]':>12}{'move diff [s]':>16}")
+    for mode, result in results.items():
+        print(f"{mode:<12}{result['draw']:>12.3f}{result['apply_move_diff']:>16.3f}")
+
+    return results
@@ -1,9 +1,21 @@
+import os
+
 # System path to .step files
 MODELS_PATH = u"C:/Program Files/KiCad/7.0/share/kicad/3dmodels"
+# Directory and size limit (bytes) of converted 3D model cache
+MODEL_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".kc2fc", "model_cache")
+MODEL_CACHE_SIZE = 2 * 1024 ** 3
+# Number of FreeCADCmd processes converting models in parallel before drawing pcb (0 disables preloading)
+PRELOAD_WORKERS = os.cpu_count()
+# Draw placeholder boxes first and load 3D models in background, placeholder height in mm
+LAZY_MODELS = True
+PLACEHOLDER_HEIGHT = 1.0
+# Apply received diffs automatically (otherwise queued until "Apply diff" is clicked)
+AUTO_APPLY_DIFFS = False
 # Host IP and port number selection
 HOST = "localhost"
 STARTING_PORT = 5050
-# Socket initial message length
-HEADER = 8
+# Socket message header length (type and length of message, see framing.py)
+HEADER = 16
 # Socket encoding format
 FORMAT = "utf-8"
\ No newline at end of file
@@ -4,6 +4,8 @@ import Sketcher
 
 import math
 
+from utils import FreeCADVector
+
 """
     Functions for adding constrints to FC Sketch
     Constraints in Sketch are named by type_tag, where tag in .Tag attribute of geometry being constrained.
@@ -32,16 +34,19 @@ def getConstraintByTag(sketch, tag):
     return result
 
 
+def getConstraintIndexMap(sketch):
+    """Returns dictionary of constraint name -> index of constraint in sketch (named constraints only)"""
+    return {c.Name: i for i, c in enumerate(sketch.Constraints) if c.Name}
+
+
 def constrainPadDelta(sketch, list_of_constraints):
     """
     Constrain pad geometries in sketch relative (Delta Pos) to first pad of footprint
     :param sketch: Sketcher::SketchObject
-    :param list_of_constraints: list of tuples of part and index -> [(Part object, index ) , ...]
+    :param list_of_constraints: list of tuples of geometry index, Tag and position delta -> [(index, tag, Vector), ...]
     """
-    # Part objects are first elements of list
-    pad_parts = [e[0] for e in list_of_constraints]
-    # Indexes are second elements of list
-    indexes = [e[1] for e in list_of_constraints]
+    # Indexes are first elements of list
+    indexes = [e[0] for e in list_of_constraints]
 
     # First pad is not constrained, other are X and Y constrained relative to first pad (Delta Pos parameters)
     for i in range(len(indexes)):
@@ -50,10 +55,9 @@ def constrainPadDelta(sketch, list_of_constraints):
             continue
         else:
             # All other pads are constrained to first pad by delta position coordinates
-            pad_part = pad_parts[i]
-            dx = pad_part.PosDelta.x
-            dy = pad_part.PosDelta.y
-            tag = pad_part.Tags[0]
+            _, tag, pos_delta = list_of_constraints[i]
+            dx = pos_delta.x
+            dy = pos_delta.y
 
             # Add X constraint
             sketch.addConstraint(Sketcher.Constraint("DistanceX",         # Type
@@ -179,4 +183,56 @@ def coincidentGeometry(sketch):
                                 )
                             )
                             sketch.renameConstraint(sketch.ConstraintCount - 1,
-                                                    f"coincident_edge_{geom_1.tag}")
\ No newline at end of file
+                                                    f"coincident_edge_{geom_1.tag}")
+
+
+def coincidentLoops(sketch, drawings, tags):
+    """
+    Coincident constraint connected geometries of board outline using loops computed on KiCAD side
+    (drawing["loop"]["next"]), one constraint per connection instead of comparing every pair of geometries.
+    Vertex of each geometry nearest to shared endpoint is constrained (arc vertices depend on arc orientation).
+    :param sketch: Sketcher::SketchObject
+    :param drawings: list of drawing dictionaries with "loop" entries
+    :param tags: dictionary of drawing KIID -> Tag of geometry in sketch
+    """
+    indexes = {geom.Tag: i for i, geom in enumerate(sketch.Geometry)}
+    by_kiid = {drawing["kiid"]: drawing for drawing in drawings}
+
+    def getEndpoint(drawing):
+        """Returns endpoint (in direction of loop) of Line or Arc"""
+        if drawing["shape"] == "Line":
+            points = [drawing["start"], drawing["end"]]
+        else:
+            points = [drawing["points"][0], drawing["points"][-1]]
+        return FreeCADVector(points[0] if drawing["loop"]["reversed"] else points[1])
+
+    def getNearestVertex(index, point):
+        """Returns vertex index (1 start, 2 end) of geometry nearest to point"""
+        geom = sketch.Geometry[index]
+        if (geom.StartPoint - point).Length <= (geom.EndPoint - point).Length:
+            return 1
+        return 2
+
+    constraints = []
+    for drawing in drawings:
+        loop = drawing.get("loop")
+        if drawing["shape"] not in ("Line", "Arc") or not loop or not loop["next"]:
+            continue
+        next_drawing = by_kiid.get(loop["next"])
+        if not next_drawing or drawing["kiid"] not in tags or next_drawing["kiid"] not in tags:
+            continue
+
+        point = getEndpoint(drawing)
+        index_1 = indexes[tags[drawing["kiid"]]]
+        index_2 = indexes[tags[next_drawing["kiid"]]]
+        constraint = Sketcher.Constraint("Coincident",
+                                         index_1,
+                                         getNearestVertex(index_1, point),
+                                         index_2,
+                                         getNearestVertex(index_2, point))
+        constraint.Name = f"coincident_edge_{tags[drawing['kiid']]}"
+        constraints.append(constraint)
+
+    # Add all constraints at once (single solve)
+    if constraints:
+        sketch.addConstraint(constraints)
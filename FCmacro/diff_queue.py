@@ -0,0 +1,267 @@
+import copy
+import queue
+import time
+
+from PySide import QtCore
+
+from utils import patchPoints
+
+"""
+    Queue of received diffs, applied on main (GUI) thread in time slices
+    Socket thread only puts diffs to thread safe queue. Queued diffs are merged into batches (changes of same KIID
+    are combined), each batch is applied as cheap unit (placement, geometry changes) followed by expensive units
+    (each footprint with 3D models to import), so board follows KiCAD quickly while models are still loading.
+"""
+
+CATEGORIES = ("footprints", "drawings", "vias")
+
+
+def getKIID(entry):
+    """Returns KIID of changed entry ({kiid: [changes]})"""
+    return next(iter(entry))
+
+
+def mergePropertyValue(prop, old, new):
+    """
+    Returns merged value of property changed in two consecutive diffs, None if values can not be merged
+    :param prop: string (property name)
+    :param old: value from earlier diff
+    :param new: value from later diff
+    """
+    if prop == "pads_pth":
+        # Merge changes of pads by pad KIID
+        return [{pad_kiid: changes} for pad_kiid, changes in mergeChangedEntries(old, new).items()]
+
+    if prop == "points" and type(new) is dict:
+        # Moved vertices on top of full list of points or on top of earlier moved vertices
+        if type(old) is list:
+            return patchPoints(old, new)
+        changed = {i: p for i, p in old["changed"]}
+        changed.update({i: p for i, p in new["changed"]})
+        return {"changed": [[i, p] for i, p in changed.items()], "count": new["count"]}
+
+    if prop == "3d_models" and type(old) is dict and type(new) is dict:
+        # Per model diffs are applied one after another
+        return None
+
+    # Later value replaces earlier one
+    return new
+
+
+def mergeChanges(old, new):
+    """
+    Returns merged list of changes ([[property, value], ...]) of same item, None if changes can not be merged
+    """
+    merged = {prop: value for prop, value in old}
+    for prop, value in new:
+        if prop in merged:
+            value = mergePropertyValue(prop, merged[prop], value)
+            if value is None:
+                return None
+        merged[prop] = value
+
+    return [[prop, value] for prop, value in merged.items()]
+
+
+def mergeChangedEntries(old, new):
+    """Returns dictionary KIID -> merged changes of two lists of changed entries (assumed mergeable)"""
+    merged = {}
+    for entry in old + new:
+        kiid = getKIID(entry)
+        changes = entry[kiid]
+        merged[kiid] = mergeChanges(merged[kiid], changes) if kiid in merged else changes
+
+    return merged
+
+
+def mergeDiff(batch, diff):
+    """
+    Merge diff into batch (diff dictionary, edited in place) if possible
+    Diff can not be merged if it adds item removed in batch, changes item added or removed in batch,
+    or changes which can not be combined (e.g. two per model 3D model diffs of same footprint)
+    :param batch: diff dictionary
+    :param diff: diff dictionary
+    :return: bool (True if merged)
+    """
+    # Check for conflicts first, batch is not changed if diff can't be merged
+    for key in CATEGORIES:
+        if not diff.get(key):
+            continue
+        batch_added = {item["kiid"] for item in batch.get(key, {}).get("added") or []}
+        batch_removed = set(batch.get(key, {}).get("removed") or [])
+        batch_changed = {getKIID(e): e[getKIID(e)] for e in batch.get(key, {}).get("changed") or []}
+
+        for item in diff[key].get("added") or []:
+            if item["kiid"] in batch_removed:
+                return False
+        for entry in diff[key].get("changed") or []:
+            kiid = getKIID(entry)
+            if kiid in batch_added or kiid in batch_removed:
+                return False
+            if kiid in batch_changed and mergeChanges(batch_changed[kiid], entry[kiid]) is None:
+                return False
+
+    for key in CATEGORIES:
+        if not diff.get(key):
+            continue
+        category = batch.setdefault(key, {})
+        added = category.get("added") or []
+        changed = category.get("changed") or []
+        removed = category.get("removed") or []
+
+        for item in diff[key].get("added") or []:
+            # Replace if same item was already added
+            added = [a for a in added if a["kiid"] != item["kiid"]] + [item]
+
+        if diff[key].get("changed"):
+            changed = [{kiid: changes}
+                       for kiid, changes in mergeChangedEntries(changed, diff[key]["changed"]).items()]
+
+        for kiid in diff[key].get("removed") or []:
+            if any(a["kiid"] == kiid for a in added):
+                # Item added and removed in same batch: never drawn
+                added = [a for a in added if a["kiid"] != kiid]
+            else:
+                changed = [e for e in changed if getKIID(e) != kiid]
+                removed.append(kiid)
+
+        batch[key] = {name: value for name, value in (("added", added), ("changed", changed), ("removed", removed))
+                      if value}
+
+    return True
+
+
+def splitBatch(batch):
+    """
+    Split batch into units applied one after another:
+    cheap unit (everything without model imports) first, then one unit per footprint with models to import
+    :param batch: diff dictionary
+    :return: list of diff dictionaries
+    """
+    cheap = copy.deepcopy(batch)
+    expensive = []
+
+    footprints = cheap.get("footprints")
+    if footprints:
+        # Added footprints with 3D models
+        added = []
+        for footprint in footprints.get("added") or []:
+            if footprint.get("3d_models"):
+                expensive.append({"footprints": {"added": [footprint]}})
+            else:
+                added.append(footprint)
+
+        # 3D model changes
+        changed = []
+        for entry in footprints.get("changed") or []:
+            kiid = getKIID(entry)
+            changes = []
+            for prop, value in entry[kiid]:
+                if prop == "3d_models":
+                    expensive.append({"footprints": {"changed": [{kiid: [[prop, value]]}]}})
+                else:
+                    changes.append([prop, value])
+            if changes:
+                changed.append({kiid: changes})
+
+        footprints = {name: value for name, value in (("added", added),
+                                                      ("changed", changed),
+                                                      ("removed", footprints.get("removed")))
+                      if value}
+        if footprints:
+            cheap["footprints"] = footprints
+        else:
+            cheap.pop("footprints")
+
+    units = [cheap] if any(cheap.get(key) for key in CATEGORIES) else []
+
+    return units + expensive
+
+
+class DiffQueue:
+
+    def __init__(self, apply_function, time_slice=0.03, on_changed=None, on_drained=None, on_error=None):
+        """
+        :param apply_function: function(diff) applying diff to document (called on main thread)
+        :param time_slice: float (max time in seconds spent applying diffs per timer tick)
+        :param on_changed: function() called (on main thread) when number of pending diffs changes
+        :param on_drained: function() called when all queued diffs are applied
+        :param on_error: function(exception) called when applying diff failed (queue is stopped)
+        """
+        self.apply_function = apply_function
+        self.time_slice = time_slice
+        self.on_changed = on_changed
+        self.on_drained = on_drained
+        self.on_error = on_error
+        # Thread safe queue of received diffs (filled by socket thread)
+        self.incoming = queue.Queue()
+        # Merged diffs, waiting to be applied
+        self.batches = []
+        # Units of batch being applied
+        self.units = []
+
+        self.timer = QtCore.QTimer()
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.applySlice)
+
+    def put(self, diff):
+        """Queue received diff (can be called from any thread)"""
+        self.incoming.put(diff)
+
+    def collect(self):
+        """Move received diffs to batches, merging them with last waiting batch when possible"""
+        while True:
+            try:
+                diff = self.incoming.get_nowait()
+            except queue.Empty:
+                break
+            if not self.batches or not mergeDiff(self.batches[-1], diff):
+                self.batches.append(copy.deepcopy(diff))
+
+    def __len__(self):
+        """Number of pending batches and units"""
+        return self.incoming.qsize() + len(self.batches) + len(self.units)
+
+    def start(self):
+        if len(self):
+            self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def isRunning(self):
+        return self.timer.isActive()
+
+    def applySlice(self):
+        """Timer callback: apply units until time slice is used up"""
+        start = time.perf_counter()
+        self.collect()
+
+        while (time.perf_counter() - start) < self.time_slice:
+            if not self.units:
+                if not self.batches:
+                    break
+                self.units = splitBatch(self.batches.pop(0))
+                continue
+            unit = self.units.pop(0)
+            try:
+                self.apply_function(unit)
+            except Exception as e:
+                # Failed unit stays first in queue (nothing is lost), timer is stopped so it isn't retried
+                # on every tick
+                self.units.insert(0, unit)
+                self.timer.stop()
+                if self.on_changed:
+                    self.on_changed()
+                if self.on_error:
+                    self.on_error(e)
+                else:
+                    raise
+                return
+
+        if self.on_changed:
+            self.on_changed()
+        if not len(self):
+            self.timer.stop()
+            if self.on_drained:
+                self.on_drained()
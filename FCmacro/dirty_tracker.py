@@ -0,0 +1,286 @@
+import FreeCAD as App
+
+from contextlib import contextmanager
+
+from utils import getGeomsByTags, getPartByKIID, getTagIndexMap, toList
+from item_store import getItemStore
+from update_fncs import moveFootprintPads
+import plugin_dir  # Modules shared with KiCAD plugin are in plugin directory
+from tracing import traced
+
+"""
+    Tracking of user changes in FreeCAD (reverse sync FreeCAD -> KiCAD)
+    Document observer records which footprint containers, hole sketches and pad deltas were edited by user,
+    diff for KiCAD (same format as diffs sent by KiCAD) is then built only from these objects.
+    Tracking is paused while plugin itself changes document (drawing pcb, applying diffs from KiCAD).
+"""
+
+
+def toNm(vec):
+    """Returns FreeCAD vector as KiCAD coordinates (integer nm, y flipped)"""
+    return [round(v) for v in toList(vec)]
+
+
+class DirtyTracker:
+
+    def __init__(self, doc, pcb):
+        """
+        :param doc: FreeCAD document object
+        :param pcb: pcb dictionary (updated with changes when diff is built)
+        """
+        self.doc = doc
+        self.pcb = pcb
+        self.pause_count = 0
+        # Names of footprint Part objects with changed placement or reference
+        self.footprints = set()
+        # Names of sketches with changed geometry (pads could have been moved)
+        self.sketches = set()
+        # KIIDs of pads with position delta edited in pad store
+        self.pads = set()
+        # KIIDs of footprints deleted by user
+        self.removed = []
+        # Pad store position deltas before change (for finding edited pads)
+        self.old_pos_deltas = None
+
+    def start(self):
+        App.addDocumentObserver(self)
+
+    def stop(self):
+        App.removeDocumentObserver(self)
+
+    def pause(self):
+        self.pause_count += 1
+
+    def resume(self):
+        self.pause_count = max(self.pause_count - 1, 0)
+
+    @contextmanager
+    def paused(self):
+        """Context manager: changes done inside are not tracked"""
+        self.pause()
+        try:
+            yield
+        finally:
+            self.resume()
+
+    def isTracked(self, obj):
+        return not self.pause_count and obj.Document == self.doc
+
+    def hasChanges(self):
+        return bool(self.footprints or self.sketches or self.pads or self.removed)
+
+    # ----------------------------------- Observer slots ----------------------------------- #
+    def slotBeforeChangeObject(self, obj, prop):
+        if not self.isTracked(obj):
+            return
+        if prop == "PosDeltas" and obj.Name.startswith("Pad_Store_"):
+            self.old_pos_deltas = list(obj.PosDeltas)
+
+    def slotChangedObject(self, obj, prop):
+        if not self.isTracked(obj):
+            return
+        # Footprint container (has KIID and Reference properties)
+        if prop in ("Placement", "Reference") and hasattr(obj, "Reference") and hasattr(obj, "KIID"):
+            self.footprints.add(obj.Name)
+        elif prop == "Geometry" and obj.TypeId == "Sketcher::SketchObject":
+            self.sketches.add(obj.Name)
+        elif prop == "PosDeltas" and obj.Name.startswith("Pad_Store_") and self.old_pos_deltas is not None:
+            # Pads with edited delta (store entries are in same order as before change)
+            for kiid, old, new in zip(obj.KIIDs, self.old_pos_deltas, obj.PosDeltas):
+                if old != new:
+                    self.pads.add(kiid)
+            self.old_pos_deltas = None
+
+    def slotDeletedObject(self, obj):
+        if not self.isTracked(obj):
+            return
+        if hasattr(obj, "Reference") and hasattr(obj, "KIID"):
+            self.removed.append(obj.KIID)
+
+    # ----------------------------------- Diff ----------------------------------- #
+    @traced()
+    def buildDiff(self):
+        """
+        Build diff (KiCAD format) from changes recorded since last call, update pcb dictionary,
+        move pads of footprints with edited deltas in sketch
+        :return: dict (empty if nothing changed)
+        """
+        pcb_id = self.pcb["general"]["pcb_id"]
+        sketch = self.doc.getObject(f"Board_Sketch_{pcb_id}")
+        pad_store = getItemStore(self.doc, f"Pad_Store_{pcb_id}")
+        footprints = {footprint["kiid"]: footprint for footprint in self.pcb.get("footprints") or []}
+
+        # Footprint KIID -> {property: value}, footprint KIID -> {pad KIID: {property: value}}
+        fp_changes, pad_changes = {}, {}
+        # Footprints with pads to be moved in sketches: KIID -> (footprint Part object, footprint dictionary)
+        moved, rotations = {}, {}
+
+        # ---- Footprint containers moved, rotated or renamed by user
+        for name in self.footprints:
+            fp_part = self.doc.getObject(name)
+            footprint = footprints.get(getattr(fp_part, "KIID", None))
+            if not footprint:
+                continue
+            changes = fp_changes.setdefault(footprint["kiid"], {})
+            pos = toNm(fp_part.Placement.Base)
+            if pos != footprint["pos"]:
+                changes["pos"] = pos
+                moved[footprint["kiid"]] = (fp_part, footprint)
+            # Rotation around z in degrees (same as KiCAD orientation)
+            rot = round(fp_part.Placement.Rotation.toEuler()[0], 6)
+            rotation = (rot - footprint["rot"] + 180) % 360 - 180
+            if abs(rotation) > 1e-6:
+                changes["rot"] = rot
+                rotations[footprint["kiid"]] = rotation
+                moved[footprint["kiid"]] = (fp_part, footprint)
+            if fp_part.Reference != footprint["ref"]:
+                changes["ref"] = fp_part.Reference
+
+        if pad_store:
+            # ---- Pads moved in sketches (moving first pad of footprint moves whole footprint)
+            groups = pad_store.groupByFootprint() if self.sketches else {}
+            for name in self.sketches:
+                pad_sketch = self.doc.getObject(name)
+                if not pad_sketch:
+                    continue
+                # Pads of footprint of hole sketch (partitioned build mode) or all pads (board sketch)
+                fp_parts = [o for o in pad_sketch.InList if getattr(o, "HoleSketch", None) == pad_sketch]
+                if fp_parts:
+                    indexes = [i for fp_part in fp_parts for i in groups.get(fp_part.KIID, [])]
+                elif pad_sketch == sketch:
+                    indexes = range(len(pad_store))
+                else:
+                    continue
+                # Geometry property returns new copy of list on every access, it is read once
+                geometries = pad_sketch.Geometry
+                tag_indexes = getTagIndexMap(pad_sketch)
+
+                # Only footprints with pad geometries moved in sketch are scanned
+                for fp_kiid in self.findMovedPads(pad_sketch, geometries, indexes, tag_indexes, pad_store):
+                    footprint = footprints.get(fp_kiid)
+                    if not footprint or fp_kiid in moved:
+                        continue
+                    fp_part = getPartByKIID(self.doc, fp_kiid)
+                    if not fp_part:
+                        continue
+                    if self.scanPads(fp_part, footprint, pad_sketch, geometries, groups.get(fp_kiid, []),
+                                     tag_indexes, pad_store, fp_changes, pad_changes):
+                        moved[fp_kiid] = (fp_part, footprint)
+
+            # ---- Pad deltas edited in pad store
+            for kiid in self.pads:
+                i = pad_store.find(kiid)
+                if i is None:
+                    continue
+                fp_kiid = pad_store.fp_kiids[i]
+                footprint = footprints.get(fp_kiid)
+                fp_part = getPartByKIID(self.doc, fp_kiid)
+                if not footprint or not fp_part:
+                    continue
+                pad_changes.setdefault(fp_kiid, {})[kiid] = {"pos_delta": toNm(pad_store.pos_deltas[i])}
+                moved[fp_kiid] = (fp_part, footprint)
+
+            # ---- Bring pads in sketches in line with footprint placements and deltas
+            if moved:
+                with self.paused():
+                    moveFootprintPads(moved, rotations, set(), pad_store, sketch)
+                    pad_store.flush()
+
+        # ---- Build diff, update pcb dictionary
+        changed = []
+        for fp_kiid in set(fp_changes) | set(pad_changes):
+            footprint = footprints[fp_kiid]
+            changes = [[prop, value] for prop, value in fp_changes.get(fp_kiid, {}).items()]
+            footprint.update(fp_changes.get(fp_kiid, {}))
+
+            pads = []
+            for pad_kiid, pad_props in pad_changes.get(fp_kiid, {}).items():
+                pad = next((p for p in footprint.get("pads_pth") or [] if p["kiid"] == pad_kiid), None)
+                pad_props = {prop: value for prop, value in pad_props.items() if not pad or pad[prop] != value}
+                if not pad_props:
+                    continue
+                pad.update(pad_props)
+                pads.append({pad_kiid: [[prop, value] for prop, value in pad_props.items()]})
+            if pads:
+                changes.append(["pads_pth", pads])
+
+            if changes:
+                changed.append({fp_kiid: changes})
+
+        removed = [kiid for kiid in self.removed if kiid in footprints]
+        if removed:
+            self.pcb["footprints"] = [fp for fp in self.pcb["footprints"] if fp["kiid"] not in removed]
+            if pad_store:
+                pad_indexes = [i for kiid in removed for i in pad_store.getFootprintItems(kiid)]
+                with self.paused():
+                    # Remove pad holes of deleted footprints from board sketch
+                    geom_indexes = getGeomsByTags(sketch, [pad_store.tags[i] for i in pad_indexes]) if sketch else []
+                    if geom_indexes:
+                        sketch.delGeometries(geom_indexes)
+                    pad_store.remove([pad_store.kiids[i] for i in pad_indexes])
+                    pad_store.flush()
+
+        self.footprints, self.sketches, self.pads, self.removed = set(), set(), set(), []
+
+        result = {}
+        if changed:
+            result.update({"changed": changed})
+        if removed:
+            result.update({"removed": removed})
+
+        return {"footprints": result} if result else {}
+
+    @staticmethod
+    def findMovedPads(pad_sketch, geometries, indexes, tag_indexes, pad_store):
+        """
+        Returns KIIDs of footprints with pad geometries in sketch not at position stored in pad store
+        :param pad_sketch: FreeCAD sketch object
+        :param geometries: list of sketch geometries
+        :param indexes: indexes of pads (in pad store) drawn in sketch
+        :param tag_indexes: dict of geometry Tag -> index of geometry in sketch
+        :param pad_store: ItemStore object (pads)
+        :return: set of strings
+        """
+        fp_kiids = set()
+        for i in indexes:
+            if pad_store.fp_kiids[i] in fp_kiids:
+                continue
+            geom_index = tag_indexes.get(pad_store.tags[i])
+            if geom_index is None:
+                continue
+            center = pad_sketch.Placement.multVec(geometries[geom_index].Center)
+            if not center.isEqual(pad_store.positions[i], 1e-9):
+                fp_kiids.add(pad_store.fp_kiids[i])
+
+        return fp_kiids
+
+    def scanPads(self, fp_part, footprint, pad_sketch, geometries, indexes, tag_indexes, pad_store, fp_changes,
+                 pad_changes):
+        """
+        Compare pad geometries in sketch with pad store, record footprint position and pad delta changes
+        :return: bool (True if footprint moved or pad deltas changed)
+        """
+        base = fp_part.Placement.Base
+        changed = False
+        for i in indexes:
+            geom_index = tag_indexes.get(pad_store.tags[i])
+            if geom_index is None:
+                continue
+            # Absolute position of pad geometry
+            center = pad_sketch.Placement.multVec(geometries[geom_index].Center)
+            if center.isEqual(pad_store.positions[i], 1e-9):
+                continue
+
+            if pad_store.pos_deltas[i].Length == 0:
+                # First pad moved: footprint moved (pads are listed in order, first pad goes first)
+                base = center
+                with self.paused():
+                    fp_part.Placement.Base = base
+                fp_changes.setdefault(footprint["kiid"], {})["pos"] = toNm(base)
+            else:
+                delta = center - base
+                pad_store.setPosDelta(i, delta)
+                pad_changes.setdefault(footprint["kiid"], {})[pad_store.kiids[i]] = {"pos_delta": toNm(delta)}
+            changed = True
+
+        return changed
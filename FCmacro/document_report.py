@@ -0,0 +1,106 @@
+import plugin_dir  # Modules shared with KiCAD plugin are in plugin directory
+from memory_report import TOP_FILES, formatSize
+
+"""
+    Memory accounting of FreeCAD document for memory report (memory_report.py, shared with KiCAD plugin)
+    Document is accounted by object counts and shape sizes: objects by type, hidden Part::Features, model masters
+    per file name (duplicates, links to them) and pad/via stores.
+"""
+
+# Module (file name without extension) -> category of allocations made in it (FreeCAD side modules)
+MODULE_CATEGORIES = {"freecad_functions": "drawing",
+                     "constraints": "drawing",
+                     "draw_job": "drawing",
+                     "update_fncs": "diffs",
+                     "diff_queue": "diffs",
+                     "dirty_tracker": "diffs",
+                     "utils": "indexes",
+                     "item_store": "pad_via_stores",
+                     "model_cache": "models",
+                     "model_loader": "models",
+                     "model_preload": "models",
+                     "pcb_state": "snapshots"}
+
+
+def getShapeSize(obj):
+    """Returns memory size of shape of object in bytes, 0 if object has no shape"""
+    shape = getattr(obj, "Shape", None)
+    try:
+        return shape.MemSize if shape and not shape.isNull() else 0
+    except (AttributeError, RuntimeError):
+        return 0
+
+
+def getDocumentReport(doc, top=TOP_FILES):
+    """
+    Returns object counts and shape sizes of document
+    :param doc: FreeCAD document object
+    :param top: int (number of models with largest shapes in report)
+    :return: dict
+    """
+    types = {}
+    hidden_features = {"count": 0, "shape_size": 0}
+    models = {}
+    stores = {}
+    sketches = {"count": 0, "geometries": 0, "constraints": 0}
+
+    for obj in doc.Objects:
+        shape_size = getShapeSize(obj)
+        entry = types.setdefault(obj.TypeId, {"count": 0, "shape_size": 0})
+        entry["count"] += 1
+        entry["shape_size"] += shape_size
+
+        if obj.TypeId == "Part::Feature" and not obj.Visibility:
+            hidden_features["count"] += 1
+            hidden_features["shape_size"] += shape_size
+
+        # Master in model library (see freecad_functions.getModelMaster)
+        if hasattr(obj, "ModelScale"):
+            model = models.setdefault(obj.Filename, {"masters": 0, "scales": [], "links": 0, "shape_size": 0})
+            model["masters"] += 1
+            model["scales"].append([obj.ModelScale.x, obj.ModelScale.y, obj.ModelScale.z])
+            model["links"] += len([parent for parent in obj.InList if parent.TypeId == "App::Link"])
+            model["shape_size"] += shape_size
+
+        # Pad/ via store (see item_store.py)
+        elif hasattr(obj, "PosDeltas") and hasattr(obj, "KIIDs"):
+            stores[obj.Name] = {"items": len(obj.KIIDs), "shape_size": shape_size}
+
+        elif obj.TypeId == "Sketcher::SketchObject":
+            sketches["count"] += 1
+            sketches["geometries"] += obj.GeometryCount if hasattr(obj, "GeometryCount") else len(obj.Geometry)
+            sketches["constraints"] += obj.ConstraintCount
+
+    for model in models.values():
+        # Masters of same file and scale are shapes imported more than once
+        model["duplicates"] = model["masters"] - len({tuple(scale) for scale in model["scales"]})
+    models = dict(sorted(models.items(), key=lambda item: -item[1]["shape_size"]))
+
+    return {"objects": len(doc.Objects),
+            "shape_size": sum(entry["shape_size"] for entry in types.values()),
+            "types": dict(sorted(types.items(), key=lambda item: -item[1]["count"])),
+            "hidden_features": hidden_features,
+            "models": dict(list(models.items())[:top]),
+            "model_files": len(models),
+            "model_duplicates": sum(model["duplicates"] for model in models.values()),
+            "stores": stores,
+            "sketches": sketches}
+
+
+def formatDocumentReport(document):
+    """Returns lines of text summary of document report"""
+    lines = [f"    document: {document['objects']} objects, shapes {formatSize(document['shape_size'])}"]
+    lines.append(f"        hidden Part::Features: {document['hidden_features']['count']}, "
+                 f"shapes {formatSize(document['hidden_features']['shape_size'])}")
+    lines.append(f"        models: {document['model_files']} files, "
+                 f"{document['model_duplicates']} duplicated masters")
+    for file_name, model in list(document["models"].items())[:5]:
+        lines.append(f"            {file_name}: {model['masters']} masters, {model['links']} links, "
+                     f"{formatSize(model['shape_size'])}")
+    for name, store in document["stores"].items():
+        lines.append(f"        {name}: {store['items']} items, {formatSize(store['shape_size'])}")
+    lines.append(f"        sketches: {document['sketches']['count']}, "
+                 f"{document['sketches']['geometries']} geometries, "
+                 f"{document['sketches']['constraints']} constraints")
+
+    return lines
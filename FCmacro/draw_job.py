@@ -0,0 +1,106 @@
+import time
+
+from PySide import QtCore
+
+import plugin_dir  # Modules shared with KiCAD plugin are in plugin directory
+from tracing import span
+
+"""
+    Drawing pcb in time slices
+    Steps of drawPcbSteps generator are run by QTimer in short time slices, so FreeCAD GUI stays responsive
+    while pcb is being drawn. Progress and ETA are reported by callback, job can be cancelled, all changes
+    made by job are then rolled back.
+"""
+
+
+class DrawJob:
+
+    def __init__(self, doc, steps, pcb_name, time_slice=0.03, on_progress=None, on_finished=None):
+        """
+        :param doc: FreeCAD document object
+        :param steps: generator (drawPcbSteps) yielding (done, total)
+        :param pcb_name: string (name of pcb Part object, removed on cancel if document has no undo)
+        :param time_slice: float (max time in seconds spent drawing per timer tick)
+        :param on_progress: function(done, total, eta) called after every time slice, eta in seconds or None
+        :param on_finished: function(pcb_part) called when drawing is done, pcb_part is None if cancelled
+        """
+        self.doc = doc
+        self.steps = steps
+        self.pcb_name = pcb_name
+        self.time_slice = time_slice
+        self.on_progress = on_progress
+        self.on_finished = on_finished
+        self.done, self.total = 0, 0
+        self.start_time = None
+        self.transaction = False
+
+        self.timer = QtCore.QTimer()
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.runSlice)
+
+    def start(self):
+        # All changes are done in single transaction, so they can be rolled back on cancel
+        if self.doc.UndoMode:
+            self.doc.openTransaction("Draw pcb")
+            self.transaction = True
+        self.start_time = time.perf_counter()
+        self.timer.start()
+
+    def isRunning(self):
+        return self.timer.isActive()
+
+    def getEta(self):
+        """Returns estimated remaining time in seconds (from average time per step), None if unknown"""
+        if not self.done or not self.total:
+            return None
+        elapsed = time.perf_counter() - self.start_time
+        return elapsed / self.done * (self.total - self.done)
+
+    def runSlice(self):
+        """Timer callback: run steps until time slice is used up"""
+        start = time.perf_counter()
+        try:
+            with span("drawSlice") as slice_span:
+                done = self.done
+                while (time.perf_counter() - start) < self.time_slice:
+                    self.done, self.total = next(self.steps)
+                slice_span.set(steps=self.done - done)
+        except StopIteration as e:
+            self.finish(e.value)
+            return
+        except Exception:
+            # Don't leave half drawn pcb in document
+            self.cancel()
+            raise
+
+        if self.on_progress:
+            self.on_progress(self.done, self.total, self.getEta())
+
+    def finish(self, pcb_part):
+        self.timer.stop()
+        if self.transaction:
+            self.doc.commitTransaction()
+            self.transaction = False
+        if self.on_finished:
+            self.on_finished(pcb_part)
+
+    def cancel(self):
+        """Stop drawing and roll back all changes made by job"""
+        if not self.timer.isActive():
+            return
+        self.timer.stop()
+        self.steps.close()
+
+        if self.transaction:
+            self.doc.abortTransaction()
+            self.transaction = False
+        else:
+            # No undo: remove (partially drawn) pcb part with all its children
+            pcb_part = self.doc.getObject(self.pcb_name)
+            if pcb_part:
+                pcb_part.removeObjectsFromDocument()
+                self.doc.removeObject(pcb_part.Name)
+        self.doc.recompute()
+
+        if self.on_finished:
+            self.on_finished(None)
@@ -1,22 +1,109 @@
-import Draft
 import FreeCAD as App
 import FreeCADGui as Gui
 import Import
-import ImportGui
 import Part
-import PartDesignGui
 import Sketcher
+# GUI modules are not available in FreeCADCmd
+if App.GuiUp:
+    import ImportGui
+    import PartDesignGui
 
 from utils import *
 from constants import SCALE, VEC
-from constraints import coincidentGeometry, constrainRectangle, constrainPadDelta
+from model_cache import getShapeAndColors
+from item_store import createItemStore, getItemStore
+from pcb_state import addPcbStateProperties, writePcbState
+from constraints import coincidentGeometry, coincidentLoops, constrainRectangle, constrainPadDelta
 from update_fncs import updateFootprints, updateDrawings, updateVias
+import plugin_dir  # Modules shared with KiCAD plugin are in plugin directory
+from tracing import span, traced
+
+
+def scaleShape(shape, scale):
+    """
+    Returns scaled copy of shape
+    :param shape: Part.Shape
+    :param scale: FreeCAD Vector (scale factors in x, y, z)
+    :return: Part.Shape
+    """
+    shape = shape.copy()
+    if scale.x == scale.y == scale.z:
+        shape.scale(scale.x)
+    else:
+        # Non-uniform scale can only be applied by transforming geometry
+        matrix = App.Matrix()
+        matrix.scale(scale)
+        shape = shape.transformGeometry(matrix)
+
+    return shape
+
+
+@traced()
+def getModelMaster(model, doc, pcb_id, MODELS_PATH, model_cache=None):
+    """
+    Get master object of model (imported only once per filename and scale) from model library
+    :param model: dictionary with model properties
+    :param doc: FreeCAD document object
+    :param pcb_id: string
+    :param MODELS_PATH: string (models directory path)
+    :param model_cache: ModelCache object (persistent cache of converted models) or None
+    :return: FreeCAD object to be linked to
+    """
+    # Hidden library container is created in drawPcb
+    library = doc.getObject(f"Models_{pcb_id}")
+    scale = App.Vector(model["scale"][0],
+                       model["scale"][1],
+                       model["scale"][2])
+
+    # Check if model with same filename and scale was already imported
+    for master in library.Group:
+        if master.Filename == model["filename"] and master.ModelScale == scale:
+            return master
+
+    # Get unscaled master first (scaled masters are made from it)
+    if scale != App.Vector(1, 1, 1):
+        unscaled = getModelMaster(dict(model, scale=[1.0, 1.0, 1.0]), doc, pcb_id, MODELS_PATH, model_cache)
+        shape, colors = getShapeAndColors(unscaled)
+        # Scaled master has its own scaled copy of shape
+        master = doc.addObject("Part::Feature", "Model")
+        master.Shape = scaleShape(shape, scale)
+        if App.GuiUp and len(colors) == len(master.Shape.Faces):
+            master.ViewObject.DiffuseColor = colors
+    else:
+        path = MODELS_PATH + model["filename"] + ".step"
+        shape, colors = model_cache.get(path) if model_cache else (None, None)
+        if shape:
+            # Read converted model from cache (no .step parsing)
+            master = doc.addObject("Part::Feature", "Model")
+            master.Shape = shape
+            if App.GuiUp and len(colors) == len(shape.Faces):
+                master.ViewObject.DiffuseColor = colors
+        else:
+            # Import model
+            (ImportGui if App.GuiUp else Import).insert(path, doc.Name)
+            # Last obj in doc is imported model
+            master = doc.Objects[-1]
+            # Save converted model to cache, so next session doesn't parse .step file
+            if model_cache:
+                model_cache.put(path, *getShapeAndColors(master))
+
+    master.Label = f"{model['filename'].split('/')[-1]}_{pcb_id}"
+    # Properties used for finding master when importing same model again
+    master.addProperty("App::PropertyString", "Filename", "KiCAD")
+    master.Filename = model["filename"]
+    master.addProperty("App::PropertyVector", "ModelScale", "KiCAD")
+    master.ModelScale = scale
+    master.Visibility = False
+    library.addObject(master)
+
+    return master
 
 
 # noinspection PyShadowingNames
-def importModel(model, fp, fp_part, doc, pcb_id, thickness, MODELS_PATH):
+@traced()
+def importModel(model, fp, fp_part, doc, pcb_id, thickness, MODELS_PATH, model_cache=None):
     """
-    Import .step models to document as children of footprint Part container
+    Add model to document as App::Link (to master in model library) as child of footprint Part container
     :param model: dictioneray with model properties
     :param fp: footprint dictionary
     :param fp_part: FreeCAD App::Part object
@@ -24,135 +111,163 @@ def importModel(model, fp, fp_part, doc, pcb_id, thickness, MODELS_PATH):
     :param pcb_id: string
     :param thickness: pcb thickenss in mm (for moving model by z)
     :param MODELS_PATH: string (models directory path)
+    :param model_cache: ModelCache object or None
     """
 
-    # Import model
-    path = MODELS_PATH + model["filename"] + ".step"
-    ImportGui.insert(path, doc.Name)
+    # Get master (.step file is imported only once per filename and scale)
+    master = getModelMaster(model, doc, pcb_id, MODELS_PATH, model_cache)
 
-    # Last obj in doc is imported model
-    feature = doc.Objects[-1]
+    # Footprint gets lightweight link to master, with its own placement
+    feature = doc.addObject("App::Link", f"{fp['ref']}_{model['model_id']}_{pcb_id}")
+    feature.setLink(master)
     # Set label
     feature.Label = f"{fp['ID']}_{fp['ref']}_{model['model_id']}_{pcb_id}"
     feature.addProperty("App::PropertyString", "Filename", "KiCAD")
     feature.Filename = model["filename"].split("/")[-1]
+    # Model ID (used for applying per model diffs)
+    feature.addProperty("App::PropertyString", "ModelID", "KiCAD")
+    feature.ModelID = model["model_id"]
     feature.addProperty("App::PropertyBool", "Model", "Base")
     feature.Model = True
 
+    setModelPlacement(feature, model, fp, thickness)
+
+    fp_part.addObject(feature)
+
+
+def setModelPlacement(feature, model, fp, thickness):
+    """
+    Set placement of model relative to footprint Part container (offset, rotation, bottom layer flip)
+    :param feature: FreeCAD object (model link)
+    :param model: dictioneray with model properties
+    :param fp: footprint dictionary
+    :param thickness: pcb thickenss in nm (for moving model by z)
+    """
+    placement = App.Placement()
     # Model is child of fp - inherits base coordinates, only offset necessary
     # Offset unit is mm, y is not flipped:
-    offset = App.Vector(model["offset"][0],
-                        model["offset"][1],
-                        model["offset"][2])
-    feature.Placement.Base = offset
+    placement.Base = App.Vector(model["offset"][0],
+                                model["offset"][1],
+                                model["offset"][2])
 
     # Check if model needs to be rotated
     if model["rot"] != [0.0, 0.0, 0.0]:
-        feature.Placement.rotate(VEC["0"], VEC["x"], -model["rot"][0])
-        feature.Placement.rotate(VEC["0"], VEC["y"], -model["rot"][1])
-        feature.Placement.rotate(VEC["0"], VEC["z"], -model["rot"][2])
+        placement.rotate(VEC["0"], VEC["x"], -model["rot"][0])
+        placement.rotate(VEC["0"], VEC["y"], -model["rot"][1])
+        placement.rotate(VEC["0"], VEC["z"], -model["rot"][2])
 
     # If footprint is on bottom layer:
     # rotate model 180 around x and move in -z by pcb thickness
     if fp["layer"] == "Bot":
-        feature.Placement.Rotation = App.Rotation(VEC["x"], 180.00)
-        feature.Placement.Base.z = -(thickness / SCALE)
-
-    # Scale model if it's not 1x
-    if model["scale"] != [1.0, 1.0, 1.0]:
-        # Make clone with Draft module in order to scale shape
-        clone = Draft.make_clone(feature, delta=offset)
-        clone.Scale = App.Vector(model["scale"][0],
-                                 model["scale"][1],
-                                 model["scale"][2])
-        # Rename original: add "_o_"
-        feature.Label = f"{fp['ID']}_{fp['ref']}_{model['model_id']}_o_{pcb_id}"
-        # Add clone name without "_o_"
-        clone.Label = f"{fp['ID']}_{fp['ref']}_{model['model_id']}_{pcb_id}"
-        clone.addProperty("App::PropertyString", "Filename", "Base")
-        clone.Filename = model["filename"].split("/")[-1]
-        clone.addProperty("App::PropertyBool", "Model", "Base")
-        clone.Model = True
-        # Hide original
-        feature.Visibility = False
-        fp_part.addObject(clone)
-        # Both feature and clone must be in footprint part containter for clone to work
+        placement.Rotation = App.Rotation(VEC["x"], 180.00)
+        placement.Base.z = -(thickness / SCALE)
 
-    fp_part.addObject(feature)
+    feature.Placement = placement
 
 
-def addPad(pad, footprint, fp_part, doc, pcb_id, container):
+def addPad(pad, footprint, fp_part, doc, pcb_id, store, sketch=None):
     """
-    Add circle geometry to sketch, create a Pad Part object and add it to footprints pad container.
+    Add circle geometry to sketch and add pad to pad store.
+    If pcb has no sketch (fast geometry build mode), pad is only added to store.
     :param pad: pcb dictionary entry (pad data)
     :param footprint: pcb dictionary entry  (footprint data)
     :param fp_part: footprint Part object
     :param doc: FreeCAD document object
     :param pcb_id: string
-    :param container: FreeCAD Part object
-    :return: Pad Part object, sketch geometry index of pad
+    :param store: ItemStore object (pads)
+    :param sketch: hole sketch of footprint (placed at footprint position), board sketch is used if None
+    :return: sketch geometry index (None if there is no sketch), Tag of geometry, position delta
     """
-
-    sketch = doc.getObject(f"Board_Sketch_{pcb_id}")
     base = fp_part.Placement.Base
+    # Pads in footprint's own sketch are relative to footprint position
+    origin = App.Vector(0, 0, 0) if sketch else base
+    sketch = sketch or doc.getObject(f"Board_Sketch_{pcb_id}")
 
     maj_axis = pad["hole_size"][0] / SCALE
     radius = maj_axis / 2
     min_axis = pad["hole_size"][1] / SCALE
     pos_delta = FreeCADVector(pad["pos_delta"])
-    circle = Part.Circle(Center=base + pos_delta,
-                         Normal=VEC["z"],
-                         Radius=radius)
-    # Add ellipse to sketch
-    sketch.addGeometry(circle, False)
-    tag = sketch.Geometry[-1].Tag
-
-    # Add radius constraint
-    sketch.addConstraint(Sketcher.Constraint("Radius",  # Type
-                                             (sketch.GeometryCount - 1),  # Index of geometry
-                                             radius))  # Value (radius)
-    sketch.renameConstraint(sketch.ConstraintCount - 1,
-                            f"padradius_{tag}")
-
-    # Create an object to store Tag and Delta
-    obj = doc.addObject("Part::Feature", f"{footprint['ref']}_{pad['ID']}_{pcb_id}")
-    obj.Shape = circle.toShape()
-    # Store abosolute position of pad (used for comparing to sketch geometry position)
-    obj.Placement.Base = base + pos_delta
-    # Add properties to object:
-    # Tag property to store geometry sketch ID (Tag) used for editing sketch geometry
-    obj.addProperty("App::PropertyStringList", "Tags", "Sketch")
-    # Add Tag after its added to sketch!
-    obj.Tags = tag
-    # Store position delta, which is used when moving geometry in sketch (apply diff)
-    obj.addProperty("App::PropertyVector", "PosDelta")
-    obj.PosDelta = pos_delta
-    # Save radius of circle
-    obj.addProperty("App::PropertyFloat", "Radius")
-    obj.Radius = radius
-    # Save constraint index (used for modifying hole size when applying diff)
-    obj.addProperty("App::PropertyInteger", "ConstraintRadius", "Sketch")
-    obj.ConstraintRadius = sketch.ConstraintCount - 1
-    # Add KIID as property
-    obj.addProperty("App::PropertyString", "KIID", "KiCAD")
-    obj.KIID = pad["kiid"]
+    tag, geom_index = "", None
+    if sketch:
+        # Add ellipse to sketch
+        sketch.addGeometry(Part.Circle(Center=origin + pos_delta,
+                                       Normal=VEC["z"],
+                                       Radius=radius),
+                           False)
+        tag = sketch.Geometry[-1].Tag
+        geom_index = sketch.GeometryCount - 1
 
-    # Hide pad object and add it to pad Part container
-    obj.Visibility = False
-    container.addObject(obj)
+        # Add radius constraint
+        sketch.addConstraint(Sketcher.Constraint("Radius",  # Type
+                                                 geom_index,  # Index of geometry
+                                                 radius))  # Value (radius)
+        sketch.renameConstraint(sketch.ConstraintCount - 1,
+                                f"padradius_{tag}")
+
+    # Store Tag, radius, absolute position (used for comparing to sketch geometry position)
+    # and position delta (used when moving geometry in sketch)
+    store.add(kiid=pad["kiid"],
+              tag=tag,
+              radius=radius,
+              position=base + pos_delta,
+              fp_kiid=footprint["kiid"],
+              pos_delta=pos_delta)
 
-    return obj, sketch.GeometryCount - 1
+    return geom_index, tag, pos_delta
 
 
-def addFootprintPart(footprint, doc, pcb, MODELS_PATH):
+@traced()
+def addVia(via, doc, pcb_id, store, sketch=None):
+    """
+    Add via circle to sketch and add via to via store
+    If pcb has no sketch (fast geometry build mode), via is only added to store.
+    :param via: pcb dictionary entry
+    :param doc: FreeCAD document object
+    :param pcb_id: string
+    :param store: ItemStore object (vias)
+    :param sketch: Sketcher::SketchObject to add geometry to, board sketch is used if None
+    """
+    sketch = sketch or doc.getObject(f"Board_Sketch_{pcb_id}")
+
+    radius = via["radius"] / SCALE
+    center = FreeCADVector(via["center"])
+    tag = ""
+    if sketch:
+        # Add circle to sketch
+        sketch.addGeometry(Part.Circle(Center=center,
+                                       Normal=VEC["z"],
+                                       Radius=radius),
+                           False)
+        tag = sketch.Geometry[-1].Tag
+        # Add radius constraint (found by Tag when modifying via size)
+        sketch.addConstraint(Sketcher.Constraint("Radius",
+                                                 (sketch.GeometryCount - 1),
+                                                 radius))
+        sketch.renameConstraint(sketch.ConstraintCount - 1,
+                                f"circleradius_{tag}")
+
+    store.add(kiid=via["kiid"],
+              tag=tag,
+              radius=radius,
+              position=center)
+
+
+@traced()
+def addFootprintPart(footprint, doc, pcb, MODELS_PATH, model_cache=None, model_loader=None, pad_store=None,
+                     import_models=True):
     """
     Adds footprint container to "Top" or "Bot" Group of "Footprints"
     Imports Step models as childer
-    Add "Pads" container with through hole pads - add holes to sketch as circles
+    Add through hole pads to pad store - add holes to sketch as circles
     :param footprint: footprint dictionary
     :param doc: FreeCAD document object
     :param pcb: pcb dictionary
     :param MODELS_PATH: string (models directory path)
+    :param model_cache: ModelCache object or None
+    :param model_loader: ModelLoader object (models get placeholders and are loaded later) or None
+    :param pad_store: ItemStore object (pads), caller flushes it; if None store is read from document and flushed
+    :param import_models: bool (False if caller imports models itself, e.g. one per draw step)
+    :return: FreeCAD App::Part object
     """
     pcb_id = pcb["general"]["pcb_id"]
     sketch = doc.getObject(f"Board_Sketch_{pcb_id}")
@@ -180,49 +295,73 @@ def addFootprintPart(footprint, doc, pcb, MODELS_PATH):
     # Footprint placement
     base = FreeCADVector(footprint["pos"])
     fp_part.Placement.Base = base
-    # Footprint rotation around z axis
-    fp_part.Placement.rotate(VEC["0"], VEC["z"], footprint["rot"])
+    # Footprint rotation around z axis (around footprint position)
+    fp_part.Placement.Rotation = App.Rotation(VEC["z"], footprint["rot"])
 
     # Check if footprint has through hole pads
     if footprint.get("pads_pth"):
-        pads_part = doc.addObject("App::Part", f"Pads_{fp_part.Label}")
-        pads_part.Visibility = False
-        fp_part.addObject(pads_part)
+        store = pad_store or getItemStore(doc, f"Pad_Store_{pcb_id}")
+
+        # Partitioned build mode: footprint holes are in footprint's own sketch, placed at footprint position
+        hole_sketches_part = doc.getObject(f"Hole_Sketches_{pcb_id}")
+        if hole_sketches_part:
+            sketch = doc.addObject("Sketcher::SketchObject", f"Holes_{fp_part.Label}")
+            sketch.Placement.Base = base
+            sketch.Visibility = False
+            hole_sketches_part.addObject(sketch)
+            fp_part.addProperty("App::PropertyLinkHidden", "HoleSketch", "Sketch")
+            fp_part.HoleSketch = sketch
+            # Board compound exists if footprint is added by diff (after drawing pcb)
+            compound = doc.getObject(f"Board_Compound_{pcb_id}")
+            if compound:
+                compound.Links = compound.Links + [sketch]
 
         constraints = []
         for i, pad in enumerate(footprint["pads_pth"]):
-            # Call function to add pad -> returns FC object and index of geom in sketch
-            pad_part, index = addPad(pad=pad,
-                                     footprint=footprint,
-                                     fp_part=fp_part,
-                                     doc=doc,
-                                     pcb_id=pcb_id,
-                                     container=pads_part)
-            # save pad and index to list for constraining pads
-            constraints.append((pad_part, index))
+            # Call function to add pad -> returns index of geom in sketch, its Tag and position delta
+            constraints.append(addPad(pad=pad,
+                                      footprint=footprint,
+                                      fp_part=fp_part,
+                                      doc=doc,
+                                      pcb_id=pcb_id,
+                                      store=store,
+                                      sketch=fp_part.HoleSketch if hole_sketches_part else None))
 
         # Add constraints to pads:
-        constrainPadDelta(sketch, constraints)
+        if sketch:
+            constrainPadDelta(sketch, constraints)
+
+        if not pad_store:
+            store.flush()
 
+    # Add placeholder, models are imported later by model loader
+    if model_loader:
+        model_loader.addPlaceholder(footprint, fp_part)
     # Check footprint for 3D models
-    if footprint.get("3d_models"):
+    elif footprint.get("3d_models") and import_models:
         for model in footprint["3d_models"]:
             # Import model - call function
-            importModel(model, footprint, fp_part, doc, pcb_id, pcb["general"]["thickness"], MODELS_PATH)
+            importModel(model, footprint, fp_part, doc, pcb_id, pcb["general"]["thickness"], MODELS_PATH,
+                        model_cache)
 
+    return fp_part
 
-def addDrawing(drawing, doc, pcb_id, container, shape="Circle"):
+
+@traced()
+def addDrawing(drawing, doc, pcb_id, container, shape="Circle", sketch=None):
     """
     Add a geometry to board sketch
-    Add an object with geometry properies to Part container (Drawings of Vias)
+    Add an object with geometry properies to Part container (Drawings)
+    If pcb has no sketch (fast geometry build mode), geometry is only stored as shape of object.
     :param drawing: pcb dictionary entry
     :param doc: FreeCAD document object
     :param pcb_id: string
     :param container: FreeCAD Part object
     :param shape: string (Circle, Rect, Polygon, Line, Arc)
-    :return:
+    :param sketch: Sketcher::SketchObject to add geometry to, board sketch is used if None
+    :return: FreeCAD Part::Feature object
     """
-    sketch = doc.getObject(f"Board_Sketch_{pcb_id}")
+    sketch = sketch or doc.getObject(f"Board_Sketch_{pcb_id}")
 
     # Create an object to store Tag
     obj = doc.addObject("Part::Feature", f"{shape}_{pcb_id}")
@@ -236,6 +375,13 @@ def addDrawing(drawing, doc, pcb_id, container, shape="Circle"):
     obj.Visibility = False
     container.addObject(obj)
 
+    if not sketch:
+        obj.Shape = getDrawingShape(drawing)
+        if "Circle" in shape:
+            obj.addProperty("App::PropertyFloat", "Radius")
+            obj.Radius = drawing["radius"] / SCALE
+        return obj
+
     if ("Rect" in shape) or ("Polygon" in shape):
         points, tags, geom_indexes = [], [], []
         for i, p in enumerate(drawing["points"]):
@@ -303,18 +449,129 @@ def addDrawing(drawing, doc, pcb_id, container, shape="Circle"):
         obj.addProperty("App::PropertyInteger", "ConstraintRadius", "Sketch")
         obj.ConstraintRadius = sketch.ConstraintCount - 1
 
+    return obj
+
 
-def drawPcb(doc, doc_gui, pcb, MODELS_PATH):
+def getDrawingShape(drawing):
+    """
+    Returns edge (Line, Arc) or closed wire (Rect, Polygon, Circle) of drawing
+    :param drawing: pcb dictionary entry (drawing or via)
+    :return: Part.Shape
     """
-    Creates PCB from dictionary as Part object in FC
+    shape = drawing.get("shape", "Circle")
+
+    if shape in ("Rect", "Polygon"):
+        points = [FreeCADVector(p) for p in drawing["points"]]
+        return Part.makePolygon(points + [points[0]])
+    elif shape == "Line":
+        return Part.LineSegment(FreeCADVector(drawing["start"]),
+                                FreeCADVector(drawing["end"])).toShape()
+    elif shape == "Arc":
+        points = [FreeCADVector(p) for p in drawing["points"]]
+        return Part.Arc(points[0], points[1], points[2]).toShape()
+    else:
+        return Part.Wire(Part.makeCircle(drawing["radius"] / SCALE, FreeCADVector(drawing["center"])))
+
+
+@traced()
+def makeBoardShape(pcb):
+    """
+    Build board solid directly from pcb dictionary (no sketch, no constraints):
+    outline wires -> face with holes (drawings, pads, vias) -> extruded by pcb thickness
+    :param pcb: pcb dictionary
+    :return: Part.Shape
+    """
+    wires, edges = [], []
+    # Loop ID -> list of (sequence index, edge), for drawings with loops computed on KiCAD side
+    loops = {}
+    for drawing in pcb.get("drawings") or []:
+        shape = getDrawingShape(drawing)
+        # Lines and arcs are joined to wires, other shapes are already closed
+        if drawing["shape"] not in ("Line", "Arc"):
+            wires.append(shape)
+        elif drawing.get("loop"):
+            loops.setdefault(drawing["loop"]["id"], []).append((drawing["loop"]["seq"], shape))
+        else:
+            edges.append(shape)
+
+    # Edges of loops are already in order
+    for loop in loops.values():
+        wire = Part.Wire([shape for seq, shape in sorted(loop, key=lambda e: e[0])])
+        if wire.isClosed():
+            wires.append(wire)
+
+    # Drawings without loops (e.g. added by diff): find connected edges
+    for group in Part.sortEdges(edges):
+        wire = Part.Wire(group)
+        if wire.isClosed():
+            wires.append(wire)
+
+    # Pad holes
+    for footprint in pcb.get("footprints") or []:
+        base = FreeCADVector(footprint["pos"])
+        for pad in footprint.get("pads_pth") or []:
+            radius = pad["hole_size"][0] / SCALE / 2
+            wires.append(Part.Wire(Part.makeCircle(radius, base + FreeCADVector(pad["pos_delta"]))))
+
+    # Vias
+    for via in pcb.get("vias") or []:
+        wires.append(getDrawingShape(via))
+
+    if not wires:
+        return Part.Shape()
+
+    # Bullseye face maker makes holes from wires inside of other wires (same as extruding sketch)
+    face = Part.makeFace(wires, "Part::FaceMakerBullseye")
+
+    return face.extrude(App.Vector(0, 0, -(pcb["general"]["thickness"] / SCALE)))
+
+
+def setBoardColor(board):
+    """Set board color to HTML #339966"""
+    if App.GuiUp:
+        board.ViewObject.ShapeColor = (0.20000000298023224, 0.6000000238418579, 0.4000000059604645, 0.0)
+
+
+@traced()
+def constrainOutline(sketch, pcb, drawing_tags):
+    """
+    Coincident constraint board outline: by loops from KiCAD if pcb has them, otherwise by comparing geometries
+    :param sketch: Sketcher::SketchObject
+    :param pcb: pcb dictionary
+    :param drawing_tags: dictionary of drawing KIID -> Tag of geometry in sketch
+    """
+    if pcb["general"].get("edge_loops"):
+        coincidentLoops(sketch, pcb.get("drawings") or [], drawing_tags)
+    else:
+        coincidentGeometry(sketch)
+
+
+def drawPcbSteps(doc, doc_gui, pcb, MODELS_PATH, model_cache=None, model_loader=None, build_mode="Sketch",
+                 preload=None):
+    """
+    Creates PCB from dictionary as Part object in FC, step by step:
+    generator yields progress (done, total) after every drawing, via and footprint, so drawing can be
+    split to time slices (see draw_job.py). Returns pcb Part object (StopIteration value).
+    Build modes:
+        "Sketch" - board is extruded from constrained sketch
+        "Partitioned" - outline, vias and holes of each footprint are in separate sketches (small solver systems),
+                        combined at extrusion
+        "Fast" - board solid is built directly from geometry (no sketch, no constraints), for very large boards
     :param doc: FreeCAD document object
     :param doc_gui: FreeCAD Document GUI object
     :param pcb: pcb dictionary, from which to generate PCB part
     :param MODELS_PATH: string (models directory path)
-    :return: FreeCAD Part object
+    :param model_cache: ModelCache object (persistent cache of converted models) or None
+    :param model_loader: ModelLoader object (draw placeholders, models are loaded when loader is started) or None
+    :param build_mode: string ("Sketch", "Partitioned" or "Fast")
+    :param preload: threading.Thread converting models to cache (footprints are drawn when it is done) or None
+    :return: generator of (int, int) tuples
     """
-    # Draft need to be activated
-    Gui.activateWorkbench("DraftWorkbench")
+    # Number of steps: every drawing, via, footprint and model + board constraints, board solid and recompute
+    total = len(pcb.get("drawings") or []) + len(pcb.get("vias") or []) + len(pcb.get("footprints") or []) + 3
+    if not model_loader:
+        total += sum(len(footprint.get("3d_models") or []) for footprint in pcb.get("footprints") or [])
+    done = 0
 
     try:  # Delete pcb object with same name if it exists
         obj = doc.getObject(pcb["general"]["pcb_name"] + "_" + pcb["general"]["pcb_id"])
@@ -330,17 +587,36 @@ def drawPcb(doc, doc_gui, pcb, MODELS_PATH):
     # Create parent part
     pcb_part = doc.addObject("App::Part", pcb["general"]["pcb_name"] + "_" + pcb["general"]["pcb_id"])
     pcb_id = pcb["general"]["pcb_id"]
-    # Add entire JSON file string as property of parent part
-    pcb_part.addProperty("App::PropertyString", "JSON", "Data")
-    pcb_part.JSON = str(pcb)
+    # Compressed snapshot of pcb dictionary (written when drawing is done, see pcb_state.py)
+    addPcbStateProperties(pcb_part)
+    # Save build mode, so diffs are applied the same way board was built
+    pcb_part.addProperty("App::PropertyString", "BuildMode", "Data")
+    pcb_part.BuildMode = build_mode
+
+    # Library of model masters (each unique model is imported once, footprints link to it)
+    models_part = doc.addObject("App::Part", f"Models_{pcb_id}")
+    models_part.Visibility = False
+    pcb_part.addObject(models_part)
 
     board_geoms_part = doc.addObject("App::Part", f"Board_Geoms_{pcb_id}")
     pcb_part.addObject(board_geoms_part)
 
-    sketch = doc.addObject("Sketcher::SketchObject", f"Board_Sketch_{pcb_id}")
-    board_geoms_part.addObject(sketch)
+    sketch, vias_sketch = None, None
+    if build_mode in ("Sketch", "Partitioned"):
+        sketch = doc.addObject("Sketcher::SketchObject", f"Board_Sketch_{pcb_id}")
+        board_geoms_part.addObject(sketch)
+    if build_mode == "Partitioned":
+        vias_sketch = doc.addObject("Sketcher::SketchObject", f"Vias_Sketch_{pcb_id}")
+        vias_sketch.Visibility = False
+        board_geoms_part.addObject(vias_sketch)
+        # Container for hole sketches of footprints (created in addFootprintPart)
+        hole_sketches_part = doc.addObject("App::Part", f"Hole_Sketches_{pcb_id}")
+        hole_sketches_part.Visibility = False
+        board_geoms_part.addObject(hole_sketches_part)
 
     # DRAWINGS
+    # KIID -> Tag of (first) geometry in sketch, used for constraining board outline loops
+    drawing_tags = {}
     drawings = pcb.get("drawings")
     if drawings:
         # Create Drawings container
@@ -349,52 +625,63 @@ def drawPcb(doc, doc_gui, pcb, MODELS_PATH):
         board_geoms_part.addObject(drawings_part)
         # Add drawings to sketch and container
         for drawing in drawings:
-            addDrawing(drawing=drawing,
-                       doc=doc,
-                       pcb_id=pcb_id,
-                       container=drawings_part,
-                       shape=drawing["shape"])
+            obj = addDrawing(drawing=drawing,
+                             doc=doc,
+                             pcb_id=pcb_id,
+                             container=drawings_part,
+                             shape=drawing["shape"])
+            if obj.Tags:
+                drawing_tags[drawing["kiid"]] = obj.Tags[0]
+            done += 1
+            yield done, total
     # VIAs
-    vias = pcb.get("vias")
-    if vias:
-        vias_part = doc.addObject("App::Part", f"Vias_{pcb_id}")
-        vias_part.Visibility = False
-        board_geoms_part.addObject(vias_part)
-        # Add vias to sketch and container
-        for via in vias:
-            addDrawing(drawing=via,
-                       doc=doc,
-                       pcb_id=pcb_id,
-                       container=vias_part)
-
-    # Constraints
-    coincidentGeometry(sketch)
-
-    # EXTRUDE
-    pcb_extr = doc.addObject('Part::Extrusion', f"Board_{pcb_id}")
-    board_geoms_part.addObject(pcb_extr)
-    pcb_extr.Base = sketch
-    pcb_extr.DirMode = "Normal"
-    pcb_extr.DirLink = None
-    pcb_extr.LengthFwd = -(pcb["general"]["thickness"] / SCALE)
-    pcb_extr.LengthRev = 0
-    pcb_extr.Solid = True
-    pcb_extr.Reversed = False
-    pcb_extr.Symmetric = False
-    pcb_extr.TaperAngle = 0
-    pcb_extr.TaperAngleRev = 0
-    pcb_extr.ViewObject.ShapeColor = getattr(doc.getObject(f"Board_{pcb_id}").getLinkedObject(True).ViewObject,
-                                             'ShapeColor', pcb_extr.ViewObject.ShapeColor)
-    pcb_extr.ViewObject.LineColor = getattr(doc.getObject(f"Board_{pcb_id}").getLinkedObject(True).ViewObject,
-                                            'LineColor', pcb_extr.ViewObject.LineColor)
-    pcb_extr.ViewObject.PointColor = getattr(doc.getObject(f"Board_{pcb_id}").getLinkedObject(True).ViewObject,
-                                             'PointColor', pcb_extr.ViewObject.PointColor)
-    # Set extrude pcb color to HTML #339966
-    doc_gui.getObject(pcb_extr.Label).ShapeColor = (0.20000000298023224, 0.6000000238418579, 0.4000000059604645, 0.0)
-
-    sketch.Visibility = False
+    # All vias (and pads) are stored in single store object (see item_store.py)
+    via_store = createItemStore(doc, f"Via_Store_{pcb_id}", board_geoms_part)
+    for via in pcb.get("vias") or []:
+        # Add vias to sketch and store
+        addVia(via=via,
+               doc=doc,
+               pcb_id=pcb_id,
+               store=via_store,
+               sketch=vias_sketch)
+        done += 1
+        yield done, total
+    via_store.flush()
+
+    if sketch and not vias_sketch:
+        # Constraints
+        constrainOutline(sketch, pcb, drawing_tags)
+
+        # EXTRUDE
+        with span("extrusion"):
+            pcb_extr = doc.addObject('Part::Extrusion', f"Board_{pcb_id}")
+            board_geoms_part.addObject(pcb_extr)
+            pcb_extr.Base = sketch
+            pcb_extr.DirMode = "Normal"
+            pcb_extr.DirLink = None
+            pcb_extr.LengthFwd = -(pcb["general"]["thickness"] / SCALE)
+            pcb_extr.LengthRev = 0
+            pcb_extr.Solid = True
+            pcb_extr.Reversed = False
+            pcb_extr.Symmetric = False
+            pcb_extr.TaperAngle = 0
+            pcb_extr.TaperAngleRev = 0
+            setBoardColor(pcb_extr)
+
+        sketch.Visibility = False
+
+    done += 1
+    yield done, total
+
+    # Wait for models to be converted (drawings and vias are drawn meanwhile), without blocking GUI
+    if preload:
+        with span("waitPreload"):
+            while preload.is_alive():
+                preload.join(0.01)
+                yield done, total
 
     # FOOTPRINTS
+    pad_store = createItemStore(doc, f"Pad_Store_{pcb_id}", board_geoms_part)
     footprints = pcb.get("footprints")
     if footprints:
         # Create Footprint container and add it to PCB Part
@@ -407,22 +694,94 @@ def drawPcb(doc, doc_gui, pcb, MODELS_PATH):
         footprints_part.addObject(fps_bot_part)
 
         for footprint in footprints:
-            addFootprintPart(footprint, doc, pcb, MODELS_PATH)
+            fp_part = addFootprintPart(footprint, doc, pcb, MODELS_PATH, model_cache, model_loader, pad_store,
+                                       import_models=False)
+            done += 1
+            yield done, total
+            # Every model is imported in its own step (.step import is the longest step)
+            if not model_loader:
+                for model in footprint.get("3d_models") or []:
+                    importModel(model, footprint, fp_part, doc, pcb_id, pcb["general"]["thickness"], MODELS_PATH,
+                                model_cache)
+                    done += 1
+                    yield done, total
+    pad_store.flush()
+
+    if vias_sketch:
+        # Constraints (outline sketch only)
+        constrainOutline(sketch, pcb, drawing_tags)
+
+        # All sketches are combined in compound, which is extruded
+        # (extrusion makes holes from wires inside of other wires, as with single sketch)
+        with span("extrusion"):
+            compound = doc.addObject("Part::Compound", f"Board_Compound_{pcb_id}")
+            board_geoms_part.addObject(compound)
+            compound.Links = [sketch, vias_sketch] + doc.getObject(f"Hole_Sketches_{pcb_id}").Group
+            compound.Visibility = False
+
+            pcb_extr = doc.addObject('Part::Extrusion', f"Board_{pcb_id}")
+            board_geoms_part.addObject(pcb_extr)
+            pcb_extr.Base = compound
+            pcb_extr.DirMode = "Custom"
+            pcb_extr.Dir = VEC["z"]
+            pcb_extr.LengthFwd = -(pcb["general"]["thickness"] / SCALE)
+            pcb_extr.Solid = True
+            setBoardColor(pcb_extr)
+
+        sketch.Visibility = False
+
+    elif not sketch:
+        # Board solid is built when all pads are known
+        board = doc.addObject("Part::Feature", f"Board_{pcb_id}")
+        board_geoms_part.addObject(board)
+        board.Shape = makeBoardShape(pcb)
+        setBoardColor(board)
+
+    done += 1
+    yield done, total
+
+    with span("recompute"):
+        doc.recompute()
+    if App.GuiUp:
+        Gui.SendMsgToActiveView("ViewFit")
+
+    with span("writePcbState"):
+        writePcbState(pcb_part, pcb)
 
-    doc.recompute()
-    # Hide grid from Draft module
-    Gui.runCommand("Draft_ToggleGrid")
-    Gui.SendMsgToActiveView("ViewFit")
+    yield total, total
 
     return pcb_part
 
 
-def updatePartFromDiff(doc, pcb, diff):
+def drawPcb(doc, doc_gui, pcb, MODELS_PATH, model_cache=None, model_loader=None, build_mode="Sketch"):
+    """
+    Creates PCB from dictionary as Part object in FC (all steps at once, see drawPcbSteps)
+    :param doc: FreeCAD document object
+    :param doc_gui: FreeCAD Document GUI object
+    :param pcb: pcb dictionary, from which to generate PCB part
+    :param MODELS_PATH: string (models directory path)
+    :param model_cache: ModelCache object (persistent cache of converted models) or None
+    :param model_loader: ModelLoader object (draw placeholders, models are loaded when loader is started) or None
+    :param build_mode: string ("Sketch", "Partitioned" or "Fast")
+    :return: FreeCAD Part object
+    """
+    steps = drawPcbSteps(doc, doc_gui, pcb, MODELS_PATH, model_cache, model_loader, build_mode)
+    while True:
+        try:
+            next(steps)
+        except StopIteration as e:
+            return e.value
+
+
+@traced()
+def updatePartFromDiff(doc, pcb, diff, MODELS_PATH="", model_cache=None):
     """
     Updates Part objects in FC and updates internal pcb dictionary
     :param doc: FreeCAD document object
     :param pcb: dict
     :param diff: dict
+    :param MODELS_PATH: string (models directory path, for models of added footprints and changed model files)
+    :param model_cache: ModelCache object or None
     :return:
     """
 
@@ -430,103 +789,20 @@ def updatePartFromDiff(doc, pcb, diff):
     sketch = doc.getObject(f"Board_Sketch_{pcb_id}")
 
     if diff.get("footprints"):
-        updateFootprints(doc, pcb, diff, sketch)
+        updateFootprints(doc, pcb, diff, sketch, MODELS_PATH, model_cache)
 
     if diff.get("drawings"):
         updateDrawings(doc, pcb, diff, sketch)
 
     if diff.get("vias"):
-        updateVias(doc, pcb, diff, sketch)
+        # Vias have their own sketch in partitioned build mode
+        updateVias(doc, pcb, diff, doc.getObject(f"Vias_Sketch_{pcb_id}") or sketch)
 
-    # Add new PCB dictionary as Property of pcb_Part
+    # Snapshot of pcb dictionary is written when document is saved (see pcb_state.PcbState)
     pcb_name = pcb["general"]["pcb_name"]
     pcb_part = doc.getObject(f"{pcb_name}_{pcb_id}")
-    pcb_part.JSON = str(pcb)
 
+    # Fast geometry build mode: rebuild board solid from updated dictionary
+    if getattr(pcb_part, "BuildMode", "Sketch") == "Fast":
+        doc.getObject(f"Board_{pcb_id}").Shape = makeBoardShape(pcb)
 
-def scanFootprints(doc, pcb):
-    """
-    Scans data of all objects in FreeCAD and updates pcb dictionary
-    :param doc: FreeCAD document object
-    :param pcb: dict
-    :return:
-    """
-    # TODO function need to get all properties of fp (getFPData) and calculate hash, then compare new hash to old
-    #  to see if fp was changed. (like it is on KC side)
-    # Footprint would need to contain all properties as it does in KC
-
-    # Currently works with updating position of fp, and position of pads
-
-    # TODO build a diff dictionary to send back to KiCAD
-
-    pcb_id = pcb["general"]["pcb_id"]
-    sketch = doc.getObject(f"Board_Sketch_{pcb_id}")
-    footprint_list = pcb["footprints"]
-
-    # Get FC object corresponding to pcb_id
-    pcb_part = doc.getObject(pcb["general"]["pcb_name"] + f"_{pcb_id}")
-    # Get footprints part container
-    fps_parts = pcb_part.getObject(f"Footprints_{pcb_id}")
-
-    # Go through top and bot footprint containers
-    for fp_part in fps_parts.getObject(f"Top_{pcb_id}").Group + fps_parts.getObject(f"Bot_{pcb_id}").Group:
-
-        # Get corresponding footprint in dictionary to be edited
-        footprint = getDictEntryByKIID(footprint_list, fp_part.KIID)
-        # Skip if failed to get footprint in dictionary
-        if not footprint:
-            continue
-
-        # Update dictionary entry with new position coordinates
-        footprint.update({"pos": toList(fp_part.Placement.Base)})
-
-        # TODO update other properties
-        # TODO handle rotation (move holes in sketch)
-
-        # Model changes in FC are ignored (no KIID)
-
-        # Handle change of Pad Position Delta in object (feature) and change of footprint position in sketch:
-
-        # Get FC container Part where pad objects are stored
-        pads_part = getPadContainer(fp_part)
-        # Check if gotten pads part
-        if not pads_part:
-            continue
-
-        # Go through pads
-        for pad_part in pads_part.Group:
-            # Get corresponding pad in dictionary to be edited
-            pad = getDictEntryByKIID(footprint["pads_pth"], pad_part.KIID)
-            # Get sketch geometry by Tag:
-            # first get index (single entry in list) of pad geometry in sketch
-            geom_index = getGeomsByTags(sketch, pad_part.Tags)[0]
-            # get geometry by index
-            pad_geom = sketch.Geometry[geom_index]
-            # Check if gotten dict entry and sketch geometry
-            if not pad and not pad_geom:
-                continue
-
-            # ----- If pad position delta was edited as vector attribute by user:  -----------
-            # Compare dictionary deltas to property deltas
-            if pad["pos_delta"] != toList(pad_part.PosDelta):
-                # Update dictionary with new deltas
-                pad.update({"pos_delta": toList(pad_part.PosDelta)})
-                # Move geometry in sketch to new position
-                sketch.movePoint(geom_index,  # Index of geometry
-                                 3,  # Index of vertex (3 is center)
-                                 fp_part.Placement.Base + pad_part.PosDelta)  # New position
-
-            # ------- If pad was moved in sketch by user:  -----------------------------------
-            # Check if pad is first pad of footprint (with relative pos 0) -> this is footprint base
-            if pad_part.PosDelta == App.Vector(0, 0, 0):
-                # Get new footprint base
-                new_base = pad_geom.Center
-                # Compare geometry position with pad object position, if not same: sketch has been edited
-                if new_base != pad_part.Placement.Base:
-                    # Move footprint to new base position
-                    fp_part.Placement.Base = new_base
-                    # Update footprint dictionary entry with new position
-                    footprint.update({"pos": toList(new_base)})
-
-            # Update pad absolute placement property for all pads
-            pad_part.Placement.Base = pad_geom.Center
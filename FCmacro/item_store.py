@@ -0,0 +1,151 @@
+import FreeCAD as App
+import Part
+
+from constants import VEC
+
+"""
+    Packed storage of circular holes (vias, through hole pads)
+    Instead of one document object per hole, all holes of a category are stored in single hidden Part::Feature
+    as parallel list properties (KIIDs, Tags, Radii, Positions, ...) and one compound shape of circles.
+    ItemStore wraps this object: lists are edited in memory and written back to object with flush().
+"""
+
+
+def createItemStore(doc, name, container):
+    """
+    Create empty store object and add it to container
+    :param doc: FreeCAD document object
+    :param name: string (object name, e.g. Via_Store_{pcb_id})
+    :param container: FreeCAD Part object
+    :return: ItemStore object
+    """
+    obj = doc.addObject("Part::Feature", name)
+    # KiCAD IDs of items
+    obj.addProperty("App::PropertyStringList", "KIIDs", "KiCAD")
+    # KiCAD IDs of footprints (pads), empty string for vias
+    obj.addProperty("App::PropertyStringList", "FootprintKIIDs", "KiCAD")
+    # Tags of sketch geometries (empty string if pcb has no sketch)
+    obj.addProperty("App::PropertyStringList", "Tags", "Sketch")
+    obj.addProperty("App::PropertyFloatList", "Radii")
+    # Absolute positions of hole centers
+    obj.addProperty("App::PropertyVectorList", "Positions")
+    # Position relative to footprint (pads), zero vector for vias
+    obj.addProperty("App::PropertyVectorList", "PosDeltas")
+    obj.Visibility = False
+    container.addObject(obj)
+
+    return ItemStore(obj)
+
+
+def getItemStore(doc, name):
+    """Returns ItemStore of object with name, None if object doesn't exist"""
+    obj = doc.getObject(name)
+    if not obj:
+        return None
+
+    return ItemStore(obj)
+
+
+class ItemStore:
+
+    def __init__(self, obj):
+        """
+        :param obj: store Part::Feature object (see createItemStore)
+        """
+        self.obj = obj
+        self.kiids = list(obj.KIIDs)
+        self.fp_kiids = list(obj.FootprintKIIDs)
+        self.tags = list(obj.Tags)
+        self.radii = list(obj.Radii)
+        self.positions = list(obj.Positions)
+        self.pos_deltas = list(obj.PosDeltas)
+        self.dirty = False
+        self.reindex()
+
+    def reindex(self):
+        """Rebuild KIID -> index map"""
+        self.index = {kiid: i for i, kiid in enumerate(self.kiids)}
+
+    def __len__(self):
+        return len(self.kiids)
+
+    def find(self, kiid):
+        """Returns index of item with KIID, None if not in store"""
+        return self.index.get(kiid)
+
+    def getFootprintItems(self, fp_kiid):
+        """Returns indexes of items (pads) of footprint, in order they were added"""
+        return [i for i, k in enumerate(self.fp_kiids) if k == fp_kiid]
+
+    def groupByFootprint(self):
+        """Returns dictionary of footprint KIID -> list of indexes of its items (pads)"""
+        groups = {}
+        for i, fp_kiid in enumerate(self.fp_kiids):
+            groups.setdefault(fp_kiid, []).append(i)
+
+        return groups
+
+    def add(self, kiid, tag, radius, position, fp_kiid="", pos_delta=None):
+        """
+        Add item to store
+        :param kiid: string
+        :param tag: string (Tag of sketch geometry, empty string if there is no sketch)
+        :param radius: float (mm)
+        :param position: FreeCAD Vector (absolute position)
+        :param fp_kiid: string (KIID of footprint of pad)
+        :param pos_delta: FreeCAD Vector (position relative to footprint)
+        :return: int (index of item)
+        """
+        self.index[kiid] = len(self.kiids)
+        self.kiids.append(kiid)
+        self.fp_kiids.append(fp_kiid)
+        self.tags.append(tag)
+        self.radii.append(radius)
+        self.positions.append(position)
+        self.pos_deltas.append(pos_delta or App.Vector(0, 0, 0))
+        self.dirty = True
+
+        return len(self.kiids) - 1
+
+    def remove(self, kiids):
+        """Remove items with KIIDs from store"""
+        kiids = set(kiids)
+        keep = [i for i, kiid in enumerate(self.kiids) if kiid not in kiids]
+        if len(keep) == len(self.kiids):
+            return
+
+        self.kiids = [self.kiids[i] for i in keep]
+        self.fp_kiids = [self.fp_kiids[i] for i in keep]
+        self.tags = [self.tags[i] for i in keep]
+        self.radii = [self.radii[i] for i in keep]
+        self.positions = [self.positions[i] for i in keep]
+        self.pos_deltas = [self.pos_deltas[i] for i in keep]
+        self.reindex()
+        self.dirty = True
+
+    def setPosition(self, index, position):
+        self.positions[index] = position
+        self.dirty = True
+
+    def setPosDelta(self, index, pos_delta):
+        self.pos_deltas[index] = pos_delta
+        self.dirty = True
+
+    def setRadius(self, index, radius):
+        self.radii[index] = radius
+        self.dirty = True
+
+    def flush(self):
+        """Write lists to store object properties and rebuild compound shape (only if store was changed)"""
+        if not self.dirty:
+            return
+
+        self.obj.KIIDs = self.kiids
+        self.obj.FootprintKIIDs = self.fp_kiids
+        self.obj.Tags = self.tags
+        self.obj.Radii = self.radii
+        self.obj.Positions = self.positions
+        self.obj.PosDeltas = self.pos_deltas
+        self.obj.Shape = Part.makeCompound([Part.makeCircle(radius, position, VEC["z"])
+                                            for radius, position in zip(self.radii, self.positions)])
+        self.dirty = False
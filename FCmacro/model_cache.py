@@ -0,0 +1,247 @@
+import FreeCAD as App
+import Part
+
+import argparse
+import hashlib
+import json
+import os
+
+"""
+    Persistent on-disk cache of converted 3D models
+    Each model is stored as native BREP file plus JSON file with face colors.
+    Cache entries are keyed by digest of model file path, modification time and size,
+    so changed .step files are converted again automatically.
+"""
+
+
+def getShapeAndColors(obj, default_colors=True):
+    """
+    Get shape of imported model (including all child features) and per-face colors in same order
+    :param obj: FreeCAD object (imported model, can be App::Part with child features)
+    :param default_colors: bool (faces are grey if colors can't be read, e.g. FreeCADCmd older than 1.0,
+                           otherwise colors are None)
+    :return: Part.Shape, list of (r, g, b, a) tuples or None
+    """
+    shapes, colors = [], []
+    # Colors of some feature couldn't be read (no GUI and no App side colors)
+    colorless = []
+    root_placement = obj.Placement.inverse() if hasattr(obj, "Placement") else App.Placement()
+
+    def collect(o):
+        # Containers (App::Part) - go through children
+        if hasattr(o, "Group"):
+            for child in o.Group:
+                collect(child)
+            return
+        if not hasattr(o, "Shape") or o.Shape.isNull():
+            return
+
+        shape = o.Shape.copy()
+        # Placement relative to root object of model
+        shape.Placement = root_placement.multiply(o.getGlobalPlacement())
+        shapes.append(shape)
+
+        face_count = len(shape.Faces)
+        face_colors = []
+        if App.GuiUp and hasattr(o, "ViewObject") and o.ViewObject:
+            face_colors = list(o.ViewObject.DiffuseColor)
+        elif hasattr(o, "ShapeAppearance"):
+            # FreeCAD 1.0 stores colors on App side (available in FreeCADCmd)
+            face_colors = [m.DiffuseColor for m in o.ShapeAppearance]
+        else:
+            colorless.append(o)
+        # Single color means whole shape is same color
+        if len(face_colors) == 1:
+            face_colors = face_colors * face_count
+        if len(face_colors) != face_count:
+            face_colors = [(0.8, 0.8, 0.8, 0.0)] * face_count
+        colors.extend(face_colors)
+
+    collect(obj)
+    if colorless and not default_colors:
+        return Part.makeCompound(shapes), None
+
+    return Part.makeCompound(shapes), colors
+
+
+class ModelCache:
+
+    def __init__(self, path, size_limit):
+        """
+        :param path: string (cache directory path)
+        :param size_limit: int (maximum size of cache in bytes)
+        """
+        self.path = path
+        self.size_limit = size_limit
+        os.makedirs(self.path, exist_ok=True)
+
+    def getKey(self, file_path):
+        """Returns digest of file path, modification time and size, None if file doesn't exist"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        key = f"{os.path.normcase(os.path.abspath(file_path))}|{stat.st_mtime_ns}|{stat.st_size}"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def getPaths(self, key):
+        """Returns paths of .brep and .json files of cache entry"""
+        return (os.path.join(self.path, f"{key}.brep"),
+                os.path.join(self.path, f"{key}.json"))
+
+    def contains(self, file_path):
+        key = self.getKey(file_path)
+        return bool(key) and os.path.isfile(self.getPaths(key)[0])
+
+    def get(self, file_path):
+        """
+        Read converted model from cache
+        :param file_path: string (path to .step file)
+        :return: Part.Shape, list of colors or None, None if model is not cached
+        """
+        key = self.getKey(file_path)
+        if not key:
+            return None, None
+        brep_path, json_path = self.getPaths(key)
+        try:
+            shape = Part.Shape()
+            shape.read(brep_path)
+            with open(json_path, "r") as f:
+                colors = [tuple(c) for c in json.load(f)["colors"]]
+        except (OSError, ValueError, KeyError, Part.OCCError):
+            return None, None
+
+        # Update access time of entry (used for LRU eviction)
+        for p in (brep_path, json_path):
+            os.utime(p, None)
+
+        return shape, colors
+
+    def put(self, file_path, shape, colors, evict=True):
+        """
+        Write converted model to cache, evict least recently used entries if cache is too big
+        :param file_path: string (path to .step file)
+        :param shape: Part.Shape
+        :param colors: list of (r, g, b, a) tuples
+        :param evict: bool (False when called from preload worker processes, main process evicts)
+        """
+        key = self.getKey(file_path)
+        if not key:
+            return
+        brep_path, json_path = self.getPaths(key)
+
+        # Write to temporary files first, so other processes never read half written entries
+        tmp = f".{os.getpid()}.tmp"
+        shape.exportBrep(brep_path + tmp)
+        with open(json_path + tmp, "w") as f:
+            json.dump({"file_path": file_path, "colors": [list(c) for c in colors]}, f)
+        os.replace(json_path + tmp, json_path)
+        os.replace(brep_path + tmp, brep_path)
+
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until cache is smaller than size limit"""
+        entries = {}
+        total = 0
+        for name in os.listdir(self.path):
+            key, ext = os.path.splitext(name)
+            if ext not in (".brep", ".json"):
+                continue
+            stat = os.stat(os.path.join(self.path, name))
+            size, used = entries.get(key, (0, 0))
+            entries[key] = (size + stat.st_size, max(used, stat.st_mtime))
+            total += stat.st_size
+
+        # Oldest entries first
+        for key, (size, used) in sorted(entries.items(), key=lambda e: e[1][1]):
+            if total <= self.size_limit:
+                break
+            for p in self.getPaths(key):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+            total -= size
+
+
+def getModelFilenames(pcb):
+    """Returns set of unique model filenames used by footprints in pcb dictionary"""
+    filenames = set()
+    for footprint in pcb.get("footprints") or []:
+        for model in footprint.get("3d_models") or []:
+            filenames.add(model["filename"])
+
+    return filenames
+
+
+def convertModel(path):
+    """
+    Import .step file to temporary document and return shape and colors
+    :param path: string (path to .step file)
+    :return: Part.Shape, list of colors or None (colors can't be read in this process, model must not be cached)
+    """
+    doc = App.newDocument("ModelCacheConvert", hidden=True)
+    try:
+        if App.GuiUp:
+            import ImportGui
+            ImportGui.insert(path, doc.Name)
+        else:
+            import Import
+            Import.insert(path, doc.Name)
+        # Root objects of import (not children of imported assembly)
+        roots = [o for o in doc.Objects if not o.InList]
+        shapes, colors = [], []
+        for root in roots:
+            shape, root_colors = getShapeAndColors(root, default_colors=False)
+            shape.Placement = root.Placement if hasattr(root, "Placement") else App.Placement()
+            shapes.append(shape)
+            if colors is not None and root_colors is not None:
+                colors.extend(root_colors)
+            else:
+                colors = None
+    finally:
+        App.closeDocument(doc.Name)
+
+    return Part.makeCompound(shapes), colors
+
+
+def main(argv=None):
+    """
+    Pre-warm cache from pcb snapshot (data_indent.json exported by snapshot_store.py of KiCAD plugin)
+    Must be run with python that can import FreeCAD, e.g.:
+        FreeCADCmd -c "import sys; sys.path.append('<FCmacro dir>'); import model_cache; model_cache.main(['data_indent.json'])"
+    """
+    from config import MODELS_PATH, MODEL_CACHE_PATH, MODEL_CACHE_SIZE
+
+    parser = argparse.ArgumentParser(description="Pre-warm 3D model cache from pcb snapshot")
+    parser.add_argument("snapshot", help="pcb dictionary JSON file")
+    parser.add_argument("--models-path", default=MODELS_PATH)
+    parser.add_argument("--cache-path", default=MODEL_CACHE_PATH)
+    parser.add_argument("--cache-size", type=int, default=MODEL_CACHE_SIZE)
+    args = parser.parse_args(argv)
+
+    with open(args.snapshot, "r") as f:
+        pcb = json.load(f)
+
+    cache = ModelCache(args.cache_path, args.cache_size)
+    for filename in sorted(getModelFilenames(pcb)):
+        path = args.models_path + filename + ".step"
+        if cache.contains(path):
+            print(f"Cached: {filename}")
+            continue
+        try:
+            shape, colors = convertModel(path)
+        except Exception as e:
+            print(f"Failed: {filename} ({e})")
+            continue
+        if colors is None:
+            print(f"Skipped: {filename} (colors can't be read without GUI in this FreeCAD version)")
+            continue
+        cache.put(path, shape, colors)
+        print(f"Converted: {filename}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import FreeCAD as App
+import FreeCADGui as Gui
+import Part
+
+import heapq
+import itertools
+import time
+
+from PySide import QtCore
+
+from constants import SCALE
+from freecad_functions import importModel
+
+"""
+    Lazy loading of 3D models
+    Footprints first get a bounding box placeholder (from footprint extents), real models are then imported
+    in short time slices driven by QTimer, so the pcb can be inspected while models are loading.
+    Selected footprints are loaded first, then footprints visible in 3D view, then the rest.
+    Pending footprints are kept in heap, priorities are recomputed only when selection or camera changes.
+"""
+
+
+class ModelLoader:
+
+    def __init__(self, doc, pcb, MODELS_PATH, model_cache=None, placeholder_height=1.0, time_slice=0.03):
+        """
+        :param doc: FreeCAD document object
+        :param pcb: pcb dictionary
+        :param MODELS_PATH: string (models directory path)
+        :param model_cache: ModelCache object or None
+        :param placeholder_height: float (height of placeholder box in mm)
+        :param time_slice: float (max time in seconds spent importing models per timer tick)
+        """
+        self.doc = doc
+        self.pcb = pcb
+        self.MODELS_PATH = MODELS_PATH
+        self.model_cache = model_cache
+        self.placeholder_height = placeholder_height
+        self.time_slice = time_slice
+        # Heap of (priority, order, (footprint dictionary, fp_part name, placeholder name))
+        self.pending = []
+        # Order of adding, ties of priority are loaded in this order
+        self.counter = itertools.count()
+        # Selection and camera for which priorities were computed
+        self.view_state = None
+
+        self.timer = QtCore.QTimer()
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.loadNext)
+
+    def addPlaceholder(self, footprint, fp_part):
+        """
+        Add box placeholder to footprint Part container and queue footprint models for loading
+        :param footprint: footprint dictionary
+        :param fp_part: FreeCAD App::Part object
+        """
+        if not footprint.get("3d_models"):
+            return
+
+        extents = footprint.get("extents") or [-SCALE, -SCALE, SCALE, SCALE]
+        # Extents are in KiCAD coordinates (nm, y flipped)
+        min_x, max_x = extents[0] / SCALE, extents[2] / SCALE
+        min_y, max_y = -extents[3] / SCALE, -extents[1] / SCALE
+        width = max(max_x - min_x, 0.01)
+        length = max(max_y - min_y, 0.01)
+
+        thickness = self.pcb["general"]["thickness"] / SCALE
+        # Bottom placeholders are below the board
+        z = -thickness - self.placeholder_height if footprint["layer"] == "Bot" else 0
+
+        placeholder = self.doc.addObject("Part::Feature", f"Placeholder_{fp_part.Name}")
+        placeholder.Label = f"{footprint['ID']}_{footprint['ref']}_placeholder_{self.pcb['general']['pcb_id']}"
+        placeholder.Shape = Part.makeBox(width, length, self.placeholder_height, App.Vector(min_x, min_y, z))
+        placeholder.addProperty("App::PropertyBool", "Placeholder", "Base")
+        placeholder.Placeholder = True
+        if App.GuiUp:
+            placeholder.ViewObject.Transparency = 70
+        fp_part.addObject(placeholder)
+
+        heapq.heappush(self.pending, (2, next(self.counter), (footprint, fp_part.Name, placeholder.Name)))
+        # Priority of new footprint is computed on next tick
+        self.view_state = None
+
+    def queuePlaceholders(self):
+        """
+        Queue placeholders already in document (document saved while models were loading and reopened)
+        :return: int (number of queued footprints)
+        """
+        footprints = {footprint["kiid"]: footprint for footprint in self.pcb.get("footprints") or []}
+        queued = {entry[2] for _, _, entry in self.pending}
+        count = 0
+        for placeholder in self.doc.Objects:
+            if not getattr(placeholder, "Placeholder", False) or placeholder.Name in queued:
+                continue
+            # Footprint Part container of placeholder
+            fp_part = next((o for o in placeholder.InList if hasattr(o, "KIID")), None)
+            footprint = footprints.get(getattr(fp_part, "KIID", None))
+            if not footprint or not footprint.get("3d_models"):
+                continue
+            heapq.heappush(self.pending, (2, next(self.counter), (footprint, fp_part.Name, placeholder.Name)))
+            count += 1
+        self.view_state = None
+
+        return count
+
+    def start(self):
+        if self.pending:
+            self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def isLoading(self):
+        return self.timer.isActive()
+
+    def getPriority(self, fp_part, selected, view):
+        """Returns 0 for selected footprints, 1 for footprints visible in view, 2 for others"""
+        if fp_part.Name in selected:
+            return 0
+        if view:
+            try:
+                # Renamed from getPointOnScreen in newer FreeCAD versions
+                project = getattr(view, "getPointOnViewport", None) or view.getPointOnScreen
+                x, y = project(fp_part.getGlobalPlacement().Base)
+                width, height = view.getSize()
+                if 0 <= x <= width and 0 <= y <= height:
+                    return 1
+            except (AttributeError, RuntimeError):
+                pass
+        return 2
+
+    def getViewState(self):
+        """
+        Returns state of selection and camera, and active view
+        :return: (tuple (selected object names, camera, view size), view object or None)
+        """
+        if not App.GuiUp:
+            return ((), None, None), None
+
+        selection = tuple(obj.Name for obj in Gui.Selection.getSelection(self.doc.Name))
+        view = Gui.ActiveDocument.ActiveView if Gui.ActiveDocument else None
+        camera, size = None, None
+        if view:
+            try:
+                camera, size = view.getCamera(), tuple(view.getSize())
+            except (AttributeError, RuntimeError):
+                pass
+
+        return (selection, camera, size), view
+
+    def prioritize(self, view):
+        """Recompute priorities of pending footprints and rebuild heap"""
+        selected = set()
+        if App.GuiUp:
+            for obj in Gui.Selection.getSelection(self.doc.Name):
+                # Footprint is selected if it or any of its children is selected
+                selected.add(obj.Name)
+                selected.update(parent.Name for parent in obj.InListRecursive)
+
+        heap = []
+        for _, order, entry in self.pending:
+            fp_part = self.doc.getObject(entry[1])
+            # Removed footprints go first, so they are dropped from queue
+            priority = self.getPriority(fp_part, selected, view) if fp_part else -1
+            heap.append((priority, order, entry))
+        heapq.heapify(heap)
+        self.pending = heap
+
+    def loadNext(self):
+        """Timer callback: import models of highest priority footprints until time slice is used up"""
+        start = time.perf_counter()
+
+        # Reorder pending footprints only if selection or camera changed since last tick
+        view_state, view = self.getViewState()
+        if view_state != self.view_state:
+            self.view_state = view_state
+            self.prioritize(view)
+
+        while self.pending and (time.perf_counter() - start) < self.time_slice:
+            _, _, (footprint, fp_name, placeholder_name) = heapq.heappop(self.pending)
+            fp_part = self.doc.getObject(fp_name)
+            # Skip if footprint was removed or models were re-imported (by applying diff) in the meantime
+            if not fp_part or not self.doc.getObject(placeholder_name):
+                continue
+
+            for model in footprint["3d_models"]:
+                importModel(model, footprint, fp_part, self.doc, self.pcb["general"]["pcb_id"],
+                            self.pcb["general"]["thickness"], self.MODELS_PATH, self.model_cache)
+            self.doc.removeObject(placeholder_name)
+
+        if not self.pending:
+            self.timer.stop()
+            self.doc.recompute()
@@ -0,0 +1,106 @@
+import FreeCAD as App
+
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from model_cache import ModelCache, convertModel, getModelFilenames
+
+"""
+    Parallel preloading of 3D models
+    Unique .step files of pcb are converted to BREP in FreeCADCmd worker processes and written to model cache,
+    main (GUI) thread then only reads converted shapes from cache when placing models.
+    Models whose colors can't be read in FreeCADCmd (older than 1.0) are not cached, GUI process imports them.
+"""
+
+
+def getFreeCADCmdPath():
+    """Returns path to FreeCADCmd executable of running FreeCAD installation"""
+    name = "FreeCADCmd.exe" if os.name == "nt" else "FreeCADCmd"
+    return os.path.join(App.getHomePath(), "bin", name)
+
+
+def worker(paths, cache_path, cache_size):
+    """
+    Entry point of worker process: convert models and write them to cache
+    :param paths: list of strings (paths to .step files)
+    :param cache_path: string (cache directory path)
+    :param cache_size: int (cache size limit in bytes)
+    """
+    cache = ModelCache(cache_path, cache_size)
+    for path in paths:
+        if cache.contains(path):
+            continue
+        try:
+            shape, colors = convertModel(path)
+        except Exception as e:
+            print(f"[PRELOAD] Failed to convert {path}: {e}")
+            continue
+        # FreeCADCmd older than 1.0 has no App side colors: model is not cached, GUI process imports it with colors
+        if colors is None:
+            continue
+        # Main process evicts when all workers are done
+        cache.put(path, shape, colors, evict=False)
+
+
+def splitWork(paths, workers):
+    """
+    Split paths to (at most) workers chunks of about the same total file size (biggest files first)
+    :param paths: list of strings
+    :param workers: int
+    :return: list of lists of strings
+    """
+    chunks = [[] for _ in range(min(workers, len(paths)))]
+    sizes = [0] * len(chunks)
+    for path in sorted(paths, key=os.path.getsize, reverse=True):
+        # Add file to chunk with smallest total size
+        i = sizes.index(min(sizes))
+        chunks[i].append(path)
+        sizes[i] += os.path.getsize(path)
+
+    return chunks
+
+
+def preloadModels(pcb, MODELS_PATH, model_cache, workers=None, freecadcmd=None):
+    """
+    Convert all models of pcb, which are not cached yet, in parallel worker processes
+    :param pcb: pcb dictionary
+    :param MODELS_PATH: string (models directory path)
+    :param model_cache: ModelCache object
+    :param workers: int (number of worker processes, defaults to number of CPUs)
+    :param freecadcmd: string (path to FreeCADCmd executable)
+    :return: int (number of converted models)
+    """
+    workers = workers or os.cpu_count() or 1
+    freecadcmd = freecadcmd or getFreeCADCmdPath()
+
+    # Unique existing model files, not in cache yet
+    paths = []
+    for filename in getModelFilenames(pcb):
+        path = MODELS_PATH + filename + ".step"
+        if os.path.isfile(path) and not model_cache.contains(path):
+            paths.append(path)
+    if not paths:
+        return 0
+
+    def run(chunk):
+        # Arguments are passed as python literals in command string
+        command = (f"import sys; sys.path.append({os.path.dirname(os.path.abspath(__file__))!r}); "
+                   f"import model_preload; "
+                   f"model_preload.worker({chunk!r}, {model_cache.path!r}, {model_cache.size_limit!r})")
+        return subprocess.run([freecadcmd, "-c", command],
+                              stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT,
+                              universal_newlines=True)
+
+    chunks = splitWork(paths, workers)
+    # Threads only wait for worker processes, parsing happens in processes
+    with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+        for result in executor.map(run, chunks):
+            if result.returncode != 0:
+                print(f"[PRELOAD] Worker failed:\n{result.stdout}", file=sys.stderr)
+
+    model_cache.evict()
+
+    return sum(1 for path in paths if model_cache.contains(path))
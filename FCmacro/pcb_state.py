@@ -0,0 +1,143 @@
+import FreeCAD as App
+
+import ast
+import json
+import os
+import tempfile
+import zlib
+
+import plugin_dir  # Modules shared with KiCAD plugin are in plugin directory
+from pcb_digest import getPcbDigest
+
+"""
+    Pcb dictionary persisted in FreeCAD document
+    Snapshot is stored as compressed binary file included in document (App::PropertyFileIncluded of pcb part),
+    with version (number of applied diffs) and digest, so session can be resumed when document is reopened
+    without KiCAD sending whole board again. Applying diff only marks state as changed, snapshot is written
+    when document is saved.
+"""
+
+SNAPSHOT_MAGIC = b"KC2FCFC1"
+
+
+def encodeSnapshot(pcb):
+    """Returns pcb dictionary as compressed binary snapshot"""
+    return SNAPSHOT_MAGIC + zlib.compress(json.dumps(pcb, separators=(",", ":")).encode("utf-8"))
+
+
+def decodeSnapshot(data):
+    """Returns pcb dictionary from binary snapshot, None if data is not valid snapshot"""
+    if not data.startswith(SNAPSHOT_MAGIC):
+        return None
+    try:
+        return json.loads(zlib.decompress(data[len(SNAPSHOT_MAGIC):]).decode("utf-8"))
+    except (zlib.error, ValueError):
+        return None
+
+
+def addPcbStateProperties(pcb_part):
+    """Add snapshot properties to pcb Part object"""
+    pcb_part.addProperty("App::PropertyFileIncluded", "Snapshot", "Data")
+    pcb_part.addProperty("App::PropertyInteger", "SnapshotVersion", "Data")
+    pcb_part.addProperty("App::PropertyString", "SnapshotDigest", "Data")
+    for prop in ("Snapshot", "SnapshotVersion", "SnapshotDigest"):
+        pcb_part.setEditorMode(prop, 1)  # Read only
+
+
+def writePcbState(pcb_part, pcb):
+    """Write snapshot of pcb dictionary to pcb Part object"""
+    fd, temp_path = tempfile.mkstemp(suffix=".bin")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(encodeSnapshot(pcb))
+        # File is copied into document
+        pcb_part.Snapshot = temp_path
+    finally:
+        os.remove(temp_path)
+    pcb_part.SnapshotDigest = getPcbDigest(pcb)
+
+
+def loadPcbState(pcb_part):
+    """
+    Returns pcb dictionary stored in pcb Part object, None if there is none
+    Documents saved by older versions of plugin have pcb dictionary repr in JSON property
+    """
+    if getattr(pcb_part, "Snapshot", ""):
+        try:
+            with open(pcb_part.Snapshot, "rb") as f:
+                pcb = decodeSnapshot(f.read())
+        except OSError:
+            pcb = None
+        if pcb:
+            return pcb
+
+    if getattr(pcb_part, "JSON", ""):
+        try:
+            return ast.literal_eval(pcb_part.JSON)
+        except (ValueError, SyntaxError):
+            return None
+
+    return None
+
+
+def findPcbPart(doc):
+    """Returns first pcb Part object (drawn by plugin) in document, None if there is none"""
+    if not doc:
+        return None
+    for obj in doc.Objects:
+        if obj.TypeId == "App::Part" and (hasattr(obj, "Snapshot") or hasattr(obj, "JSON")):
+            return obj
+
+    return None
+
+
+class PcbState:
+
+    def __init__(self, doc, pcb_part, pcb):
+        """
+        :param doc: FreeCAD document object
+        :param pcb_part: pcb Part object
+        :param pcb: pcb dictionary (same object edited when diffs are applied)
+        """
+        self.doc = doc
+        self.pcb_part = pcb_part
+        self.pcb = pcb
+        self.changed = False
+        if not hasattr(pcb_part, "Snapshot"):
+            # Document saved by older version of plugin
+            addPcbStateProperties(pcb_part)
+            self.changed = True
+
+    def start(self):
+        App.addDocumentObserver(self)
+
+    def stop(self):
+        App.removeDocumentObserver(self)
+
+    def getVersion(self):
+        return self.pcb_part.SnapshotVersion
+
+    def getDigest(self):
+        """Returns digest of current pcb dictionary"""
+        if self.changed:
+            return getPcbDigest(self.pcb)
+        return self.pcb_part.SnapshotDigest
+
+    def markChanged(self):
+        """Called after diff is applied to pcb dictionary (snapshot is written when document is saved)"""
+        self.pcb_part.SnapshotVersion += 1
+        self.changed = True
+
+    def write(self):
+        if not self.changed:
+            return
+        writePcbState(self.pcb_part, self.pcb)
+        # Pcb dictionary repr written by older versions of plugin is not needed anymore
+        if hasattr(self.pcb_part, "JSON"):
+            self.pcb_part.removeProperty("JSON")
+        self.changed = False
+
+    # Observer slot
+    def slotStartSaveDocument(self, doc, file_name):
+        if doc == self.doc:
+            self.write()
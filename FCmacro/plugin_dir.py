@@ -0,0 +1,13 @@
+import os
+import sys
+
+"""
+    Modules shared with KiCAD plugin (tracing, framing, payload_log, memory_report, pcb_digest) are kept only once,
+    in plugin directory (parent of FCmacro directory). Importing this module adds plugin directory to module search
+    path, after FCmacro directory, so FCmacro modules of same name (utils) are still found first.
+"""
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if PLUGIN_DIR not in sys.path:
+    sys.path.append(PLUGIN_DIR)
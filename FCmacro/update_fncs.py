@@ -3,23 +3,47 @@ import FreeCADGui as Gui
 import Part
 import Sketcher
 
+import math
+import numpy as np
+
 from utils import *
 from constants import SCALE, VEC
 from constraints import *
+from item_store import getItemStore
+import plugin_dir  # Modules shared with KiCAD plugin are in plugin directory
+from tracing import traced
+
 
+def updateDrawingShape(obj, drawing):
+    """Update shape of drawing/via object from dictionary entry (used when pcb has no sketch)"""
+    # Imported here: freecad_functions imports this module
+    from freecad_functions import getDrawingShape
+    obj.Shape = getDrawingShape(drawing)
+    if drawing.get("radius"):
+        obj.Radius = drawing["radius"] / SCALE
 
-def updateFootprints(doc, pcb, diff, sketch):
+
+@traced()
+def updateFootprints(doc, pcb, diff, sketch, MODELS_PATH="", model_cache=None):
+    # Imported here: freecad_functions imports this module
+    from freecad_functions import addFootprintPart, importModel
 
     key = "footprints"
+    pcb_id = pcb["general"]["pcb_id"]
     changed = diff[key].get("changed")
     added = diff[key].get("added")
     removed = diff[key].get("removed")
 
 
+    # Pads of all footprints are in single store, written back to document once at the end
+    pad_store = getItemStore(doc, f"Pad_Store_{pcb_id}")
+    # Footprints with changed position/ rotation/ pad deltas, their pads are moved in one batch
+    moved, rotations, exact_pads = {}, {}, set()
+
     if added:
         for footprint in added:
             # Add to document
-            addFootprintPart(footprint, doc, pcb)
+            addFootprintPart(footprint, doc, pcb, MODELS_PATH, model_cache, pad_store=pad_store)
             # Add to dictionary
             pcb["footprints"].append(footprint)
 
@@ -29,17 +53,22 @@ def updateFootprints(doc, pcb, diff, sketch):
             footprint = getDictEntryByKIID(pcb["footprints"], kiid)
             fp_part = getPartByKIID(doc, kiid)
 
+            # Partitioned build mode: remove hole sketch of footprint
+            hole_sketch = getattr(fp_part, "HoleSketch", None)
+            if hole_sketch:
+                compound = doc.getObject(f"Board_Compound_{pcb_id}")
+                compound.Links = [link for link in compound.Links if link.Name != hole_sketch.Name]
+                doc.removeObject(hole_sketch.Name)
+
             # Remove through holes from sketch
-            geom_indexes = []
-            for child in fp_part.Group:
-                # Find Pads container of footprints container
-                if "Pads" in child.Label:
-                    for pad_part in child.Group:
-                        # Get index of geometry and add it to list
-                        geom_indexes.append(getGeomsByTags(sketch, pad_part.Tags)[0])
-
-            # Delete pad holes from sketch
-            sketch.delGeometries(geom_indexes)
+            pad_indexes = pad_store.getFootprintItems(kiid)
+            if sketch and not hole_sketch:
+                geom_indexes = getGeomsByTags(sketch, [pad_store.tags[i] for i in pad_indexes])
+                # Delete pad holes from sketch
+                if geom_indexes:
+                    sketch.delGeometries(geom_indexes)
+            # Remove pads from store
+            pad_store.remove([pad_store.kiids[i] for i in pad_indexes])
             # Delete FP Part container
             doc.getObject(fp_part.Name).removeObjectsFromDocument()
             doc.removeObject(fp_part.Name)
@@ -69,29 +98,18 @@ def updateFootprints(doc, pcb, diff, sketch):
 
                 elif prop == "pos":
                     # Move footprint to new position
-                    base = FreeCADVector(value)
-                    fp_part.Placement.Base = base
+                    fp_part.Placement.Base = FreeCADVector(value)
                     footprint.update({"pos": value})
-
-                    # Move holes in sketch to new position
-                    if footprint["pads_pth"] and sketch:
-                        # Group[0] is pad_part container of footprint part
-                        for pad_part in fp_part.Group[0].Group:
-                            # Get delta from feature obj
-                            delta = App.Vector(pad_part.PosDelta[0],
-                                               pad_part.PosDelta[1],
-                                               pad_part.PosDelta[2])
-                            # Get index of sketch geometry by Tag to move point
-                            geom_index = getGeomsByTags(sketch, pad_part.Tags)[0]
-                            # Move point to new footprint pos
-                            # (account for previous pad delta)
-                            sketch.movePoint(geom_index, 3, base + delta)
+                    # Pads are moved later, together with pads of all other moved footprints
+                    moved[kiid] = (fp_part, footprint)
 
                 elif prop == "rot":
-                    fp_part.Placement.rotate(VEC["0"],
-                                             VEC["z"],
-                                             value - footprint["rot"])
+                    # Rotate footprint around its position
+                    fp_part.Placement.Rotation = App.Rotation(VEC["z"], value)
+                    # Pads are rotated later (by difference to previous rotation)
+                    rotations[kiid] = rotations.get(kiid, 0) + value - footprint["rot"]
                     footprint.update({"rot": value})
+                    moved[kiid] = (fp_part, footprint)
 
                 elif prop == "layer":
                     # Remove from parent
@@ -107,102 +125,230 @@ def updateFootprints(doc, pcb, diff, sketch):
                     # rotate model 180 around x and move in -z by pcb thickness
                     if value == "Bot":
                         for feature in fp_part.Group:
-                            if "Pads" in feature.Label:
-                                continue
                             feature.Placement.Rotation = App.Rotation(VEC["x"], 180.00)
                             feature.Placement.Base.z = -(pcb["general"]["thickness"] / SCALE)
                     # Bottom -> Top
                     if value == "Top":
                         for feature in fp_part.Group:
-                            if "Pads" in feature.Label:
-                                continue
                             feature.Placement.Rotation = App.Rotation(VEC["x"], 0.0)
                             feature.Placement.Base.z = 0
 
-                elif prop == "pads_pth" and sketch:
+                elif prop == "pads_pth":
+                    # Hole sketch of footprint (board sketch or footprint's own sketch, None in fast build mode)
+                    pad_sketch, origin = getPadSketch(fp_part, sketch)
                     # Go through list if dictionaries ( "kiid": [*list of changes*])
                     for val in value:
-                        for kiid, changes in val.items():
-
-                            pad_part = getPartByKIID(doc, kiid)
+                        for pad_kiid, pad_changes in val.items():
+                            # Index of pad in pad store, Tag of pad geometry in sketch
+                            i = pad_store.find(pad_kiid)
+                            pad = getDictEntryByKIID(footprint["pads_pth"], pad_kiid)
+                            # Skip pads unknown to store or dictionary
+                            if i is None or not pad:
+                                continue
+                            tag = pad_store.tags[i]
 
                             # Go through changes ["property", *new_value*]
-                            for change in changes:
-                                prop, value = change[0], change[1]
-
-                                if prop == "pos_delta":
-                                    dx = value[0]
-                                    dy = value[1]
-                                    # Change constraint:
-                                    distance_constraints = getConstraintByTag(sketch, pad_part.Tags[0])
-                                    x_constraint = distance_constraints.get("dist_x")
-                                    y_constraint = distance_constraints.get("dist_y")
-                                    if not x_constraint and y_constraint:
-                                        continue
-                                    # Change distance constraint to new value
-                                    sketch.setDatum(x_constraint, App.Units.Quantity(f"{dx / SCALE} mm"))
-                                    sketch.setDatum(y_constraint, App.Units.Quantity(f"{-dy / SCALE} mm"))
-
-                                    # Find geometry in sketch with same Tag
-                                    geom_index = getGeomsByTags(sketch, pad_part.Tags)[0]
-                                    # Get footprint position
-                                    base = fp_part.Placement.Base
-                                    delta = FreeCADVector(value)
-                                    # Move pad for fp bas and new delta
-                                    sketch.movePoint(geom_index, 3, base + delta)
-                                    # Save new delta to pad object
-                                    pad_part.PosDelta = delta
-
-                                    # Update dictionary
-                                    for pad in footprint["pads_pth"]:
-                                        if pad["kiid"] != kiid:
-                                            continue
-                                        # Update dictionary entry with same KIID
-                                        pad.update({"pos_delta": value})
-
-                                elif prop == "hole_size":
-                                    maj_axis = value[0]
-                                    min_axis = value[1]
-                                    # Get index of radius contraint in sketch (of pad)
-                                    constraints = getConstraintByTag(sketch, pad_part.Tags[0])
-                                    radius_constraint_index = constraints.get("radius")
-                                    if not radius_constraint_index:
-                                        continue
+                            for pad_prop, pad_value in pad_changes:
+
+                                if pad_prop == "pos_delta":
+                                    # Save new delta to pad store, sketch geometry and distance constraints
+                                    # are updated later together with all other moved pads
+                                    pad_store.setPosDelta(i, FreeCADVector(pad_value))
+                                    # Delta is exact (from KiCAD), it is not rotated again
+                                    exact_pads.add(pad_kiid)
+                                    moved[kiid] = (fp_part, footprint)
+
+                                elif pad_prop == "hole_size":
+                                    maj_axis = pad_value[0]
+                                    min_axis = pad_value[1]
                                     radius = (maj_axis / 2) / SCALE
-                                    # Change radius constraint to new value
-                                    sketch.setDatum(radius_constraint_index,
-                                                    App.Units.Quantity(f"{radius} mm"))
-                                    # Save new value to pad object
-                                    pad_part.Radius = radius
-
-                                    # Update dictionary
-                                    for pad in footprint["pads_pth"]:
-                                        if pad["kiid"] != kiid:
-                                            continue
-                                        pad.update({"hole_size": value})
+                                    if pad_sketch:
+                                        # Get index of radius contraint in sketch (of pad)
+                                        constraints = getConstraintByTag(pad_sketch, tag)
+                                        radius_constraint_index = constraints.get("radius")
+                                        if radius_constraint_index is not None:
+                                            # Change radius constraint to new value
+                                            pad_sketch.setDatum(radius_constraint_index,
+                                                                App.Units.Quantity(f"{radius} mm"))
+                                    # Save new value to pad store
+                                    pad_store.setRadius(i, radius)
+
+                                # Update dictionary entry with same KIID
+                                pad.update({pad_prop: pad_value})
+
+                elif prop == "extents":
+                    footprint.update({"extents": value})
+
+                elif prop == "3d_models" and type(value) is dict:
+                    # Per model diff (by model_id): only changed models are updated
+                    updateModels(doc, pcb, footprint, fp_part, value, MODELS_PATH, model_cache)
 
                 elif prop == "3d_models":
                     # Remove all existing step models from FP container
                     for feature in fp_part.Group:
-                        if "Pads" in feature.Label:
-                            continue
                         doc.removeObject(feature.Name)
 
                     # Re-import footprint step models to FP container
-                    for model in value:
-                        importModel(model, footprint, fp_part, doc, pcb, MODELS_PATH)
+                    for model in value or []:
+                        importModel(model, footprint, fp_part, doc, pcb_id, pcb["general"]["thickness"],
+                                    MODELS_PATH, model_cache)
                     # Update dictionary
                     footprint.update({"3d_models": value})
 
-
+    # Move pads of all moved footprints at once
+    if moved:
+        moveFootprintPads(moved, rotations, exact_pads, pad_store, sketch)
+
+    # Write changed pads to document
+    pad_store.flush()
+
+
+@traced()
+def updateModels(doc, pcb, footprint, fp_part, model_diffs, MODELS_PATH, model_cache=None):
+    """
+    Apply 3D model diff of footprint: offset/ rot changes only update placement of model link,
+    scale and filename changes relink to (cached) model master, only new model files are imported
+    :param doc: FreeCAD document object
+    :param pcb: pcb dictionary
+    :param footprint: footprint dictionary
+    :param fp_part: footprint Part object
+    :param model_diffs: dict with added (models), changed ({model_id: [[prop, value], ...]}), removed (model_ids)
+    :param MODELS_PATH: string (models directory path)
+    :param model_cache: ModelCache object or None
+    """
+    # Imported here: freecad_functions imports this module
+    from freecad_functions import importModel, getModelMaster, setModelPlacement
+
+    pcb_id = pcb["general"]["pcb_id"]
+    thickness = pcb["general"]["thickness"]
+    models = footprint.get("3d_models") or []
+    # Model links of footprint by model ID (links don't exist while footprint has placeholder)
+    links = {feature.ModelID: feature for feature in fp_part.Group if hasattr(feature, "ModelID")}
+    # Links are created by model loader from dictionary if footprint still has placeholder
+    loaded = not any(getattr(feature, "Placeholder", False) for feature in fp_part.Group)
+
+    for model_id in model_diffs.get("removed") or []:
+        if model_id in links:
+            doc.removeObject(links[model_id].Name)
+        models = [model for model in models if model["model_id"] != model_id]
+
+    for entry in model_diffs.get("changed") or []:
+        for model_id, changes in entry.items():
+            model = next((m for m in models if m["model_id"] == model_id), None)
+            if not model:
+                continue
+            model.update({prop: value for prop, value in changes})
+
+            link = links.get(model_id)
+            if not link:
+                continue
+            props = {prop for prop, value in changes}
+            if props & {"filename", "scale"}:
+                # Relink to master with new file/ scale (imported only if not in model library yet)
+                link.setLink(getModelMaster(model, doc, pcb_id, MODELS_PATH, model_cache))
+                link.Filename = model["filename"].split("/")[-1]
+            setModelPlacement(link, model, footprint, thickness)
+
+    for model in model_diffs.get("added") or []:
+        models.append(model)
+        if loaded:
+            importModel(model, footprint, fp_part, doc, pcb_id, thickness, MODELS_PATH, model_cache)
+
+    # Update dictionary
+    footprint.update({"3d_models": sorted(models, key=lambda m: m["model_id"]) or None})
+
+
+def moveFootprintPads(moved, rotations, exact_pads, pad_store, sketch):
+    """
+    Move pads of moved/ rotated footprints in one batch:
+    new pad positions are computed for all pads at once, then geometries and distance constraints
+    of each affected sketch are replaced in one assignment and sketch is solved once
+    (instead of one movePoint/setDatum with solve per pad).
+    :param moved: dictionary of footprint KIID -> (footprint Part object, footprint dictionary)
+    :param rotations: dictionary of footprint KIID -> rotation change in degrees
+    :param exact_pads: set of pad KIIDs with new position delta from diff (these are not rotated)
+    :param pad_store: ItemStore object (pads)
+    :param sketch: board Sketcher::SketchObject (or None)
+    """
+    groups = pad_store.groupByFootprint()
+
+    indexes, angles, bases, owners = [], [], [], []
+    for fp_kiid, (fp_part, footprint) in moved.items():
+        angle = math.radians(rotations.get(fp_kiid, 0))
+        base = fp_part.Placement.Base
+        for i in groups.get(fp_kiid, []):
+            indexes.append(i)
+            angles.append(0.0 if pad_store.kiids[i] in exact_pads else angle)
+            bases.append((base.x, base.y))
+            owners.append(fp_kiid)
+    if not indexes:
+        return
+
+    # Rotate position deltas (FreeCAD coordinates, counterclockwise) and add footprint positions
+    deltas = np.array([(pad_store.pos_deltas[i].x, pad_store.pos_deltas[i].y) for i in indexes])
+    cos, sin = np.cos(angles), np.sin(angles)
+    deltas = np.column_stack((deltas[:, 0] * cos - deltas[:, 1] * sin,
+                              deltas[:, 0] * sin + deltas[:, 1] * cos))
+    centers = np.array(bases) + deltas
+
+    # Sketch name -> (sketch, list of (Tag, center in sketch coordinates, delta))
+    sketch_updates = {}
+    for n, i in enumerate(indexes):
+        fp_part, footprint = moved[owners[n]]
+        delta = App.Vector(deltas[n, 0], deltas[n, 1], 0)
+        pad_store.setPosition(i, App.Vector(centers[n, 0], centers[n, 1], 0))
+        if angles[n]:
+            pad_store.setPosDelta(i, delta)
+            # Update dictionary with rotated delta
+            pad = getDictEntryByKIID(footprint["pads_pth"], pad_store.kiids[i])
+            # Integer nm, as read by KiCAD (see pcb_digest.getPcbDigest)
+            pad.update({"pos_delta": [round(v) for v in toList(delta)]})
+
+        pad_sketch, origin = getPadSketch(fp_part, sketch)
+        if not pad_sketch:
+            continue
+        if pad_sketch is not sketch:
+            # Partitioned build mode: hole sketch is placed at footprint position
+            pad_sketch.Placement.Base = fp_part.Placement.Base
+        entry = sketch_updates.setdefault(pad_sketch.Name, (pad_sketch, []))
+        entry[1].append((pad_store.tags[i], origin + delta, delta))
+
+    for pad_sketch, updates in sketch_updates.values():
+        tag_indexes = getTagIndexMap(pad_sketch)
+        constraint_indexes = getConstraintIndexMap(pad_sketch)
+        geometries = pad_sketch.Geometry
+        constraints = pad_sketch.Constraints
+
+        for tag, center, delta in updates:
+            geometries[tag_indexes[tag]].Center = center
+            # Replace distance constraints (relative to first pad) with constraints with new values
+            for name, value in ((f"distance_x_{tag}", delta.x), (f"distance_y_{tag}", delta.y)):
+                c = constraint_indexes.get(name)
+                if c is None:
+                    continue
+                old = constraints[c]
+                constraints[c] = Sketcher.Constraint(old.Type, old.First, old.FirstPos,
+                                                     old.Second, old.SecondPos, value)
+                constraints[c].Name = name
+
+        pad_sketch.Geometry = geometries
+        pad_sketch.Constraints = constraints
+        # Single solve for all moved pads
+        pad_sketch.solve()
+
+
+@traced()
 def updateDrawings(doc, pcb, diff, sketch):
+    # Imported here: freecad_functions imports this module
+    from freecad_functions import addDrawing
 
     key = "drawings"
     changed = diff[key].get("changed")
     added = diff[key].get("added")
     removed = diff[key].get("removed")
 
-    drawings_part = doc.getObject(f"Drawings_{pcb['general']['pcb_id']}")
+    pcb_id = pcb["general"]["pcb_id"]
+    drawings_part = doc.getObject(f"Drawings_{pcb_id}")
 
     if added:
         for drawing in added:
@@ -219,10 +365,10 @@ def updateDrawings(doc, pcb, diff, sketch):
         for kiid in removed:
             drawing = getDictEntryByKIID(pcb["drawings"], kiid)
             drw_part = getPartByKIID(doc, kiid)
-            geoms_indexes = getGeomsByTags(sketch, drw_part.Tags)
 
-            # Delete geometry by index
-            sketch.delGeometries(geoms_indexes)
+            if sketch:
+                # Delete geometry by index
+                sketch.delGeometries(getGeomsByTags(sketch, drw_part.Tags))
             # Delete drawing part
             doc.removeObject(drw_part.Name)
             doc.recompute()
@@ -240,6 +386,17 @@ def updateDrawings(doc, pcb, diff, sketch):
 
             drawing = getDictEntryByKIID(pcb["drawings"], kiid)
             drw_part = getPartByKIID(doc, kiid)
+
+            # Fast geometry build mode: no sketch, update dictionary and shape of drawing object only
+            if not sketch:
+                for prop, value in changes:
+                    # Only moved vertices of Rect/ Polygon
+                    if prop == "points" and type(value) is dict:
+                        value = patchPoints(drawing["points"], value)
+                    drawing.update({prop: value})
+                updateDrawingShape(drw_part, drawing)
+                continue
+
             geoms_indexes = getGeomsByTags(sketch, drw_part.Tags)
 
             for c in changes:
@@ -259,7 +416,7 @@ def updateDrawings(doc, pcb, diff, sketch):
                         # Get index of radius constrint
                         constraints = getConstraintByTag(sketch, drw_part.Tags[0])
                         radius_constraint_index = constraints.get("radius")
-                        if not radius_constraint_index:
+                        if radius_constraint_index is None:
                             continue
                         # Change radius constraint to new value
                         sketch.setDatum(radius_constraint_index,
@@ -276,6 +433,12 @@ def updateDrawings(doc, pcb, diff, sketch):
                         sketch.movePoint(geoms_indexes[0], 1, new_point)
                     elif prop == "end":
                         sketch.movePoint(geoms_indexes[0], 2, new_point)
+                    # Update pcb dictionary with new value
+                    drawing.update({prop: value})
+
+                elif ("Rect" in drw_part.Label or "Polygon" in drw_part.Label) and type(value) is dict:
+                    # Only moved vertices: move segment endpoints in place (constraints and Tags are kept)
+                    patchPolygon(sketch, drw_part, drawing, value)
 
                 elif "Rect" in drw_part.Label or "Polygon" in drw_part.Label:
                     # Delete existing geometries
@@ -293,11 +456,13 @@ def updateDrawings(doc, pcb, diff, sketch):
 
                         points.append(point)
 
-                    # Add another line from last to first point
-                    sketch.addGeometry(Part.LineSegment(points[-1], points[0]), False)
+                    # Add another line from last to first point (same direction as in addDrawing)
+                    sketch.addGeometry(Part.LineSegment(points[0], points[-1]), False)
                     tags.append(sketch.Geometry[-1].Tag)
                     # Add Tags to Part object after it's added to sketch
                     drw_part.Tags = tags
+                    # Update pcb dictionary with new points
+                    drawing.update({"points": value})
 
                 elif "Arc" in drw_part.Label:
                     # Delete existing arc geometry from sketch
@@ -313,40 +478,86 @@ def updateDrawings(doc, pcb, diff, sketch):
                     sketch.addGeometry(arc, False)
                     # Add Tag after its added to sketch
                     drw_part.Tags = sketch.Geometry[-1].Tag
-
-
+                    # Update pcb dictionary with new points
+                    drawing.update({"points": value})
+
+
+def patchPolygon(sketch, drw_part, drawing, points_diff):
+    """
+    Move endpoints of Rect/ Polygon segments at moved vertices, all at once with single solve.
+    Segment k goes from vertex k + 1 to vertex k, last segment from vertex 0 to last vertex (see addDrawing).
+    :param sketch: Sketcher::SketchObject
+    :param drw_part: drawing Part object (with Tags of segments, in order)
+    :param drawing: drawing dictionary (updated with new points)
+    :param points_diff: dict {"changed": [[index, [x, y]], ...], "count": number of vertices}
+    """
+    count = points_diff["count"]
+    if count != len(drawing["points"]) or count != len(drw_part.Tags):
+        print(f"[ERROR] Can not patch {drw_part.Label}: vertex count mismatch")
+        return
+
+    old_points = [FreeCADVector(p) for p in drawing["points"]]
+    points = patchPoints(drawing["points"], points_diff)
+    new_points = [FreeCADVector(p) for p in points]
+    moved = {i for i, p in points_diff["changed"]}
+
+    tag_indexes = getTagIndexMap(sketch)
+    geometries = sketch.Geometry
+    for k, tag in enumerate(drw_part.Tags):
+        # Vertices at start and end of segment
+        start, end = (k + 1, k) if k < count - 1 else (0, count - 1)
+        if start not in moved and end not in moved:
+            continue
+        segment = geometries[tag_indexes[tag]]
+        # Segment can be reversed (e.g. redrawn by older version), check against old vertex positions
+        if (segment.StartPoint - old_points[start]).Length > (segment.StartPoint - old_points[end]).Length:
+            start, end = end, start
+        segment.StartPoint = new_points[start]
+        segment.EndPoint = new_points[end]
+
+    sketch.Geometry = geometries
+    sketch.solve()
+    # Update pcb dictionary with new points
+    drawing.update({"points": points})
+
+
+@traced()
 def updateVias(doc, pcb, diff, sketch):
+    # Imported here: freecad_functions imports this module
+    from freecad_functions import addVia
 
     key = "vias"
     changed = diff[key].get("changed")
     added = diff[key].get("added")
     removed = diff[key].get("removed")
 
-    vias_part = doc.getObject(f"Vias_{pcb['general']['pcb_id']}")
+    pcb_id = pcb["general"]["pcb_id"]
+    # All vias are in single store, written back to document once at the end
+    via_store = getItemStore(doc, f"Via_Store_{pcb_id}")
 
     if added:
         for via in added:
-            # Add vias to sketch and container
-            addDrawing(drawing=via,
-                       doc=doc,
-                       pcb_id=pcb_id,
-                       container=vias_part)
+            # Add vias to sketch and store
+            addVia(via=via,
+                   doc=doc,
+                   pcb_id=pcb_id,
+                   store=via_store,
+                   sketch=sketch)
             # Add to dictionary
             pcb[key].append(via)
 
     if removed:
-        for kiid in removed:
-            via = getDictEntryByKIID(pcb["vias"], kiid)
-            via_part = getPartByKIID(doc, kiid)
-            geom_indexes = getGeomsByTags(sketch, via_part.Tags)
-
-            # Delete geometry by index
-            sketch.delGeometries(geom_indexes)
-            # Delete via part
-            doc.removeObject(via_part.Name)
-            doc.recompute()
-            # Remove from dictionary
-            pcb[key].remove(via)
+        if sketch:
+            # Delete geometries by index (all at once)
+            # Vias unknown to store are skipped
+            indexes = [via_store.find(kiid) for kiid in removed]
+            tags = [via_store.tags[i] for i in indexes if i is not None]
+            sketch.delGeometries(getGeomsByTags(sketch, tags))
+        # Remove from store
+        via_store.remove(removed)
+        # Remove from dictionary
+        removed = set(removed)
+        pcb[key] = [via for via in pcb[key] if via["kiid"] not in removed]
 
     if changed:
         for entry in changed:
@@ -358,8 +569,11 @@ def updateVias(doc, pcb, diff, sketch):
             changes = items[0][1]
 
             via = getDictEntryByKIID(pcb["vias"], kiid)
-            via_part = getPartByKIID(doc, kiid)
-            geom_indexes = getGeomsByTags(sketch, via_part.Tags)
+            i = via_store.find(kiid)
+            # Skip vias unknown to store or dictionary
+            if i is None or not via:
+                continue
+            tag = via_store.tags[i]
 
             # Go through list of all changes
             # list of changes consists of:  [ [name of property, new value of property] ,..]
@@ -368,18 +582,27 @@ def updateVias(doc, pcb, diff, sketch):
 
                 if prop == "center":
                     center_new = FreeCADVector(value)
-                    # Move geometry in sketch new pos
-                    # PointPos parameter for circle center is 3 (second argument)
-                    sketch.movePoint(geom_indexes[0], 3, center_new)
+                    if sketch:
+                        # Move geometry in sketch new pos
+                        # PointPos parameter for circle center is 3 (second argument)
+                        sketch.movePoint(getGeomsByTags(sketch, [tag])[0], 3, center_new)
+                    # Save new value to via store
+                    via_store.setPosition(i, center_new)
                     # Update pcb dictionary with new values
                     via.update({"center": value})
 
                 elif prop == "radius":
                     radius = value
-                    # Change radius constraint to new value
-                    # first parameter is index of constraint (stored as Part property)
-                    sketch.setDatum(via_part.ConstraintRadius, App.Units.Quantity(f"{radius / SCALE} mm"))
-                    # Save new value to via Part object
-                    via_part.Radius = radius / SCALE
+                    if sketch:
+                        # Change radius constraint to new value
+                        # (constraint is found by Tag, indexes change when geometries are deleted)
+                        radius_constraint_index = getConstraintByTag(sketch, tag).get("radius")
+                        if radius_constraint_index is not None:
+                            sketch.setDatum(radius_constraint_index, App.Units.Quantity(f"{radius / SCALE} mm"))
+                    # Save new value to via store
+                    via_store.setRadius(i, radius / SCALE)
                     # Update pcb dictionary with new value
-                    via.update({"radius": radius})
\ No newline at end of file
+                    via.update({"radius": radius})
+
+    # Write changed vias to document
+    via_store.flush()
@@ -8,19 +8,25 @@ from constants import SCALE
 """
 
 
+# Document name -> dictionary of KIID -> object name, built on first lookup (e.g. after document is reopened)
+# and rebuilt when lookup misses
+KIID_INDEX = {}
+
+
 def getPartByKIID(doc, kiid):
     """Returns FreeCAD Part object with same KIID attribute"""
-    result = None
+    index = KIID_INDEX.get(doc.Name, {})
+    obj = doc.getObject(index[kiid]) if kiid in index else None
 
-    for obj in doc.Objects:
-        try:
-            if obj.KIID == kiid:
-                result = obj
-                break
-        except AttributeError:
-            pass
+    if obj is None or getattr(obj, "KIID", None) != kiid:
+        index = {}
+        for o in doc.Objects:
+            if hasattr(o, "KIID"):
+                index.setdefault(o.KIID, o.Name)
+        KIID_INDEX[doc.Name] = index
+        obj = doc.getObject(index[kiid]) if kiid in index else None
 
-    return result
+    return obj
 
 
 def getDictEntryByKIID(list, kiid):
@@ -47,15 +53,39 @@ def getGeomsByTags(sketch, tags):
     return indexes
 
 
-def getPadContainer(parent):
-    """Returns child FC Part container of parent with Pads in the label"""
-    pads = None
-    # Go through childer of fp_part to find Pads part
-    for child in parent.Group:
-        if "Pads" in child.Label:
-            pads = child
+def getTagIndexMap(sketch):
+    """Returns dictionary of geometry Tag -> index of geometry in sketch"""
+    return {geom.Tag: i for i, geom in enumerate(sketch.Geometry)}
+
+
+def patchPoints(points, points_diff):
+    """
+    Returns copy of vertex list with moved vertices from points diff
+    :param points: list of [x, y]
+    :param points_diff: dict {"changed": [[index, [x, y]], ...], "count": number of vertices}
+    :return: list of [x, y]
+    """
+    points = [list(p) for p in points]
+    for i, p in points_diff["changed"]:
+        points[i] = p
+
+    return points
+
+
+def getPadSketch(fp_part, sketch):
+    """
+    Returns sketch containing pad holes of footprint and origin of pad positions in that sketch.
+    In partitioned build mode footprint has its own hole sketch placed at footprint position,
+    otherwise holes are in board sketch (absolute positions).
+    :param fp_part: footprint Part object
+    :param sketch: board Sketcher::SketchObject (or None)
+    :return: Sketcher::SketchObject, FreeCAD Vector
+    """
+    hole_sketch = getattr(fp_part, "HoleSketch", None)
+    if hole_sketch:
+        return hole_sketch, App.Vector(0, 0, 0)
 
-    return pads
+    return sketch, fp_part.Placement.Base
 
 
 def toList(vec):
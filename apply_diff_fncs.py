@@ -0,0 +1,155 @@
+import pcbnew
+
+from get_pcb_data_fncs import getFPData
+from tracing import traced
+
+"""
+    Functions for applying diffs received from FreeCAD to pcbnew.Board
+    Items are found by KIID through index built once per diff, all changes are made directly, followed by single
+    view refresh. Changes are not undoable in KiCAD: BOARD_COMMIT (one undo step) needs PCB editor frame, which
+    pcbnew python bindings don't give to action plugins.
+    Pcb dictionary (snapshot) is updated in same pass, so changes are not sent back to FreeCAD as diff.
+"""
+
+
+def toPoint(x, y):
+    """Returns pcbnew point (VECTOR2I in KiCAD 7+, wxPoint in KiCAD 6)"""
+    if hasattr(pcbnew, "VECTOR2I"):
+        return pcbnew.VECTOR2I(int(x), int(y))
+    return pcbnew.wxPoint(int(x), int(y))
+
+
+def getFootprintIndex(brd):
+    """Returns dictionary of footprint KIID (path, as used in pcb dictionary) -> pcbnew.FOOTPRINT"""
+    return {fp.GetPath().AsString(): fp for fp in brd.GetFootprints()}
+
+
+def applyPadChanges(fp, pad_changes):
+    """
+    Apply pad changes of footprint
+    :param fp: pcbnew.FOOTPRINT object
+    :param pad_changes: list of {pad KIID: [[property, value], ...]}
+    """
+    pads = {pad.m_Uuid.AsString(): pad for pad in fp.Pads()}
+    for entry in pad_changes:
+        for pad_kiid, changes in entry.items():
+            pad = pads.get(pad_kiid)
+            if not pad:
+                continue
+            for prop, value in changes:
+                if prop == "pos_delta":
+                    # Delta is relative to footprint position (board coordinates)
+                    pad.SetPosition(toPoint(fp.GetX() + value[0], fp.GetY() + value[1]))
+                elif prop == "hole_size":
+                    pad.SetDrillSize(toPoint(value[0], value[1]))
+
+
+def applyFootprintChanges(fp, changes):
+    """
+    Apply footprint changes, pads are changed after footprint is moved/ rotated (footprint moves its pads)
+    :param fp: pcbnew.FOOTPRINT object
+    :param changes: list of [property, value]
+    """
+    pad_changes = []
+    for prop, value in changes:
+        if prop == "pos":
+            fp.SetPosition(toPoint(value[0], value[1]))
+        elif prop == "rot":
+            fp.SetOrientationDegrees(value)
+        elif prop == "ref":
+            fp.SetReference(value)
+        elif prop == "pads_pth":
+            pad_changes = value
+
+    if pad_changes:
+        applyPadChanges(fp, pad_changes)
+
+
+def updateFootprintSnapshot(footprint, fp):
+    """
+    Replace footprint dictionary entry with current footprint data, hashed same way as newly scanned footprint,
+    so getFootprints finds no difference
+    :param footprint: dict (entry in pcb dictionary)
+    :param fp: pcbnew.FOOTPRINT object
+    """
+    fp_id, kiid = footprint["ID"], footprint["kiid"]
+    data = getFPData(fp)
+    data.update({"hash": hash(str(data))})
+    data.update({"ID": fp_id})
+    data.update({"kiid": kiid})
+
+    footprint.clear()
+    footprint.update(data)
+
+
+def getSnapshotChanges(footprint, old_pads):
+    """
+    Returns changes setting all properties of re-read footprint entry, in diff format (journal record replays to
+    same entry as in pcb dictionary, see snapshot_store.applyDiffToSnapshot)
+    :param footprint: dict (entry in pcb dictionary, after updateFootprintSnapshot)
+    :param old_pads: list of pad dictionaries of entry before update (or None)
+    :return: list of [property, value]
+    """
+    changes = []
+    for prop, value in footprint.items():
+        if prop in ("kiid", "ID"):
+            continue
+        if prop == "pads_pth" and value and old_pads:
+            # Existing pads are changed per pad KIID
+            value = [{pad["kiid"]: [[pad_prop, pad_value] for pad_prop, pad_value in pad.items()
+                                    if pad_prop != "kiid"]}
+                     for pad in value]
+        changes.append([prop, value])
+
+    return changes
+
+
+@traced()
+def applyDiff(brd, pcb, diff):
+    """
+    Apply diff received from FreeCAD to board and pcb dictionary
+    :param brd: pcbnew.Board object
+    :param pcb: dict
+    :param diff: dict (footprints: changed/ removed)
+    :return: (list of KIIDs not found on board, diff of pcb dictionary for snapshot journal)
+    """
+    footprints_diff = diff.get("footprints") or {}
+    if not footprints_diff:
+        return [], {}
+
+    fp_index = getFootprintIndex(brd)
+    snapshot = {footprint["kiid"]: footprint for footprint in pcb.get("footprints") or []}
+    missing = []
+    # Footprints are re-read from board, journal gets their new entries (not changes received from FreeCAD)
+    snapshot_changed = []
+
+    for entry in footprints_diff.get("changed") or []:
+        for kiid, changes in entry.items():
+            fp = fp_index.get(kiid)
+            if not fp:
+                missing.append(kiid)
+                continue
+            applyFootprintChanges(fp, changes)
+            if kiid in snapshot:
+                old_pads = snapshot[kiid].get("pads_pth")
+                updateFootprintSnapshot(snapshot[kiid], fp)
+                snapshot_changed.append({kiid: getSnapshotChanges(snapshot[kiid], old_pads)})
+
+    removed = []
+    for kiid in footprints_diff.get("removed") or []:
+        fp = fp_index.get(kiid)
+        if not fp:
+            missing.append(kiid)
+            continue
+        brd.Remove(fp)
+        removed.append(kiid)
+    if removed:
+        pcb["footprints"] = [footprint for footprint in pcb["footprints"] if footprint["kiid"] not in removed]
+
+    pcbnew.Refresh()
+
+    snapshot_diff = {}
+    if snapshot_changed or removed:
+        snapshot_diff = {"footprints": {"changed": snapshot_changed, "removed": removed}}
+
+    return missing, snapshot_diff
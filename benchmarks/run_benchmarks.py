@@ -0,0 +1,271 @@
+import argparse
+import copy
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.dirname(BENCHMARKS_DIR)
+FCMACRO_DIR = os.path.join(PLUGIN_DIR, "FCmacro")
+sys.path.insert(0, PLUGIN_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from synthetic_board import generateBoard, installFakePcbnew
+
+installFakePcbnew()
+
+from apply_diff_fncs import applyDiff
+from framing import packMessage, recvMessage
+from pcbnew_functions import getPcb, getFootprints, getPcbDrawings, getVias
+
+"""
+    Benchmarks of sync cost at multiple board sizes (synthetic boards, see synthetic_board.py):
+    scan (getPcb), diff after editing part of footprints, JSON encoding, loopback socket transfer with real
+    message framing, applying FreeCAD diff to board, and FreeCAD side drawPcb/ updatePartFromDiff (only if
+    FreeCADCmd is found). Results are stored as JSON, comparison mode flags regressions against baseline.
+    Usage:
+        python benchmarks/run_benchmarks.py -o results.json
+        python benchmarks/run_benchmarks.py --scales 100 1000 --compare baseline.json
+"""
+
+SCALES = (100, 1000, 10000, 50000)
+EDIT_RATIOS = (0.01, 0.1)
+PADS_PER_FOOTPRINT = 4
+
+
+def getBoardSize(scale):
+    """Returns (footprints, vias, outline segments) of board with scale items"""
+    return scale, scale // 2, max(scale // 100, 4)
+
+
+def timeIt(function, repeat):
+    """Returns best time of repeated calls in seconds and result of last call"""
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best, result
+
+
+def editFootprints(brd, ratio, rng, distance=100000):
+    """Move ratio of footprints on board by distance (nm), returns number of moved footprints"""
+    footprints = brd.GetFootprints()
+    moved = rng.sample(footprints, max(int(len(footprints) * ratio), 1))
+    for fp in moved:
+        fp.SetPosition((fp.GetX() + distance, fp.GetY()))
+
+    return len(moved)
+
+
+def getDiff(brd, pcb):
+    """Diff of board against pcb dictionary (same as Kc2Fc.onButtonGetDiff)"""
+    diff = {}
+    for key, function in (("footprints", getFootprints), ("drawings", getPcbDrawings), ("vias", getVias)):
+        value = function(brd, pcb)
+        if value:
+            diff[key] = value
+
+    return diff
+
+
+def loopbackTransfer(msg, msg_type="PCB"):
+    """Send message through loopback socket with plugin framing, returns received message"""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client.connect(server.getsockname())
+    conn, _ = server.accept()
+
+    received = {}
+
+    def receive():
+        received["msg"] = recvMessage(conn)[1]
+
+    receiver = threading.Thread(target=receive)
+    receiver.start()
+    client.sendall(packMessage(msg, msg_type))
+    receiver.join()
+
+    for s in (client, conn, server):
+        s.close()
+
+    return received["msg"]
+
+
+def benchmarkScale(scale, repeat, seed):
+    """Run KiCAD side benchmarks on synthetic board of scale items, returns dict of results"""
+    footprints, vias, segments = getBoardSize(scale)
+    results = {"footprints": footprints, "pads": footprints * PADS_PER_FOOTPRINT, "vias": vias,
+               "segments": segments}
+
+    brd = generateBoard(footprints, PADS_PER_FOOTPRINT, vias, segments, seed)
+    results["scan"], pcb = timeIt(lambda: getPcb(brd), repeat)
+
+    # Diff of unchanged board (cost of scan when nothing changed)
+    results["diff_unchanged"], _ = timeIt(lambda: getDiff(brd, pcb), repeat)
+
+    # Diffs with edited part of footprints
+    rng = random.Random(seed)
+    for ratio in EDIT_RATIOS:
+        times = []
+        for _ in range(repeat):
+            editFootprints(brd, ratio, rng)
+            start = time.perf_counter()
+            diff = getDiff(brd, pcb)
+            times.append(time.perf_counter() - start)
+        results[f"diff_{ratio:g}"] = min(times)
+        results[f"diff_{ratio:g}_bytes"] = len(json.dumps(diff))
+
+    # Serialization
+    results["encode_pcb"], pcb_json = timeIt(lambda: json.dumps(pcb), repeat)
+    results["decode_pcb"], _ = timeIt(lambda: json.loads(pcb_json), repeat)
+    results["pcb_bytes"] = len(pcb_json.encode("utf-8"))
+
+    # Loopback transfer of whole pcb
+    results["transfer_pcb"], received = timeIt(lambda: loopbackTransfer(pcb_json), repeat)
+    if received != pcb_json:
+        raise RuntimeError("Loopback transfer corrupted message")
+
+    # Applying FreeCAD diff moving ratio of footprints
+    moved = rng.sample(pcb["footprints"], max(int(len(pcb["footprints"]) * EDIT_RATIOS[-1]), 1))
+    host_diff = {"footprints": {"changed": [{fp["kiid"]: [["pos", [fp["pos"][0], fp["pos"][1] + 100000]]]}
+                                            for fp in moved]}}
+    results["apply_host_diff"], _ = timeIt(lambda: applyDiff(brd, pcb, host_diff), repeat)
+
+    return results, pcb
+
+
+def findFreeCADCmd():
+    for name in ("FreeCADCmd", "freecadcmd", "FreeCADCmd.exe"):
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+
+def benchmarkFreeCAD(pcb, freecad_cmd, moved):
+    """
+    Run FreeCAD side benchmarks (benchmark_build_modes.py) in FreeCADCmd process
+    :return: dict of mode -> timings, None if FreeCADCmd failed
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        snapshot_path = os.path.join(temp_dir, "pcb.json")
+        results_path = os.path.join(temp_dir, "results.json")
+        with open(snapshot_path, "w") as f:
+            json.dump(pcb, f)
+
+        script = (f"import sys, json; sys.path.append({FCMACRO_DIR!r}); import benchmark_build_modes; "
+                  f"results = benchmark_build_modes.main([{snapshot_path!r}, '--moved', '{moved}']); "
+                  f"json.dump(results, open({results_path!r}, 'w'))")
+        process = subprocess.run([freecad_cmd, "-c", script], capture_output=True, text=True)
+        if process.returncode != 0 or not os.path.exists(results_path):
+            print(process.stdout + process.stderr)
+            return None
+
+        with open(results_path, "r") as f:
+            return json.load(f)
+
+
+def flattenResults(results):
+    """Returns dictionary of "scale/metric" -> value of all timings (seconds) in results"""
+    flat = {}
+    for scale, metrics in results["scales"].items():
+        for metric, value in metrics.items():
+            if isinstance(value, dict):
+                for mode, timings in value.items():
+                    for name, timing in timings.items():
+                        flat[f"{scale}/{metric}/{mode}/{name}"] = timing
+            elif isinstance(value, float):
+                flat[f"{scale}/{metric}"] = value
+
+    return flat
+
+
+def compareResults(results, baseline, threshold, min_time):
+    """
+    Returns list of regressions: (metric, baseline time, new time) for timings slower than baseline by threshold
+    :param threshold: float (allowed relative slowdown, e.g. 0.2 for 20 %)
+    :param min_time: float (timings below this in both runs are ignored as noise, seconds)
+    """
+    new, old = flattenResults(results), flattenResults(baseline)
+    regressions = []
+    for metric, value in new.items():
+        if metric not in old or max(value, old[metric]) < min_time:
+            continue
+        if value > old[metric] * (1 + threshold):
+            regressions.append((metric, old[metric], value))
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark sync cost at multiple board sizes")
+    parser.add_argument("--scales", type=int, nargs="+", default=list(SCALES), help="number of footprints")
+    parser.add_argument("--repeat", type=int, default=3, help="repeats of each measurement (best is kept)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--freecad", default=None, help="FreeCADCmd executable (searched in PATH by default)")
+    parser.add_argument("--no-freecad", action="store_true", help="skip FreeCAD side benchmarks")
+    parser.add_argument("-o", "--output", default="benchmark_results.json")
+    parser.add_argument("--compare", default=None, help="baseline results JSON file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown against baseline")
+    parser.add_argument("--min-time", type=float, default=0.005, help="ignore timings below (seconds)")
+    args = parser.parse_args(argv)
+
+    freecad_cmd = None if args.no_freecad else (args.freecad or findFreeCADCmd())
+    if not freecad_cmd and not args.no_freecad:
+        print("FreeCADCmd not found, FreeCAD side benchmarks are skipped")
+
+    results = {"time": time.strftime("%Y-%m-%d %H:%M:%S"),
+               "python": platform.python_version(),
+               "platform": platform.platform(),
+               "scales": {}}
+
+    for scale in args.scales:
+        print(f"Scale {scale}...")
+        scale_results, pcb = benchmarkScale(scale, args.repeat, args.seed)
+        if freecad_cmd:
+            pcb = copy.deepcopy(pcb)
+            scale_results["freecad"] = benchmarkFreeCAD(pcb, freecad_cmd, max(int(scale * EDIT_RATIOS[-1]), 1))
+        else:
+            scale_results["freecad"] = "skipped"
+        results["scales"][str(scale)] = scale_results
+
+        for metric, value in scale_results.items():
+            if isinstance(value, float):
+                print(f"    {metric:<20}{value * 1000:>12.2f} ms")
+            elif metric == "freecad" and isinstance(value, dict):
+                for mode, timings in value.items():
+                    print(f"    freecad {mode:<12}" + "".join(f"{name} {timing:.3f} s  "
+                                                          for name, timing in timings.items()))
+            else:
+                print(f"    {metric:<20}{value:>12}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=4)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        regressions = compareResults(results, baseline, args.threshold, args.min_time)
+        for metric, old, new in regressions:
+            print(f"REGRESSION {metric}: {old * 1000:.2f} ms -> {new * 1000:.2f} ms ({new / old - 1:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
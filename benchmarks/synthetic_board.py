@@ -0,0 +1,466 @@
+import argparse
+import math
+import os
+import random
+import sys
+import types
+import uuid
+
+"""
+    Synthetic boards for scaling benchmarks
+    Generates board with N footprints (M through hole pads each), K vias and board outline of S line segments,
+    as in-memory fake implementing pcbnew methods used by scanning functions (get_pcb_data_fncs.py,
+    pcbnew_functions.py, apply_diff_fncs.py), so they can be benchmarked without KiCAD, and as .kicad_pcb file.
+    Usage:
+        python benchmarks/synthetic_board.py --footprints 1000 --pads 4 --vias 500 --segments 100 -o board.kicad_pcb
+"""
+
+SCALE = 1000000
+# Distance of footprints in grid and pad pitch (nm)
+GRID = 10 * SCALE
+PITCH = 2540000
+DRILL = 800000
+VIA_DRILL = 400000
+THICKNESS = 1600000
+
+
+# --------------------------- Fake pcbnew objects --------------------------- #
+class FakeVector(tuple):
+    """pcbnew.VECTOR2I / wxPoint stand-in"""
+
+    def __new__(cls, x, y):
+        return super().__new__(cls, (int(x), int(y)))
+
+    @property
+    def x(self):
+        return self[0]
+
+    @property
+    def y(self):
+        return self[1]
+
+
+class FakeUuid:
+
+    def __init__(self, value):
+        self.value = value
+
+    def AsString(self):
+        return self.value
+
+
+class FakeBox:
+
+    def __init__(self, x, y, width, height):
+        self.x, self.y, self.width, self.height = x, y, width, height
+
+    def GetX(self):
+        return self.x
+
+    def GetY(self):
+        return self.y
+
+    def GetWidth(self):
+        return self.width
+
+    def GetHeight(self):
+        return self.height
+
+
+class FakeDesignSettings:
+
+    def GetBoardThickness(self):
+        return THICKNESS
+
+
+class FakeModel:
+
+    def __init__(self, filename):
+        self.m_Filename = filename
+        self.m_Offset = (0.0, 0.0, 0.0)
+        self.m_Scale = (1.0, 1.0, 1.0)
+        self.m_Rotation = (0.0, 0.0, 0.0)
+
+
+class FakeShape:
+    """pcbnew.PCB_SHAPE stand-in (Line, Arc, Circle, Rect or Polygon in Edge.Cuts layer)"""
+
+    def __init__(self, kiid, shape, points, layer="Edge.Cuts"):
+        self.m_Uuid = FakeUuid(kiid)
+        self.shape = shape
+        self.points = [FakeVector(*p) for p in points]
+        self.layer = layer
+
+    def GetLayerName(self):
+        return self.layer
+
+    def ShowShape(self):
+        return self.shape
+
+    def GetStart(self):
+        return self.points[0]
+
+    def GetEnd(self):
+        return self.points[-1]
+
+    def GetArcMid(self):
+        return self.points[1]
+
+    def GetCenter(self):
+        return self.points[0]
+
+    def GetRadius(self):
+        return int(math.dist(self.points[0], self.points[1]))
+
+    def GetCorners(self):
+        return list(self.points)
+
+    def GetX(self):
+        return self.points[0][0]
+
+    def SetX(self, x):
+        dx = x - self.points[0][0]
+        self.points = [FakeVector(p[0] + dx, p[1]) for p in self.points]
+
+    def GetBoundingBox(self):
+        xs, ys = [p[0] for p in self.points], [p[1] for p in self.points]
+        return FakeBox(min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys))
+
+
+class FakePad:
+
+    def __init__(self, kiid, name, pos, drill):
+        self.m_Uuid = FakeUuid(kiid)
+        self.name = name
+        self.pos = FakeVector(*pos)
+        self.drill = FakeVector(drill, drill)
+
+    def GetName(self):
+        return self.name
+
+    def GetX(self):
+        return self.pos[0]
+
+    def GetY(self):
+        return self.pos[1]
+
+    def GetPosition(self):
+        return self.pos
+
+    def SetPosition(self, pos):
+        self.pos = FakeVector(*pos)
+
+    def GetDrillSize(self):
+        return self.drill
+
+    def SetDrillSize(self, size):
+        self.drill = FakeVector(*size)
+
+    def GetBoundingBox(self):
+        size = self.drill[0] * 2
+        return FakeBox(self.pos[0] - size // 2, self.pos[1] - size // 2, size, size)
+
+
+class FakeFootprint:
+
+    def __init__(self, kiid, path, fpid, ref, pos, layer="F.Cu"):
+        self.m_Uuid = FakeUuid(kiid)
+        self.path = FakeUuid(path)
+        self.fpid = fpid
+        self.ref = ref
+        self.pos = FakeVector(*pos)
+        self.orientation = 0.0
+        self.layer = layer
+        self.pads = []
+        self.models = []
+        self.graphical_items = []
+
+    def GetPath(self):
+        return self.path
+
+    def GetFPIDAsString(self):
+        return self.fpid
+
+    def GetReference(self):
+        return self.ref
+
+    def SetReference(self, ref):
+        self.ref = ref
+
+    def GetX(self):
+        return self.pos[0]
+
+    def GetY(self):
+        return self.pos[1]
+
+    def GetPosition(self):
+        return self.pos
+
+    def SetPosition(self, pos):
+        # Footprint moves its pads and graphical items
+        dx, dy = pos[0] - self.pos[0], pos[1] - self.pos[1]
+        for pad in self.pads:
+            pad.pos = FakeVector(pad.pos[0] + dx, pad.pos[1] + dy)
+        for item in self.graphical_items:
+            item.points = [FakeVector(p[0] + dx, p[1] + dy) for p in item.points]
+        self.pos = FakeVector(*pos)
+
+    def SetY(self, y):
+        self.SetPosition(FakeVector(self.pos[0], y))
+
+    def GetOrientationDegrees(self):
+        return self.orientation
+
+    def SetOrientationDegrees(self, orientation):
+        # Footprint rotates its pads (KiCAD y axis points down, positive angle is counterclockwise on screen)
+        angle = math.radians(orientation - self.orientation)
+        cos, sin = math.cos(angle), math.sin(angle)
+
+        def rotate(p):
+            dx, dy = p[0] - self.pos[0], p[1] - self.pos[1]
+            return FakeVector(self.pos[0] + dx * cos + dy * sin, self.pos[1] - dx * sin + dy * cos)
+
+        for pad in self.pads:
+            pad.pos = rotate(pad.pos)
+        for item in self.graphical_items:
+            item.points = [rotate(p) for p in item.points]
+        self.orientation = orientation
+
+    def GetLayerName(self):
+        return self.layer
+
+    def HasThroughHolePads(self):
+        return bool(self.pads)
+
+    def Pads(self):
+        return self.pads
+
+    def Models(self):
+        return self.models
+
+    def GraphicalItems(self):
+        return self.graphical_items
+
+
+class PCB_VIA:
+    """pcbnew.PCB_VIA stand-in (vias are recognized by type name)"""
+
+    def __init__(self, kiid, pos, drill):
+        self.m_Uuid = FakeUuid(kiid)
+        self.pos = FakeVector(*pos)
+        self.drill = drill
+
+    def GetX(self):
+        return self.pos[0]
+
+    def GetY(self):
+        return self.pos[1]
+
+    def SetX(self, x):
+        self.pos = FakeVector(x, self.pos[1])
+
+    def GetDrill(self):
+        return self.drill
+
+
+class FakeBoard:
+
+    def __init__(self, file_name=""):
+        self.file_name = file_name
+        self.drawings = []
+        self.footprints = []
+        self.tracks = []
+
+    def GetFileName(self):
+        return self.file_name
+
+    def GetDesignSettings(self):
+        return FakeDesignSettings()
+
+    def GetDrawings(self):
+        return self.drawings
+
+    def GetFootprints(self):
+        return self.footprints
+
+    def GetTracks(self):
+        return self.tracks
+
+    def Remove(self, item):
+        for items in (self.drawings, self.footprints, self.tracks):
+            if item in items:
+                items.remove(item)
+
+
+def installFakePcbnew():
+    """Register fake pcbnew module (for modules importing pcbnew, e.g. apply_diff_fncs.py), returns module"""
+    if "pcbnew" in sys.modules:
+        return sys.modules["pcbnew"]
+    module = types.ModuleType("pcbnew")
+    module.VECTOR2I = FakeVector
+    module.wxPoint = FakeVector
+    module.Refresh = lambda: None
+    module.GetBoard = lambda: None
+    sys.modules["pcbnew"] = module
+
+    return module
+
+
+# --------------------------- Generator --------------------------- #
+def generateBoard(footprints=100, pads=4, vias=100, segments=4, seed=0, file_name="synthetic.kicad_pcb"):
+    """
+    Returns synthetic board: footprints in grid, through hole pads in a row, vias between footprints,
+    rectangular board outline around grid split into line segments
+    :param footprints: int (N)
+    :param pads: int (M, through hole pads per footprint)
+    :param vias: int (K)
+    :param segments: int (S, number of outline segments, at least 4)
+    :param seed: int (random seed, same seed gives same KIIDs)
+    :param file_name: string (returned by GetFileName, name of pcb)
+    :return: FakeBoard
+    """
+    rng = random.Random(seed)
+
+    def newKIID():
+        return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+    board = FakeBoard(file_name)
+    columns = max(int(math.ceil(math.sqrt(footprints))), 1)
+    rows = max(int(math.ceil(footprints / columns)), 1)
+    pitch_x = max(GRID, (pads + 1) * PITCH)
+
+    for i in range(footprints):
+        x, y = (i % columns) * pitch_x + GRID, (i // columns) * GRID + GRID
+        fp = FakeFootprint(kiid=newKIID(),
+                           path=f"/{newKIID()}",
+                           fpid=f"Connector_PinHeader_2.54mm:PinHeader_1x{pads:02d}_P2.54mm_Horizontal",
+                           ref=f"J{i + 1}",
+                           pos=(x, y),
+                           layer="F.Cu" if i % 2 == 0 else "B.Cu")
+        for n in range(pads):
+            fp.pads.append(FakePad(newKIID(), str(n + 1), (x + n * PITCH, y), DRILL))
+        fp.models.append(FakeModel("${KICAD6_3DMODEL_DIR}/Connector_PinHeader_2.54mm.3dshapes/"
+                                   f"PinHeader_1x{pads:02d}_P2.54mm_Horizontal.wrl"))
+        # Courtyard
+        courtyard = FakeShape(newKIID(), "Rect", [(x - PITCH, y - PITCH), (x + pads * PITCH, y - PITCH),
+                                                  (x + pads * PITCH, y + PITCH), (x - PITCH, y + PITCH)],
+                              layer="F.CrtYd")
+        fp.graphical_items.append(courtyard)
+        board.footprints.append(fp)
+
+    for i in range(vias):
+        # Between footprint rows
+        x = (i % columns) * pitch_x + GRID + pitch_x // 2
+        y = (i // columns % rows) * GRID + GRID + GRID // 2
+        board.tracks.append(PCB_VIA(newKIID(), (x, y), VIA_DRILL))
+
+    # Outline: rectangle around grid, each side split into part of segments
+    width, height = (columns + 1) * pitch_x, (rows + 1) * GRID
+    corners = [(0, 0), (width, 0), (width, height), (0, height)]
+    segments = max(segments, 4)
+    for side in range(4):
+        start, end = corners[side], corners[(side + 1) % 4]
+        count = segments // 4 + (1 if side < segments % 4 else 0)
+        for n in range(count):
+            p0 = (start[0] + (end[0] - start[0]) * n // count, start[1] + (end[1] - start[1]) * n // count)
+            p1 = (start[0] + (end[0] - start[0]) * (n + 1) // count,
+                  start[1] + (end[1] - start[1]) * (n + 1) // count)
+            board.drawings.append(FakeShape(newKIID(), "Line", [p0, p1]))
+
+    return board
+
+
+# --------------------------- .kicad_pcb writer --------------------------- #
+def mm(value):
+    """Returns nm value as mm string (as written by KiCAD)"""
+    return f"{value / SCALE:.6f}".rstrip("0").rstrip(".")
+
+
+def writeKicadPcb(board, file_path):
+    """Write board as .kicad_pcb file (KiCAD 7 format)"""
+    lines = ["(kicad_pcb (version 20221018) (generator pcbnew)",
+             "",
+             f"  (general\n    (thickness {mm(THICKNESS)})\n  )",
+             "",
+             '  (paper "A4")',
+             "  (layers",
+             '    (0 "F.Cu" signal)',
+             '    (31 "B.Cu" signal)',
+             '    (44 "Edge.Cuts" user)',
+             '    (46 "B.CrtYd" user "B.Courtyard")',
+             '    (47 "F.CrtYd" user "F.Courtyard")',
+             "  )",
+             "",
+             '  (net 0 "")',
+             ""]
+
+    for fp in board.footprints:
+        side = "F" if fp.layer.startswith("F.") else "B"
+        rotation = f" {fp.orientation:g}" if fp.orientation else ""
+        angle = math.radians(fp.orientation)
+        cos, sin = math.cos(angle), math.sin(angle)
+
+        def local(p):
+            """Position relative to footprint in footprint coordinates (not rotated), as mm strings"""
+            dx, dy = p[0] - fp.GetX(), p[1] - fp.GetY()
+            return mm(round(dx * cos - dy * sin)), mm(round(dx * sin + dy * cos))
+
+        lines.append(f'  (footprint "{fp.fpid}" (layer "{fp.layer}")')
+        lines.append(f"    (tstamp {fp.m_Uuid.AsString()})")
+        lines.append(f"    (at {mm(fp.GetX())} {mm(fp.GetY())}{rotation})")
+        lines.append(f'    (path "{fp.path.AsString()}")')
+        lines.append(f'    (fp_text reference "{fp.ref}" (at 0 -2) (layer "{side}.SilkS")')
+        lines.append("      (effects (font (size 1 1) (thickness 0.15)))")
+        lines.append("    )")
+        for item in fp.graphical_items:
+            points = item.points
+            for p0, p1 in zip(points, points[1:] + points[:1]):
+                lines.append(f"    (fp_line (start {' '.join(local(p0))}) (end {' '.join(local(p1))})")
+                lines.append(f'      (stroke (width 0.05) (type solid)) (layer "{side}.CrtYd"))')
+        for pad in fp.pads:
+            lines.append(f'    (pad "{pad.name}" thru_hole circle (at {" ".join(local(pad.pos))}{rotation}) '
+                         f'(size 1.7 1.7) (drill {mm(pad.drill[0])}) (layers "*.Cu" "*.Mask")')
+            lines.append(f"      (tstamp {pad.m_Uuid.AsString()}))")
+        for model in fp.models:
+            lines.append(f'    (model "{model.m_Filename}"')
+            lines.append("      (offset (xyz 0 0 0))\n      (scale (xyz 1 1 1))\n      (rotate (xyz 0 0 0))")
+            lines.append("    )")
+        lines.append("  )")
+        lines.append("")
+
+    for drw in board.drawings:
+        start, end = drw.GetStart(), drw.GetEnd()
+        lines.append(f"  (gr_line (start {mm(start[0])} {mm(start[1])}) (end {mm(end[0])} {mm(end[1])})")
+        lines.append(f'    (stroke (width 0.1) (type default)) (layer "Edge.Cuts") '
+                     f"(tstamp {drw.m_Uuid.AsString()}))")
+    lines.append("")
+
+    for via in board.tracks:
+        lines.append(f"  (via (at {mm(via.GetX())} {mm(via.GetY())}) (size 0.8) (drill {mm(via.GetDrill())}) "
+                     f'(layers "F.Cu" "B.Cu") (net 0) (tstamp {via.m_Uuid.AsString()}))')
+    lines.append("")
+    lines.append(")")
+
+    with open(file_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic .kicad_pcb board for benchmarks")
+    parser.add_argument("--footprints", type=int, default=100, help="number of footprints (N)")
+    parser.add_argument("--pads", type=int, default=4, help="through hole pads per footprint (M)")
+    parser.add_argument("--vias", type=int, default=100, help="number of vias (K)")
+    parser.add_argument("--segments", type=int, default=4, help="number of board outline segments (S)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default="synthetic.kicad_pcb")
+    args = parser.parse_args(argv)
+
+    board = generateBoard(args.footprints, args.pads, args.vias, args.segments, args.seed,
+                          file_name=os.path.abspath(args.output))
+    writeKicadPcb(board, args.output)
+    print(f"Board written to {args.output}: {len(board.footprints)} footprints, "
+          f"{len(board.tracks)} vias, {len(board.drawings)} outline segments")
+
+
+if __name__ == "__main__":
+    main()
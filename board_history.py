@@ -0,0 +1,286 @@
+import argparse
+import bisect
+import json
+import os
+import time
+
+from pcb_digest import normalizeValue
+from snapshot_store import SnapshotStore, applyDiffToSnapshot, decodeCheckpoint, getStorePath
+
+"""
+    Revision history of board on top of snapshot store (snapshot_store.py)
+    Every journal record is one revision (its sequence number), every segment is checkpoint followed by chain of
+    deltas (diffs). Revision is reconstructed from nearest checkpoint at or before it, replaying at most one
+    segment of diffs. Index of KIID -> revisions touching item answers per item history without any replay.
+    Checkpoint of rescanned board has its own sequence number (no journal record), it is revision too: its items
+    are compared with previous revision once, when history is opened.
+    Usage:
+        python board_history.py <board>.kicad_pcb revisions
+        python board_history.py <board>.kicad_pcb show 120 --ref J3
+        python board_history.py <board>.kicad_pcb history --ref J3
+        python board_history.py <board>.kicad_pcb diff 100 120
+"""
+
+CATEGORIES = ("drawings", "footprints", "vias")
+
+
+def getDiffKIIDs(diff):
+    """Returns list of (category, KIID, action, changes) of all items in diff"""
+    items = []
+    for key in CATEGORIES:
+        category = diff.get(key) or {}
+        for item in category.get("added") or []:
+            items.append((key, item["kiid"], "added", item))
+        for entry in category.get("changed") or []:
+            for kiid, changes in entry.items():
+                items.append((key, kiid, "changed", changes))
+        for kiid in category.get("removed") or []:
+            items.append((key, kiid, "removed", None))
+
+    return items
+
+
+def getRescanKIIDs(pcb_before, pcb_after):
+    """Returns list of (category, KIID, action, item) of items which differ between two pcb dictionaries"""
+    items = []
+    for key in CATEGORIES:
+        before = {item["kiid"]: item for item in pcb_before.get(key) or []}
+        after = {item["kiid"]: item for item in pcb_after.get(key) or []}
+        for kiid, item in after.items():
+            if kiid not in before:
+                items.append((key, kiid, "added", item))
+            # Hashes (also of pads) of rescanned item differ from hashes of item replayed from journal
+            elif normalizeValue(item) != normalizeValue(before[kiid]):
+                items.append((key, kiid, "changed", item))
+        for kiid in before:
+            if kiid not in after:
+                items.append((key, kiid, "removed", None))
+
+    return items
+
+
+def getItem(pcb, kiid):
+    """Returns (category, item dictionary) of item with KIID in pcb dictionary, (None, None) if not found"""
+    for key in CATEGORIES:
+        for item in pcb.get(key) or []:
+            if item["kiid"] == kiid:
+                return key, item
+
+    return None, None
+
+
+class BoardHistory:
+
+    def __init__(self, store, cache_size=4):
+        """
+        :param store: SnapshotStore object
+        :param cache_size: int (number of decompressed checkpoints kept in memory)
+        """
+        self.store = store
+        self.cache_size = cache_size
+        # Checkpoint sequence numbers, journal records of each segment
+        self.segments = store.getSegments()
+        self.journals = {base_seq: store.readJournal(base_seq)[0] for base_seq in self.segments}
+        # Revision -> (segment, position of record in its journal), revision -> time
+        self.revisions = {}
+        self.times = {}
+        # Revision of rescanned board (checkpoint) -> items changed by rescan
+        self.rescans = {}
+        # KIID -> sorted list of revisions touching item
+        self.index = {}
+        # Segment -> JSON of checkpoint (least recently used first)
+        self.cache = {}
+
+        for i, base_seq in enumerate(self.segments):
+            # Checkpoint written after journal record has same sequence number as record, other checkpoints are
+            # rescans (first kept checkpoint has no previous revision to compare with)
+            if i and base_seq not in self.revisions:
+                self.indexRescan(base_seq)
+            for position, (seq, timestamp, diff) in enumerate(self.journals[base_seq]):
+                self.revisions[seq] = (base_seq, position)
+                self.times[seq] = timestamp
+                self.indexItems(seq, getDiffKIIDs(diff))
+
+    def indexItems(self, seq, items):
+        """Add revision to index of KIIDs of items"""
+        for key, kiid, action, changes in items:
+            revisions = self.index.setdefault(kiid, [])
+            if not revisions or revisions[-1] != seq:
+                revisions.append(seq)
+
+    def indexRescan(self, base_seq):
+        """Index checkpoint of rescanned board as revision (items compared with previous revision)"""
+        try:
+            items = getRescanKIIDs(self.getRevision(base_seq - 1), self.getCheckpoint(base_seq))
+        except ValueError:
+            return
+        self.rescans[base_seq] = items
+        self.times[base_seq] = os.path.getmtime(self.store.getCheckpointPath(base_seq))
+        self.indexItems(base_seq, items)
+
+    def getFirstRevision(self):
+        return self.segments[0] if self.segments else None
+
+    def getLatestRevision(self):
+        return max([self.segments[-1]] + list(self.revisions)) if self.segments else None
+
+    def getCheckpoint(self, base_seq):
+        """Returns new copy of pcb dictionary of checkpoint"""
+        payload = self.cache.pop(base_seq, None)
+        if payload is None:
+            payload = self.store.readCheckpointPayload(base_seq)
+            if payload is None:
+                raise ValueError(f"Checkpoint {base_seq} is missing or corrupted")
+        # Most recently used last
+        self.cache[base_seq] = payload
+        while len(self.cache) > self.cache_size:
+            self.cache.pop(next(iter(self.cache)))
+
+        pcb = decodeCheckpoint(payload)
+        if pcb is None:
+            raise ValueError(f"Checkpoint {base_seq} is corrupted")
+
+        return pcb
+
+    def getRevision(self, seq):
+        """
+        Returns pcb dictionary at revision (nearest checkpoint with diffs up to revision replayed)
+        :param seq: int (revision)
+        :return: dict
+        """
+        i = bisect.bisect_right(self.segments, seq) - 1
+        if i < 0:
+            raise ValueError(f"Revision {seq} is older than history ({self.getFirstRevision()})")
+        base_seq = self.segments[i]
+
+        pcb = self.getCheckpoint(base_seq)
+        for record_seq, timestamp, diff in self.journals[base_seq]:
+            if record_seq > seq:
+                break
+            applyDiffToSnapshot(pcb, diff)
+
+        return pcb
+
+    def findKIID(self, ref, seq=None):
+        """Returns KIID of footprint with reference (at revision, latest if not given), None if not found"""
+        pcb = self.getRevision(self.getLatestRevision() if seq is None else seq)
+        for footprint in pcb.get("footprints") or []:
+            if footprint.get("ref") == ref:
+                return footprint["kiid"]
+
+        return None
+
+    def getItemAt(self, kiid, seq):
+        """Returns item dictionary at revision, None if item did not exist"""
+        return getItem(self.getRevision(seq), kiid)[1]
+
+    def getItemHistory(self, kiid):
+        """
+        Returns list of changes of item (from index, without reconstructing revisions)
+        :return: list of dict {revision, time, action, changes}
+        """
+        history = []
+        for seq in self.index.get(kiid, []):
+            if seq in self.rescans:
+                items = self.rescans[seq]
+            else:
+                base_seq, position = self.revisions[seq]
+                items = getDiffKIIDs(self.journals[base_seq][position][2])
+            for key, item_kiid, action, changes in items:
+                if item_kiid == kiid:
+                    history.append({"revision": seq, "time": self.times[seq], "action": action, "changes": changes})
+
+        return history
+
+    def diffRevisions(self, seq_a, seq_b):
+        """
+        Returns items changed between two revisions
+        :return: dict of KIID -> (item at first revision, item at second revision), None if item did not exist
+        """
+        seq_a, seq_b = min(seq_a, seq_b), max(seq_a, seq_b)
+        kiids = {kiid for kiid, revisions in self.index.items()
+                 if bisect.bisect_right(revisions, seq_b) > bisect.bisect_right(revisions, seq_a)}
+        if not kiids:
+            return {}
+
+        pcb_a, pcb_b = self.getRevision(seq_a), self.getRevision(seq_b)
+        result = {}
+        for kiid in kiids:
+            item_a, item_b = getItem(pcb_a, kiid)[1], getItem(pcb_b, kiid)[1]
+            if normalizeValue(item_a) != normalizeValue(item_b):
+                result[kiid] = (item_a, item_b)
+
+        return result
+
+
+def formatTime(timestamp):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query revision history of board snapshots")
+    parser.add_argument("board", help=".kicad_pcb file (snapshot store is next to it)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("revisions", help="list revisions")
+
+    show = commands.add_parser("show", help="show board or item at revision")
+    show.add_argument("revision", type=int)
+    show.add_argument("--ref", help="footprint reference")
+    show.add_argument("--kiid")
+
+    history = commands.add_parser("history", help="list changes of item")
+    history.add_argument("--ref", help="footprint reference (at latest revision)")
+    history.add_argument("--kiid")
+
+    diff = commands.add_parser("diff", help="list items changed between two revisions")
+    diff.add_argument("revision_a", type=int)
+    diff.add_argument("revision_b", type=int)
+
+    args = parser.parse_args(argv)
+
+    board_history = BoardHistory(SnapshotStore(getStorePath(os.path.abspath(args.board))))
+    if board_history.getLatestRevision() is None:
+        print("No snapshot of board")
+        return
+
+    start = time.perf_counter()
+
+    if args.command == "revisions":
+        for base_seq in board_history.segments:
+            if base_seq in board_history.rescans:
+                print(f"{base_seq:>8}  {formatTime(board_history.times[base_seq])}  "
+                      f"{len(board_history.rescans[base_seq])} items  (rescan)")
+            else:
+                print(f"{base_seq:>8}  checkpoint")
+            for seq, timestamp, record_diff in board_history.journals[base_seq]:
+                print(f"{seq:>8}  {formatTime(timestamp)}  {len(getDiffKIIDs(record_diff))} items")
+
+    elif args.command == "show":
+        kiid = args.kiid or (board_history.findKIID(args.ref, args.revision) if args.ref else None)
+        if args.ref and not kiid:
+            print(f"No footprint {args.ref} at revision {args.revision}")
+        elif kiid:
+            print(json.dumps(board_history.getItemAt(kiid, args.revision), indent=4))
+        else:
+            print(json.dumps(board_history.getRevision(args.revision), indent=4))
+
+    elif args.command == "history":
+        kiid = args.kiid or board_history.findKIID(args.ref)
+        if not kiid:
+            print(f"No footprint {args.ref}")
+            return
+        for entry in board_history.getItemHistory(kiid):
+            print(f"{entry['revision']:>8}  {formatTime(entry['time'])}  {entry['action']}  "
+                  f"{json.dumps(entry['changes'])}")
+
+    elif args.command == "diff":
+        for kiid, (item_a, item_b) in board_history.diffRevisions(args.revision_a, args.revision_b).items():
+            name = (item_b or item_a).get("ref", kiid)
+            print(f"{name}:\n    {json.dumps(item_a)}\n -> {json.dumps(item_b)}")
+
+    print(f"({(time.perf_counter() - start) * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
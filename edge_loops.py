@@ -0,0 +1,101 @@
+"""
+    Building of closed board outline loops from Edge.Cuts drawings
+    Lines and arcs are connected by their endpoints (integer nanometres, hash map), so FreeCAD doesn't need
+    to search for connected geometries itself. Closed shapes (Rect, Polygon, Circle) are loops on their own.
+"""
+
+
+def getEndpoints(drawing):
+    """
+    Returns start and end point of open drawing (Line, Arc), None for closed shapes
+    :param drawing: drawing dictionary
+    :return: tuple of two (x, y) integer tuples or None
+    """
+    if drawing["shape"] == "Line":
+        start, end = drawing["start"], drawing["end"]
+    elif drawing["shape"] == "Arc":
+        start, end = drawing["points"][0], drawing["points"][-1]
+    else:
+        return None
+
+    return (int(start[0]), int(start[1])), (int(end[0]), int(end[1]))
+
+
+def annotateEdgeLoops(drawings):
+    """
+    Add "loop" entry to every drawing: {"id": loop ID, "seq": index in loop, "prev": KIID, "next": KIID,
+    "reversed": True if drawing is traversed from end to start}
+    prev/ next are None at ends of open loops.
+    :param drawings: list of drawing dictionaries (edited in place)
+    :return: list of problems: {"type": "open" or "ambiguous", "point": [x, y], "kiids": [KIID, ...]}
+    """
+    problems = []
+    # Endpoint -> list of (drawing index, side), side 0 is start, 1 is end
+    ends = {}
+    loop_id = 0
+    edges = []
+    for i, drawing in enumerate(drawings):
+        endpoints = getEndpoints(drawing)
+        if not endpoints:
+            # Closed shape is loop by itself
+            drawing["loop"] = {"id": loop_id,
+                               "seq": 0,
+                               "prev": drawing["kiid"],
+                               "next": drawing["kiid"],
+                               "reversed": False}
+            loop_id += 1
+            continue
+        edges.append(i)
+        for side, point in enumerate(endpoints):
+            ends.setdefault(point, []).append((i, side))
+
+    # Every endpoint of closed loop is shared by exactly two drawings
+    dangling = set()
+    for point, users in ends.items():
+        if len(users) == 2:
+            continue
+        problems.append({"type": "open" if len(users) == 1 else "ambiguous",
+                         "point": list(point),
+                         "kiids": [drawings[i]["kiid"] for i, side in users]})
+        dangling.update(users)
+
+    def getNeighbour(i, side):
+        """Returns (drawing index, side) connected to side of drawing i, None if not exactly one"""
+        users = ends[getEndpoints(drawings[i])[side]]
+        if len(users) != 2:
+            return None
+        return users[0] if users[1] == (i, side) else users[1]
+
+    # Start with drawings at ends of open loops, so open loops are walked from one end
+    starts = [i for i in edges if (i, 0) in dangling or (i, 1) in dangling] + edges
+    visited = set()
+    for start in starts:
+        if start in visited:
+            continue
+
+        # Walk away from dangling end
+        is_reversed = (start, 1) in dangling and (start, 0) not in dangling
+        chain = []
+        i = start
+        while True:
+            chain.append((i, is_reversed))
+            visited.add(i)
+            neighbour = getNeighbour(i, 0 if is_reversed else 1)
+            if not neighbour or neighbour[0] in visited:
+                break
+            i = neighbour[0]
+            # Entered at end of drawing -> drawing is traversed from end to start
+            is_reversed = neighbour[1] == 1
+        closed = bool(neighbour) and neighbour[0] == start
+
+        for seq, (i, is_reversed) in enumerate(chain):
+            prev_i = chain[seq - 1][0] if seq > 0 or closed else None
+            next_i = chain[(seq + 1) % len(chain)][0] if seq < len(chain) - 1 or closed else None
+            drawings[i]["loop"] = {"id": loop_id,
+                                   "seq": seq,
+                                   "prev": drawings[prev_i]["kiid"] if prev_i is not None else None,
+                                   "next": drawings[next_i]["kiid"] if next_i is not None else None,
+                                   "reversed": is_reversed}
+        loop_id += 1
+
+    return problems
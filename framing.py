@@ -0,0 +1,66 @@
+from tracing import span
+
+"""
+    Message framing of socket connection between KiCAD plugin and FreeCAD host
+    Every message is header (padded with spaces to HEADER bytes) followed by UTF-8 encoded JSON.
+    Header is "TYPE_length" for messages from KiCAD (PCB, DIF, !DIS) and "length" for messages from FreeCAD.
+    Same module is used by FreeCAD side (imported from plugin directory, see FCmacro/plugin_dir.py).
+"""
+
+# Header length in bytes: "PCB_" + up to 12 digits of message length
+HEADER = 16
+FORMAT = "utf-8"
+
+
+def packMessage(msg, msg_type=None, header_size=HEADER, encoding=FORMAT):
+    """
+    Returns header and encoded message as bytes
+    :param msg: string
+    :param msg_type: string or None (header contains only length)
+    :param header_size: int
+    :param encoding: string
+    :return: bytes
+    """
+    payload = msg.encode(encoding)
+    header = (f"{msg_type}_{len(payload)}" if msg_type else str(len(payload))).encode(encoding)
+    if len(header) > header_size:
+        raise ValueError(f"Message of {len(payload)} bytes does not fit header of {header_size} bytes")
+
+    return header + b" " * (header_size - len(header)) + payload
+
+
+def recvExact(sock, size):
+    """Returns exactly size bytes received from socket, None if connection was closed before"""
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1024 ** 2))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+
+    return b"".join(chunks)
+
+
+def recvMessage(sock, header_size=HEADER, encoding=FORMAT, typed=True):
+    """
+    Receive one message
+    :param sock: socket object
+    :param header_size: int
+    :param encoding: string
+    :param typed: bool (header contains message type)
+    :return: (type or None, message string), (None, None) if connection was closed
+    """
+    header = recvExact(sock, header_size)
+    if header is None:
+        return None, None
+    header = header.decode(encoding).strip()
+    msg_type, length = header.split("_", 1) if typed else (None, header)
+
+    # Only payload is traced (waiting for header is idle time)
+    with span("recvMessage", type=msg_type, bytes=int(length)):
+        payload = recvExact(sock, int(length))
+    if payload is None:
+        return None, None
+
+    return msg_type, payload.decode(encoding)
@@ -1,3 +1,5 @@
+import math
+
 from utils import relativeModelPath
 
 """
@@ -71,6 +73,33 @@ def getDrawingsData(drw):
         return edge
 
 
+def getFPExtents(fp):
+    """
+    Return footprint body extents in footprint coordinates (not rotated, relative to footprint position).
+    Courtyard is used if footprint has one, otherwise pads are used.
+    :param fp: pcbnew.FOOTPRINT object
+    :return: list [min_x, min_y, max_x, max_y] or None
+    """
+    boxes = [item.GetBoundingBox() for item in fp.GraphicalItems() if "CrtYd" in item.GetLayerName()]
+    if not boxes:
+        boxes = [pad.GetBoundingBox() for pad in fp.Pads()]
+    if not boxes:
+        return None
+
+    # Rotate corners of bounding boxes back by footprint orientation
+    angle = math.radians(fp.GetOrientationDegrees())
+    cos, sin = math.cos(angle), math.sin(angle)
+    xs, ys = [], []
+    for box in boxes:
+        for x in (box.GetX(), box.GetX() + box.GetWidth()):
+            for y in (box.GetY(), box.GetY() + box.GetHeight()):
+                dx, dy = x - fp.GetX(), y - fp.GetY()
+                xs.append(dx * cos - dy * sin)
+                ys.append(dx * sin + dy * cos)
+
+    return [int(min(xs)), int(min(ys)), int(max(xs)), int(max(ys))]
+
+
 def getFPData(fp):
     """
     Return dictionary of footprint properties
@@ -144,6 +173,8 @@ def getFPData(fp):
 
     # Add models to footprint dict
     footprint.update({"3d_models": model_list})
+    # Body extents (used for placeholders while models are loading)
+    footprint.update({"extents": getFPExtents(fp)})
 
     return footprint
 
@@ -4,9 +4,18 @@ import pickle
 import random
 import socket
 import threading
+import time
 import pcbnew
+import wx
 
 from pcbnew_functions import *
+from apply_diff_fncs import applyDiff
+from snapshot_store import SnapshotStore, getStorePath
+from pcb_digest import getPcbDigest
+from framing import packMessage, recvMessage
+import tracing
+import memory_report
+from payload_log import dumpPayload, summarizePayload
 from kc_2_fc_gui import Kc2FcGui
 
 logger = logging.getLogger(__name__)
@@ -29,6 +38,8 @@ class Kc2Fc(Kc2FcGui):
         self.brd = None
         self.pcb = None
         self.diff = {}
+        # Checkpoint + journal of pcb dictionary (see snapshot_store.py)
+        self.snapshot_store = None
 
     @staticmethod
     def updateDiffDict(key, value, diff_dict):
@@ -43,6 +54,79 @@ class Kc2Fc(Kc2FcGui):
             except KeyError:
                 pass
 
+    def logEdgeLoopProblems(self):
+        """Log open or ambiguous board outline loops found when scanning board"""
+        for problem in self.pcb["general"].get("edge_loop_problems") or []:
+            self.logger.log(logging.WARNING,
+                            f"[EDGE] {problem['type'].capitalize()} board outline at {problem['point']} "
+                            f"(drawings: {', '.join(problem['kiids'])})")
+
+    def openSnapshotStore(self):
+        """Open snapshot store of current board"""
+        if not self.snapshot_store:
+            self.snapshot_store = SnapshotStore(getStorePath(self.brd.GetFileName()))
+        return self.snapshot_store
+
+    def saveSnapshot(self, diff=None):
+        """Append diff to snapshot journal, write whole snapshot (rescanned board) as checkpoint if diff is not given"""
+        try:
+            with tracing.span("saveSnapshot", checkpoint=diff is None):
+                if diff is None:
+                    self.openSnapshotStore().writeCheckpoint(self.pcb, rescan=True)
+                else:
+                    self.openSnapshotStore().append(diff, self.pcb)
+        except OSError as e:
+            self.logger.log(logging.WARNING, f"[SNAPSHOT] Failed to save snapshot: {e}")
+
+    def onHostHello(self, hello):
+        """
+        Reply to hello from host (called on main thread): snapshot is refreshed from board first, if host has same
+        pcb as snapshot had (resumed session), only changes made since are sent, otherwise whole refreshed pcb
+        """
+        if not self.pcb:
+            return
+        # Trace events of both processes are merged by session ID of host
+        tracing.setSession(hello.get("trace_session"))
+
+        # Host can only have snapshot as it was before refresh
+        host_has_pcb = (hello.get("pcb_id") == self.pcb["general"]["pcb_id"]
+                        and hello.get("digest") == getPcbDigest(self.pcb))
+        # Changes made in pcbnew since snapshot was saved (pcb dictionary is updated, diff is journaled)
+        self.onButtonGetDiff(None)
+
+        if host_has_pcb:
+            self.logger.log(logging.INFO, f"Host has pcb {self.pcb['general']['pcb_name']} "
+                                          f"(version {hello.get('version')}), sending changes only")
+            if self.diff:
+                self.sendData(self.diff, msg_type="DIF")
+            return
+
+        self.logEdgeLoopProblems()
+        self.logger.log(logging.INFO, "Sending JSON")
+        self.sendData(self.pcb, msg_type="PCB")
+        # Refreshed pcb already contains changes of diff
+        self.diff = {}
+
+    def applyHostDiff(self, diff):
+        """Apply diff received from FreeCAD to board (called on main thread)"""
+        if not self.brd or not self.pcb:
+            self.logger.log(logging.WARNING, "[DIFF] No board scanned, diff from FreeCAD ignored")
+            return
+
+        start = time.perf_counter()
+        try:
+            missing, snapshot_diff = applyDiff(self.brd, self.pcb, diff)
+        except Exception as e:
+            self.logger.exception(e)
+            return
+        # Changes are applied directly, without undo step (see apply_diff_fncs.py)
+        self.logger.log(logging.INFO, f"[DIFF] Changes from FreeCAD applied in {time.perf_counter() - start:.3f} s "
+                                      f"(not undoable in KiCAD)")
+        if missing:
+            self.logger.log(logging.WARNING, f"[DIFF] Footprints not found on board: {', '.join(missing)}")
+        # Journal gets re-read footprints, so replayed snapshot is same as pcb dictionary
+        self.saveSnapshot(snapshot_diff)
+
     # --------------------------- UI Methods --------------------------- #
     # Overwrite this UI methods from parent class
     def onButtonConnect(self, event):
@@ -54,10 +138,16 @@ class Kc2Fc(Kc2FcGui):
             except Exception as e:
                 self.logger.exception(e)
 
-        # Get pcb (JSON)
+        # Get pcb (JSON): saved snapshot of board if there is one (refreshed from board when host sends hello,
+        # see onHostHello), otherwise scan board
         if not self.pcb:
             try:
-                self.pcb = getPcb(self.brd)
+                self.pcb = self.openSnapshotStore().load()
+                if self.pcb:
+                    self.logger.log(logging.INFO, f"Snapshot loaded: {self.pcb['general']['pcb_name']}")
+                else:
+                    self.pcb = getPcb(self.brd)
+                    self.saveSnapshot()
             except Exception as e:
                 self.logger.exception(e)
 
@@ -87,35 +177,49 @@ class Kc2Fc(Kc2FcGui):
     def onButtonSendMessage(self, event):
         if self.diff:
             self.logger.log(logging.INFO, "Sending diff")
-            self.sendMessage(json.dumps(self.diff), msg_type="DIF")
+            self.sendData(self.diff, msg_type="DIF")
         elif self.pcb:
+            self.logEdgeLoopProblems()
             self.logger.log(logging.INFO, "Sending JSON")
-            self.sendMessage(json.dumps(self.pcb), msg_type="PCB")
+            self.sendData(self.pcb, msg_type="PCB")
 
     def onButtonGetDiff(self, event):
 
         if self.pcb:
-            # TODO  general?
-            # Footprints
-            Kc2Fc.updateDiffDict(key="footprints",
-                                 value=getFootprints(self.brd, self.pcb),
-                                 diff_dict=self.diff)
-            # Drawings
-            Kc2Fc.updateDiffDict(key="drawings",
-                                 value=getPcbDrawings(self.brd, self.pcb),
-                                 diff_dict=self.diff)
-            # Vias
-            Kc2Fc.updateDiffDict(key="vias",
-                                 value=getVias(self.brd, self.pcb),
-                                 diff_dict=self.diff)
-
-            self.logger.log(logging.INFO, self.diff)
-
-            with open("differences.json", "w") as f:
-                json.dump(self.diff, f, indent=4)
-
-            with open("data_indent.json", "w") as f:
-                json.dump(self.pcb, f, indent=4)
+            with tracing.span("getDiff"):
+                # TODO  general?
+                # Footprints
+                Kc2Fc.updateDiffDict(key="footprints",
+                                     value=getFootprints(self.brd, self.pcb),
+                                     diff_dict=self.diff)
+                # Drawings
+                Kc2Fc.updateDiffDict(key="drawings",
+                                     value=getPcbDrawings(self.brd, self.pcb),
+                                     diff_dict=self.diff)
+                # Vias
+                Kc2Fc.updateDiffDict(key="vias",
+                                     value=getVias(self.brd, self.pcb),
+                                     diff_dict=self.diff)
+
+            self.logger.log(logging.INFO, f"[DIFF] {summarizePayload(self.diff)}")
+            dumpPayload("[DIFF]", self.diff)
+
+            # Only diff is written (pcb dictionary is already updated with it)
+            self.saveSnapshot(self.diff)
+
+    def onMemoryReport(self, event):
+        """Write memory report of plugin (allocations are sampled from first report on, see memory_report.py)"""
+        report = memory_report.buildReport({"pcb": self.pcb,
+                                            "pending_diff": self.diff,
+                                            "trace_events": tracing.getEvents()})
+        memory_report.startSampling()
+        try:
+            file_path = memory_report.writeReport(report)
+        except OSError as e:
+            self.logger.log(logging.WARNING, f"[MEMORY] Failed to write report: {e}")
+            return
+        self.logger.log(logging.INFO, memory_report.formatReport(report))
+        self.logger.log(logging.INFO, f"[MEMORY] Report written to {file_path}")
 
     def onButtonScanBoard(self, event):
 
@@ -131,8 +235,7 @@ class Kc2Fc(Kc2FcGui):
             self.logger.log(logging.INFO, f"Board scanned: {self.pcb.get('general').get('pcb_name')}")
             # self.logger.log(logging.INFO, self.pcb)
 
-        with open("data_indent.json", "w") as f:
-            json.dump(self.pcb, f, indent=4)
+        self.saveSnapshot()
 
     # --------------------------- Socket --------------------------- #
     def startSocket(self):
@@ -175,39 +278,43 @@ class Kc2Fc(Kc2FcGui):
             self.button_send_message.Enable(True)
             self.button_disconnect.Enable(True)
             self.logger.log(logging.INFO, f"[SOCKET] Connected to {self.host}:{self.port}")
-            # Send initial message
-            if self.pcb:
-                self.logger.log(logging.INFO, "Sending JSON")
-                self.sendMessage(json.dumps(self.pcb), msg_type="PCB")
+            # Host sends hello first (pcb it already has), pcb or diff is sent in reply (see onHostHello)
 
             # Start new thread for receiving messages
             threading.Thread(target=self.handleHost).start()
 
-    def handleHost(self):  # TODO update with new messaging protocol
+    def handleHost(self):
         """
         Worker thread for receiving messages from host
         """
         while self.connected:
             try:
-                # Receive first message
-                data_length = self.socket.recv(self.HEADER).decode(self.FORMAT)
-                # Check if anything was actually sent
-                if data_length:
-                    # Calculate length of second message
-                    data_length = int(data_length)
-                    # Receive and decode second message
-                    data_raw = self.socket.recv(data_length)
-                    data = json.loads(data_raw)
+                # Header from host contains only length of message
+                msg_type, data_raw = recvMessage(self.socket, self.HEADER, self.FORMAT, typed=False)
+                # Connection closed by host
+                if data_raw is None:
+                    self.connected = False
+                    self.logger.log(logging.INFO, "[SOCKET] Connection closed by host")
+                    tracing.flush()
+                    break
+                if data_raw:
+                    with tracing.span("json.loads", bytes=len(data_raw)):
+                        data = json.loads(data_raw)
                     # Check for disconnect message
                     if data == "!DISCONNECT":
                         self.connected = False
 
-                    # Receive dictionary - new pcb
+                    # Hello from host - pcb it already has
+                    elif type(data) is dict and "hello" in data:
+                        wx.CallAfter(self.onHostHello, data["hello"])
+
+                    # Receive dictionary - diff of changes made in FreeCAD, applied to board on main thread
                     elif type(data) is dict:
-                        self.new_pcb = data
-                        self.button_test.Enable(True)
+                        wx.CallAfter(self.applyHostDiff, data)
 
-                    self.logger.log(logging.INFO, f"[DATA] Message received from host: {data}")
+                    self.logger.log(logging.INFO, f"[DATA] Message received from host: "
+                                                  f"{summarizePayload(data, len(data_raw))}")
+                    dumpPayload("[DATA] Message received from host:", data)
 
             except OSError as e:
                 if e.errno == 10038:
@@ -221,15 +328,18 @@ class Kc2Fc(Kc2FcGui):
         self.button_disconnect.Enable(False)
         self.button_connect.Enable(True)
         self.logger.log(logging.INFO, "Socket closed")
+        tracing.flush()
+
+    def sendData(self, data, msg_type):
+        """Send dictionary (pcb or diff) as JSON"""
+        with tracing.span("json.dumps", type=msg_type) as span:
+            msg = json.dumps(data)
+            span.set(bytes=len(msg))
+        self.sendMessage(msg, msg_type=msg_type)
 
     def sendMessage(self, msg, msg_type="!DIS"):
-        # Calculate length of first message
-        msg_length = len(msg)
-        send_length = str(msg_length)
-        # First message is type and length of second message
-        first_message = f"{msg_type}_{send_length}".encode(self.FORMAT)
-        # Pad first message
-        first_message += b' ' * (self.HEADER - len(first_message))
-        # Send length and object
-        self.socket.send(first_message)
-        self.socket.send(msg.encode(self.FORMAT))
\ No newline at end of file
+        # Header is type and length of message (see framing.py)
+        with tracing.span("sendMessage", type=msg_type) as span:
+            data = packMessage(msg, msg_type, self.HEADER, self.FORMAT)
+            span.set(bytes=len(data))
+            self.socket.sendall(data)
\ No newline at end of file
@@ -1,9 +1,11 @@
 
+import collections
 import json
 import logging
 import pcbnew
 import pickle
 import random
+import threading
 import time
 import wx
 
@@ -16,13 +18,63 @@ SCALE = 1000000
 
 
 class WxTextCtrlHandler(logging.Handler):
-    def __init__(self, ctrl):
+    """
+    Log handler writing to TextCtrl in batches: records (from any thread) are buffered and appended on timer,
+    control keeps only last max_records records (ring buffer), so logging can't flood or freeze UI
+    """
+
+    def __init__(self, ctrl, max_records=2000, interval=100, max_pending=5000):
+        """
+        :param ctrl: wx.TextCtrl
+        :param max_records: int (number of records kept in control)
+        :param interval: int (ms between appends to control)
+        :param max_pending: int (records waiting for timer, oldest are dropped if there are more)
+        """
         logging.Handler.__init__(self)
         self.ctrl = ctrl
+        self.max_records = max_records
+        # Records shown in control, number of records written to control since it was last rebuilt
+        self.records = collections.deque(maxlen=max_records)
+        self.written = 0
+        self.pending = collections.deque(maxlen=max_pending)
+        self.dropped = 0
+        self.pending_lock = threading.Lock()
+
+        # Timer runs on main thread (handler is created in initUI)
+        self.timer = wx.Timer(ctrl)
+        ctrl.Bind(wx.EVT_TIMER, self.onTimer, self.timer)
+        self.timer.Start(interval)
 
     def emit(self, record):
         s = self.format(record) + '\n'
-        wx.CallAfter(self.ctrl.WriteText, s)
+        with self.pending_lock:
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+            self.pending.append(s)
+
+    def onTimer(self, event):
+        with self.pending_lock:
+            if not self.pending:
+                return
+            new_records, dropped = list(self.pending), self.dropped
+            self.pending.clear()
+            self.dropped = 0
+        if dropped:
+            new_records.insert(0, f"WARNING {dropped} log records dropped\n")
+
+        self.records.extend(new_records)
+        self.written += len(new_records)
+        # Control is rebuilt from ring buffer only when it holds twice as many records as kept
+        if self.written > 2 * self.max_records:
+            self.ctrl.SetValue("".join(self.records))
+            self.ctrl.SetInsertionPointEnd()
+            self.written = len(self.records)
+        else:
+            self.ctrl.AppendText("".join(new_records))
+
+    def close(self):
+        self.timer.Stop()
+        logging.Handler.close(self)
 
 
 # ================================== Main window ================================== #
@@ -41,7 +93,7 @@ class Kc2FcGui(wx.Frame):
         self.host = 'localhost'  # This can be changed by user
         self.port = self.STARTING_PORT  # This can be changed by user
         self.port_is_manual = False
-        self.HEADER = 8
+        self.HEADER = 16
         self.FORMAT = 'utf-8'
 
         self.temp = 0
@@ -60,9 +112,11 @@ class Kc2FcGui(wx.Frame):
         settings = self.file.Append(wx.ID_SETUP, "&Settings\tCtrl+S", "Open setting window")
         load = self.file.Append(wx.ID_FILE, "&Load\tCtrl+L", "Load test board")
         test = self.file.Append(wx.ID_ANY, "&Test\tCtrl+T")
+        memory = self.file.Append(wx.ID_ANY, "&Memory report\tCtrl+M", "Write memory report")
         self.Bind(wx.EVT_MENU, self.openSettings, settings)
         self.Bind(wx.EVT_MENU, self.loadBoard, load)
         self.Bind(wx.EVT_MENU, self.testFunction, test)
+        self.Bind(wx.EVT_MENU, self.onMemoryReport, memory)
         self.menubar.Append(self.file, "File")
         self.SetMenuBar(self.menubar)
 
@@ -188,6 +242,9 @@ class Kc2FcGui(wx.Frame):
     def onButtonGetDiff(self, event):
         pass
 
+    def onMemoryReport(self, event):
+        pass
+
     def openSettings(self, event):
         self.settingsWindow = SettingsWindow(title="Settings", parent=self)
 
@@ -0,0 +1,180 @@
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+"""
+    Opt-in memory report of KiCAD side of plugin and FreeCAD host
+    Python objects kept by process (pcb dictionary, pending diffs, trace events) are measured by deep size,
+    allocations are sampled with tracemalloc and grouped to categories by module which allocated them.
+    Sampling has overhead, so it is started only when KC2FC_MEMORY environment variable is set (number of traced
+    frames), or with first report requested from GUI (allocations made before that are not attributed).
+    Report is written as JSON to report directory (KC2FC_MEMORY_DIR, default in temp).
+    Same module is used by FreeCAD side (imported from plugin directory, see FCmacro/plugin_dir.py), which sets its
+    process name and module categories with setProcess (document accounting is in FCmacro/document_report.py).
+"""
+
+MEMORY_ENV = "KC2FC_MEMORY"
+REPORT_DIR = os.environ.get("KC2FC_MEMORY_DIR") or os.path.join(tempfile.gettempdir(), "kc2fc_memory")
+PROCESS_NAME = "KiCAD"
+# Module (file name without extension) -> category of allocations made in it, modules used by both sides
+COMMON_CATEGORIES = {"zlib": "snapshots",
+                     "framing": "message_buffers",
+                     "socket": "message_buffers",
+                     "encoder": "json",
+                     "decoder": "json",
+                     "tracing": "tracing"}
+# KiCAD side modules
+KICAD_CATEGORIES = {"pcbnew_functions": "pcb_dict",
+                    "get_pcb_data_fncs": "pcb_dict",
+                    "edge_loops": "pcb_dict",
+                    "apply_diff_fncs": "diffs",
+                    "snapshot_store": "snapshots",
+                    "board_history": "snapshots"}
+MODULE_CATEGORIES = {**KICAD_CATEGORIES, **COMMON_CATEGORIES}
+TOP_FILES = 20
+
+
+def setProcess(name, module_categories):
+    """
+    Set name of process in reports and categories of its modules (used by FreeCAD host)
+    :param name: string
+    :param module_categories: dict of module -> category (modules of process, common modules are added)
+    """
+    global PROCESS_NAME, MODULE_CATEGORIES
+    PROCESS_NAME = name
+    MODULE_CATEGORIES = {**module_categories, **COMMON_CATEGORIES}
+
+
+def startSampling(frames=1):
+    """Start tracemalloc sampling (if not started yet)"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def stopSampling():
+    tracemalloc.stop()
+
+
+def getDeepSize(obj):
+    """Returns size in bytes of object with all objects it contains (dictionaries, lists, tuples, sets)"""
+    seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+
+    return size
+
+
+def getCategory(file_name, module_categories):
+    """Returns category of allocation made in file"""
+    module = os.path.splitext(os.path.basename(file_name))[0]
+    return module_categories.get(module, "other")
+
+
+def getAllocations(module_categories=None, top=TOP_FILES):
+    """
+    Returns current traced allocations by category and by file, None if tracemalloc is not sampling
+    :return: dict {total, peak, categories: {category: {size, count}}, files: [{file, size, count}]}
+    """
+    if not tracemalloc.is_tracing():
+        return None
+    module_categories = module_categories or MODULE_CATEGORIES
+
+    snapshot = tracemalloc.take_snapshot()
+    snapshot = snapshot.filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+    statistics = snapshot.statistics("filename")
+
+    categories = {}
+    for stat in statistics:
+        category = categories.setdefault(getCategory(stat.traceback[0].filename, module_categories),
+                                         {"size": 0, "count": 0})
+        category["size"] += stat.size
+        category["count"] += stat.count
+
+    current, peak = tracemalloc.get_traced_memory()
+    return {"total": current,
+            "peak": peak,
+            "categories": dict(sorted(categories.items(), key=lambda item: -item[1]["size"])),
+            "files": [{"file": stat.traceback[0].filename, "size": stat.size, "count": stat.count}
+                      for stat in statistics[:top]]}
+
+
+def getPeakRss():
+    """Returns peak resident set size of process in bytes, None if not available (Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def buildReport(objects, extra=None):
+    """
+    Returns memory report dictionary
+    :param objects: dict of category -> Python object kept by plugin (measured by deep size)
+    :param extra: dict of additional report sections
+    :return: dict
+    """
+    report = {"process": PROCESS_NAME,
+              "pid": os.getpid(),
+              "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+              "peak_rss": getPeakRss(),
+              "objects": {name: getDeepSize(obj) for name, obj in objects.items() if obj is not None},
+              "allocations": getAllocations()}
+    report.update(extra or {})
+
+    return report
+
+
+def writeReport(report, report_dir=REPORT_DIR):
+    """Write report as JSON, returns file path"""
+    os.makedirs(report_dir, exist_ok=True)
+    file_path = os.path.join(report_dir, f"{PROCESS_NAME}_{report['pid']}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(file_path, "w") as f:
+        json.dump(report, f, indent=4)
+
+    return file_path
+
+
+def formatSize(size):
+    for unit in ("B", "kB", "MB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def formatReport(report):
+    """Returns short text summary of report (for log)"""
+    lines = [f"Memory report ({report['process']}), peak RSS "
+             f"{formatSize(report['peak_rss']) if report['peak_rss'] else 'unknown'}"]
+    for name, size in report["objects"].items():
+        lines.append(f"    {name}: {formatSize(size)}")
+    allocations = report.get("allocations")
+    if allocations:
+        lines.append(f"    traced: {formatSize(allocations['total'])} (peak {formatSize(allocations['peak'])})")
+        for name, category in allocations["categories"].items():
+            lines.append(f"        {name}: {formatSize(category['size'])} in {category['count']} blocks")
+    else:
+        lines.append("    allocations not sampled (sampling started now)")
+
+    return "\n".join(lines)
+
+
+if os.environ.get(MEMORY_ENV):
+    startSampling(int(os.environ[MEMORY_ENV]) if os.environ[MEMORY_ENV].isdigit() else 1)
@@ -0,0 +1,79 @@
+import json
+import logging
+import os
+
+"""
+    Logging of socket payloads (pcb, diffs, hello)
+    Log panel and console only get summary of payload (item counts and size), full payload is dumped as JSON
+    only to debug file, enabled by KC2FC_PAYLOAD_LOG environment variable (file path).
+    Same module is used by FreeCAD side (imported from plugin directory, see FCmacro/plugin_dir.py).
+"""
+
+PAYLOAD_LOG_ENV = "KC2FC_PAYLOAD_LOG"
+CATEGORIES = ("drawings", "footprints", "vias")
+# Longest text of payload which is not a dictionary (e.g. "!DISCONNECT")
+MAX_TEXT = 80
+
+# Not propagated to plugin logger, so dumps never reach log panel
+payload_logger = logging.getLogger("kc2fc.payload")
+payload_logger.propagate = False
+
+
+def formatSize(size):
+    for unit in ("B", "kB", "MB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def summarizePayload(data, size=None):
+    """
+    Returns short description of payload (counts of items instead of contents)
+    :param data: received or sent object (pcb dictionary, diff, hello, string)
+    :param size: int (size of message in bytes) or None
+    :return: string
+    """
+    size_text = f" ({formatSize(size)})" if size is not None else ""
+
+    if not isinstance(data, dict):
+        text = repr(data)
+        return (text if len(text) <= MAX_TEXT else text[:MAX_TEXT] + "...") + size_text
+
+    if "hello" in data:
+        hello = data["hello"] or {}
+        return f"hello: pcb {hello.get('pcb_id')}, version {hello.get('version')}" + size_text
+
+    if "general" in data:
+        counts = ", ".join(f"{len(data.get(key) or [])} {key}" for key in CATEGORIES)
+        return f"pcb {data['general'].get('pcb_name')}: {counts}" + size_text
+
+    parts = []
+    for key, category in data.items():
+        if key in CATEGORIES and isinstance(category, dict):
+            added = len(category.get("added") or [])
+            changed = sum(len(entry) for entry in category.get("changed") or [])
+            removed = len(category.get("removed") or [])
+            parts.append(f"{key} +{added} ~{changed} -{removed}")
+        else:
+            parts.append(key)
+
+    return "diff: " + (", ".join(parts) if parts else "empty") + size_text
+
+
+def dumpPayload(label, data):
+    """Write whole payload to debug file (only if payload dumps are enabled)"""
+    if payload_logger.isEnabledFor(logging.DEBUG):
+        payload_logger.debug("%s %s", label, json.dumps(data))
+
+
+def enablePayloadDump(file_path):
+    """Dump full payloads to file"""
+    handler = logging.FileHandler(file_path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    payload_logger.addHandler(handler)
+    payload_logger.setLevel(logging.DEBUG)
+
+
+if os.environ.get(PAYLOAD_LOG_ENV):
+    enablePayloadDump(os.environ[PAYLOAD_LOG_ENV])
@@ -0,0 +1,46 @@
+import hashlib
+import json
+
+"""
+    Digest of pcb dictionary, computed by both sides to find out if FreeCAD host has same pcb as KiCAD snapshot
+    Values are normalised first (per item hashes removed, nm as integers, angles in [0, 360)), so float noise of
+    either side doesn't change digest.
+    Single module used by both sides, FreeCAD side imports it from plugin directory (see FCmacro/plugin_dir.py).
+"""
+
+# Keys of values in nm and in degrees (normalised before computing digest)
+NM_KEYS = ("pos", "pos_delta", "center", "start", "end", "radius", "hole_size", "points", "extents", "thickness")
+ANGLE_KEYS = ("rot",)
+
+
+def normalizeValue(value, key=None):
+    """
+    Returns value as hashed in digest: per item hashes removed, nm values as integers, angles rounded and
+    normalised to [0, 360), other numbers rounded (same pcb gets same digest on both sides despite float noise)
+    :param value: pcb dictionary or any value in it
+    :param key: string (dictionary key of value)
+    """
+    if isinstance(value, dict):
+        return {k: normalizeValue(v, k) for k, v in value.items() if k != "hash"}
+    if isinstance(value, (list, tuple)):
+        return [normalizeValue(v, key) for v in value]
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return value
+
+    if key in NM_KEYS:
+        return int(round(value))
+    if key in ANGLE_KEYS:
+        value = round(value % 360, 3) % 360
+    else:
+        value = round(value, 6)
+    # 90.0 and 90, -0.0 and 0 are same value
+    return int(value) if value == int(value) else value
+
+
+def getPcbDigest(pcb):
+    """
+    Returns digest of pcb dictionary (canonical JSON without per item hashes, which are not sent with diffs)
+    Same digest is computed by FreeCAD host (FCmacro/pcb_state.py) to find out if it has same pcb
+    """
+    data = json.dumps(normalizeValue(pcb), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
@@ -1,13 +1,17 @@
 import random
+from edge_loops import annotateEdgeLoops
 from get_pcb_data_fncs import getDrawingsData, getFPData, getViaData
+from tracing import traced
 from utils import getDictEntryByKIID, relativeModelPath
 
 
-def getPcb(brd, pcb=None):
+@traced()
+def getPcb(brd, pcb=None, edge_loops=True):
     """
     Create a dictionary with PCB elements and properties
     :param pcb: dict
     :param brd: pcbnew.Board object
+    :param edge_loops: bool (annotate drawings with board outline loops, see edge_loops.py)
     :return: dict
     """
 
@@ -39,9 +43,17 @@ def getPcb(brd, pcb=None):
            "vias": getVias(brd, pcb)["added"]
            }
 
+    if edge_loops and pcb["drawings"]:
+        # Order board outline into loops, so FreeCAD can connect geometries without searching
+        problems = annotateEdgeLoops(pcb["drawings"])
+        general_data.update({"edge_loops": True})
+        # Open or ambiguous loops are reported before pcb is sent (see Kc2Fc.logEdgeLoopProblems)
+        general_data.update({"edge_loop_problems": problems})
+
     return pcb
 
 
+@traced()
 def getPcbDrawings(brd, pcb):
     """
     Returns three keyword dictionary: added - changed - removed
@@ -102,8 +114,13 @@ def getPcbDrawings(brd, pcb):
                     # Check all properties of drawing (keys), if same as in old dictionary -> skip
                     if value == drawing_old[key]:
                         continue
-                    # Add diff to list
-                    drawing_diffs.append([key, value])
+                    # Rect/ Polygon with same number of vertices: send only moved vertices
+                    if key == "points" and drawing_new["shape"] in ("Rect", "Polygon") \
+                            and len(value) == len(drawing_old[key]):
+                        drawing_diffs.append([key, getPointsDiff(drawing_old[key], value)])
+                    else:
+                        # Add diff to list
+                        drawing_diffs.append([key, value])
                     # Update old dictionary
                     drawing_old.update({key: value})
 
@@ -142,6 +159,20 @@ def getPcbDrawings(brd, pcb):
     return result
 
 
+def getPointsDiff(points_old, points_new):
+    """
+    Returns diff of vertex lists with same length: indexes and new positions of moved vertices
+    {"changed": [[index, [x, y]], ...], "count": number of vertices}
+    :param points_old: list of [x, y]
+    :param points_new: list of [x, y]
+    :return: dict
+    """
+    changed = [[i, p] for i, (p_old, p) in enumerate(zip(points_old, points_new)) if p != p_old]
+
+    return {"changed": changed, "count": len(points_new)}
+
+
+@traced()
 def getFootprints(brd, pcb):
     """
     Returns three keyword dictionary: added - changed - removed
@@ -203,8 +234,16 @@ def getFootprints(brd, pcb):
                     # Skip if same (no diffs)
                     continue
 
+                # 3D models: diff models by model_id, so FreeCAD only updates changed models
+                if key == "3d_models":
+                    model_diffs = getModelDiffs(footprint_old[key], value)
+                    if model_diffs:
+                        fp_diffs.append([key, model_diffs])
+                    # Update pcb dictionary
+                    footprint_old.update({key: value})
+
                 #  Base layer diff e.g. position, rotation, ref... ect
-                if key != "pads_pth":
+                elif key != "pads_pth":
                     # Add diff to list
                     fp_diffs.append([key, value])
                     # Update pcb dictionary
@@ -287,6 +326,42 @@ def getFootprints(brd, pcb):
     return result
 
 
+def getModelDiffs(models_old, models_new):
+    """
+    Returns three keyword dictionary of 3D model diffs (by model_id): added - changed - removed
+    Changed models are listed as {model_id: [[property, new value], ...]}
+    :param models_old: list of model dictionaries or None
+    :param models_new: list of model dictionaries or None
+    :return: dict
+    """
+    old = {model["model_id"]: model for model in models_old or []}
+    new = {model["model_id"]: model for model in models_new or []}
+
+    added, changed, removed = [], [], []
+    for model_id, model in new.items():
+        if model_id not in old:
+            added.append(model)
+            continue
+        model_diffs = [[key, value] for key, value in model.items() if value != old[model_id].get(key)]
+        if model_diffs:
+            changed.append({model_id: model_diffs})
+
+    for model_id in old:
+        if model_id not in new:
+            removed.append(model_id)
+
+    result = {}
+    if added:
+        result.update({"added": added})
+    if changed:
+        result.update({"changed": changed})
+    if removed:
+        result.update({"removed": removed})
+
+    return result
+
+
+@traced()
 def getVias(brd, pcb):
     """
     Returns three keyword dictionary: added - changed - removed
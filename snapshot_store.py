@@ -0,0 +1,315 @@
+import argparse
+import copy
+import json
+import os
+import struct
+import time
+import zlib
+
+from utils import patchPoints
+
+"""
+    Persistent store of pcb dictionary (snapshot) for KiCAD side of plugin
+    Snapshot is saved as compressed JSON checkpoint, every diff after it is appended to journal as record with
+    sequence number, time and CRC. Scanning board then only writes size of diff. Every CHECKPOINT_INTERVAL records
+    new segment (checkpoint + journal) is started, older segments are kept for revision history (board_history.py).
+    Files are replaced atomically, torn journal tail (e.g. crash while appending) is dropped when loading.
+    Loading replays journal on top of latest checkpoint.
+"""
+
+CHECKPOINT_PREFIX = "checkpoint_"
+JOURNAL_PREFIX = "journal_"
+# Checkpoints are JSON (not pickle, store is shared with project files), older pickled checkpoints are not read
+CHECKPOINT_MAGIC = b"KC2FCCP2"
+# Checkpoint header: sequence number of last diff included, CRC32 of payload
+CHECKPOINT_HEADER = struct.Struct(">QI")
+# Journal record header: payload length, CRC32 of payload, sequence number, time of record
+RECORD_HEADER = struct.Struct(">IIQd")
+CHECKPOINT_INTERVAL = 100
+MAX_SEGMENTS = 50
+
+
+def decodeCheckpoint(payload):
+    """Returns pcb dictionary from JSON payload of checkpoint, None if payload is not valid"""
+    try:
+        return json.loads(payload.decode("utf-8"))
+    except ValueError:
+        return None
+
+
+def getStorePath(board_file):
+    """
+    Returns directory of snapshot store of board (next to board file, current directory if board is not saved)
+    :param board_file: string (path of .kicad_pcb file)
+    """
+    board_dir = os.path.dirname(board_file) if board_file else os.getcwd()
+    board_name = os.path.splitext(os.path.basename(board_file))[0] if board_file else "Unknown"
+
+    return os.path.join(board_dir or os.getcwd(), ".kc2fc_snapshots", board_name)
+
+
+def writeAtomic(file_path, data):
+    """Write bytes to temporary file and replace file with it, so file is never half written"""
+    temp_path = file_path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, file_path)
+
+
+def applyModelDiffs(models, model_diffs):
+    """
+    Returns list of 3D models with model diffs applied
+    :param models: list of model dictionaries or None
+    :param model_diffs: dict with added (models), changed ({model_id: [[prop, value], ...]}), removed (model_ids)
+    :return: list or None
+    """
+    models = {model["model_id"]: model for model in models or []}
+    for model in model_diffs.get("added") or []:
+        models[model["model_id"]] = model
+    for entry in model_diffs.get("changed") or []:
+        for model_id, changes in entry.items():
+            if model_id in models:
+                models[model_id].update({prop: value for prop, value in changes})
+    for model_id in model_diffs.get("removed") or []:
+        models.pop(model_id, None)
+
+    return [models[model_id] for model_id in sorted(models)] or None
+
+
+def applyPropertyChange(prop, old, new):
+    """Returns new value of property of snapshot item from value in diff"""
+    # Moved vertices of Rect/ Polygon
+    if prop == "points" and type(new) is dict:
+        return patchPoints(old, new)
+    # Per model diff
+    if prop == "3d_models" and type(new) is dict:
+        return applyModelDiffs(old, new)
+    # Changed pads
+    if prop == "pads_pth" and old:
+        pads = {pad["kiid"]: pad for pad in old}
+        for entry in new:
+            for pad_kiid, changes in entry.items():
+                if pad_kiid in pads:
+                    pads[pad_kiid].update({pad_prop: value for pad_prop, value in changes})
+        return old
+
+    return new
+
+
+def applyDiffToSnapshot(pcb, diff):
+    """
+    Apply diff (format sent to FreeCAD) to pcb dictionary, edited in place
+    :param pcb: dict
+    :param diff: dict
+    """
+    for key in ("drawings", "footprints", "vias"):
+        category = diff.get(key)
+        if not category:
+            continue
+        items = pcb.get(key) or []
+
+        for item in category.get("added") or []:
+            items.append(copy.deepcopy(item))
+
+        index = {item["kiid"]: item for item in items}
+        for entry in category.get("changed") or []:
+            for kiid, changes in entry.items():
+                item = index.get(kiid)
+                if not item:
+                    continue
+                for prop, value in changes:
+                    item[prop] = applyPropertyChange(prop, item.get(prop), copy.deepcopy(value))
+
+        removed = set(category.get("removed") or [])
+        if removed:
+            items = [item for item in items if item["kiid"] not in removed]
+
+        pcb[key] = items
+
+
+class SnapshotStore:
+
+    def __init__(self, path, checkpoint_interval=CHECKPOINT_INTERVAL, max_segments=MAX_SEGMENTS):
+        """
+        :param path: string (store directory path)
+        :param checkpoint_interval: int (number of journal records after which new checkpoint is written)
+        :param max_segments: int (number of kept segments - checkpoint with its journal, older are deleted)
+        """
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+        self.max_segments = max_segments
+        # Sequence number of last written diff, sequence number of current checkpoint, number of records in journal
+        self.seq = 0
+        self.base_seq = 0
+        self.records = 0
+        os.makedirs(self.path, exist_ok=True)
+        self.recover()
+
+    def getCheckpointPath(self, seq):
+        return os.path.join(self.path, f"{CHECKPOINT_PREFIX}{seq:010d}.bin")
+
+    def getJournalPath(self, seq):
+        return os.path.join(self.path, f"{JOURNAL_PREFIX}{seq:010d}.bin")
+
+    def getSegments(self):
+        """Returns sorted list of sequence numbers of checkpoints (each segment is checkpoint + journal after it)"""
+        segments = []
+        for file_name in os.listdir(self.path):
+            if file_name.startswith(CHECKPOINT_PREFIX) and file_name.endswith(".bin"):
+                try:
+                    segments.append(int(file_name[len(CHECKPOINT_PREFIX):-len(".bin")]))
+                except ValueError:
+                    pass
+
+        return sorted(segments)
+
+    def writeCheckpoint(self, pcb, rescan=False):
+        """
+        Write whole snapshot as checkpoint of current sequence number and start new (empty) journal segment
+        :param pcb: dict
+        :param rescan: bool (snapshot is rescanned board, not journal replayed: it is new revision with its own
+                       sequence number, so it doesn't replace revision of last record or previous checkpoint)
+        """
+        if rescan:
+            self.seq += 1
+        payload = zlib.compress(json.dumps(pcb, separators=(",", ":")).encode("utf-8"))
+        writeAtomic(self.getCheckpointPath(self.seq),
+                    CHECKPOINT_MAGIC + CHECKPOINT_HEADER.pack(self.seq, zlib.crc32(payload)) + payload)
+        writeAtomic(self.getJournalPath(self.seq), b"")
+        self.base_seq = self.seq
+        self.records = 0
+
+        # Delete oldest segments
+        segments = self.getSegments()
+        for seq in segments[:max(len(segments) - self.max_segments, 0)]:
+            for file_path in (self.getCheckpointPath(seq), self.getJournalPath(seq)):
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+
+    def append(self, diff, pcb=None):
+        """
+        Append diff to journal
+        :param diff: dict
+        :param pcb: dict (snapshot with diff applied, new segment is started when journal is long enough)
+        """
+        if not diff:
+            return
+        self.seq += 1
+
+        payload = json.dumps(diff, separators=(",", ":")).encode("utf-8")
+        with open(self.getJournalPath(self.base_seq), "ab") as f:
+            f.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload), self.seq, time.time()) + payload)
+            f.flush()
+            os.fsync(f.fileno())
+        self.records += 1
+
+        if pcb is not None and self.records >= self.checkpoint_interval:
+            self.writeCheckpoint(pcb)
+
+    def readCheckpoint(self, seq):
+        """Returns pcb dictionary of checkpoint, None if checkpoint is missing or not valid"""
+        payload = self.readCheckpointPayload(seq)
+        if payload is None:
+            return None
+
+        return decodeCheckpoint(payload)
+
+    def readCheckpointPayload(self, seq):
+        """Returns JSON (decompressed) of pcb dictionary of checkpoint, None if checkpoint is missing or not valid"""
+        try:
+            with open(self.getCheckpointPath(seq), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        header_size = len(CHECKPOINT_MAGIC) + CHECKPOINT_HEADER.size
+        if len(data) < header_size or not data.startswith(CHECKPOINT_MAGIC):
+            return None
+        checkpoint_seq, crc = CHECKPOINT_HEADER.unpack_from(data, len(CHECKPOINT_MAGIC))
+        payload = data[header_size:]
+        if checkpoint_seq != seq or zlib.crc32(payload) != crc:
+            return None
+        try:
+            return zlib.decompress(payload)
+        except zlib.error:
+            return None
+
+    def readJournal(self, seq):
+        """
+        Returns list of (sequence number, time, diff) of valid records in journal of segment
+        and length of valid part of journal. Reading stops at first incomplete or corrupted record.
+        """
+        try:
+            with open(self.getJournalPath(seq), "rb") as f:
+                data = f.read()
+        except OSError:
+            return [], 0
+
+        records, offset = [], 0
+        while offset + RECORD_HEADER.size <= len(data):
+            length, crc, record_seq, timestamp = RECORD_HEADER.unpack_from(data, offset)
+            payload = data[offset + RECORD_HEADER.size:offset + RECORD_HEADER.size + length]
+            if len(payload) != length or zlib.crc32(payload) != crc:
+                break
+            records.append((record_seq, timestamp, json.loads(payload.decode("utf-8"))))
+            offset += RECORD_HEADER.size + length
+
+        return records, offset
+
+    def recover(self):
+        """Continue after last valid record of latest segment (torn tail of journal is dropped)"""
+        segments = self.getSegments()
+        if not segments:
+            return
+        self.base_seq = segments[-1]
+        records, valid_length = self.readJournal(self.base_seq)
+        self.seq = records[-1][0] if records else self.base_seq
+        self.records = len(records)
+
+        journal_path = self.getJournalPath(self.base_seq)
+        if os.path.exists(journal_path) and os.path.getsize(journal_path) != valid_length:
+            with open(journal_path, "r+b") as f:
+                f.truncate(valid_length)
+
+    def load(self):
+        """
+        Returns snapshot (latest valid checkpoint with its journal replayed), None if store has no checkpoint
+        :return: dict or None
+        """
+        for base_seq in reversed(self.getSegments()):
+            pcb = self.readCheckpoint(base_seq)
+            if pcb is not None:
+                break
+        else:
+            return None
+
+        for record_seq, timestamp, diff in self.readJournal(base_seq)[0]:
+            applyDiffToSnapshot(pcb, diff)
+
+        return pcb
+
+
+def main(argv=None):
+    """
+    Export snapshot (checkpoint with journal replayed) as JSON file, e.g. for tools in FCmacro:
+        python snapshot_store.py <board>.kicad_pcb -o data_indent.json
+    """
+    parser = argparse.ArgumentParser(description="Export pcb snapshot of board as JSON")
+    parser.add_argument("board", help=".kicad_pcb file (snapshot store is next to it)")
+    parser.add_argument("-o", "--output", default="data_indent.json")
+    args = parser.parse_args(argv)
+
+    pcb = SnapshotStore(getStorePath(os.path.abspath(args.board))).load()
+    if pcb is None:
+        print("No snapshot of board")
+        return
+
+    with open(args.output, "w") as f:
+        json.dump(pcb, f, indent=4)
+    print(f"Snapshot exported to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
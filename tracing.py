@@ -0,0 +1,278 @@
+import argparse
+import atexit
+import functools
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+"""
+    Lightweight tracing of sync phases, exported as Chrome trace events (chrome://tracing, Perfetto)
+    Enabled by KC2FC_TRACE environment variable (trace directory, or 1 for default directory in temp), when
+    disabled span() returns shared no-op object and traced functions only check one flag.
+    KiCAD and FreeCAD share session ID (FreeCAD host sends its ID with hello), each process writes its own
+    trace file to trace directory, files of session are merged with:
+        python tracing.py merge <trace directory> [--session ID] -o trace.json
+    Same module is used by FreeCAD side (imported from plugin directory, see FCmacro/plugin_dir.py), which sets its
+    process name with setProcessName.
+"""
+
+TRACE_ENV = "KC2FC_TRACE"
+DEFAULT_TRACE_DIR = os.path.join(tempfile.gettempdir(), "kc2fc_traces")
+PROCESS_NAME = "KiCAD"
+# Events above limit are dropped (counted in trace file)
+MAX_EVENTS = 200000
+# Offset of perf_counter to wall clock, so timestamps of both processes are comparable
+CLOCK_OFFSET = time.time() - time.perf_counter()
+
+_enabled = False
+_trace_dir = None
+_session = uuid.uuid4().hex[:12]
+_events = []
+_dropped = 0
+_files_written = 0
+_thread_names = {}
+_lock = threading.Lock()
+
+
+def getTimestamp():
+    """Returns wall clock time in microseconds (perf_counter resolution)"""
+    return (time.perf_counter() + CLOCK_OFFSET) * 1e6
+
+
+class Span:
+    """Records complete ("X") trace event of code block"""
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.start = None
+
+    def set(self, **args):
+        """Add arguments to event (e.g. size of data known only at the end of block)"""
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = getTimestamp()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = getTimestamp()
+        if exc_type:
+            self.args["error"] = exc_type.__name__
+        addEvent({"name": self.name, "ph": "X", "ts": self.start, "dur": end - self.start, "args": self.args})
+        return False
+
+
+class NullSpan:
+    """Span used when tracing is disabled"""
+    __slots__ = ()
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+def isEnabled():
+    return _enabled
+
+
+def enable(trace_dir=None):
+    """Start recording events, trace files are written to trace_dir"""
+    global _enabled, _trace_dir
+    _trace_dir = trace_dir or DEFAULT_TRACE_DIR
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def setProcessName(name):
+    """Set name of process in trace files (KiCAD or FreeCAD)"""
+    global PROCESS_NAME
+    PROCESS_NAME = name
+
+
+def getSession():
+    return _session
+
+
+def setSession(session):
+    """Use session ID of other process (events not written yet are written under this session)"""
+    global _session
+    if session:
+        _session = session
+
+
+def getEvents():
+    """Returns list of recorded events not written to trace file yet"""
+    return _events
+
+
+def addEvent(event):
+    global _dropped
+    if len(_events) >= MAX_EVENTS:
+        _dropped += 1
+        return
+    thread = threading.current_thread()
+    event["pid"] = os.getpid()
+    event["tid"] = thread.ident
+    _thread_names[thread.ident] = thread.name
+    # list.append is atomic, events are recorded from socket and GUI threads
+    _events.append(event)
+
+
+def span(name, **args):
+    """
+    Returns context manager recording duration of code block:
+        with span("json.dumps") as s:
+            data = json.dumps(pcb)
+            s.set(bytes=len(data))
+    """
+    if not _enabled:
+        return NULL_SPAN
+    return Span(name, args)
+
+
+def traced(name=None):
+    """Decorator recording every call of function as span"""
+    def decorator(function):
+        span_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with Span(span_name, {}):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def instant(name, **args):
+    """Record instant event (e.g. message received)"""
+    if _enabled:
+        addEvent({"name": name, "ph": "i", "s": "t", "ts": getTimestamp(), "args": args})
+
+
+def flush():
+    """
+    Write recorded events to new trace file of session in trace directory
+    :return: string (file path) or None if there is nothing to write
+    """
+    global _events, _dropped, _files_written
+    if not _enabled or not _events:
+        return None
+
+    with _lock:
+        events, dropped = _events, _dropped
+        _events, _dropped = [], 0
+        _files_written += 1
+        pid = os.getpid()
+        file_path = os.path.join(_trace_dir, f"{_session}_{PROCESS_NAME}_{pid}_{_files_written}.json")
+
+        metadata = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": PROCESS_NAME}}]
+        metadata += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread_name}}
+                     for tid, thread_name in list(_thread_names.items())]
+
+        try:
+            os.makedirs(_trace_dir, exist_ok=True)
+            with open(file_path, "w") as f:
+                json.dump({"traceEvents": metadata + events,
+                           "otherData": {"session": _session, "process": PROCESS_NAME, "dropped": dropped}}, f)
+        except OSError as e:
+            print(f"[TRACE] Failed to write trace: {e}")
+            return None
+
+    return file_path
+
+
+def getTraceFiles(paths, session=None):
+    """
+    Returns trace files of session (latest session if not given)
+    :param paths: list of trace files or directories
+    :param session: string or None
+    :return: (session, list of file paths)
+    """
+    files = []
+    for path in paths:
+        files += sorted(glob.glob(os.path.join(path, "*.json"))) if os.path.isdir(path) else [path]
+
+    traces = []
+    for file_path in files:
+        try:
+            with open(file_path, "r") as f:
+                trace = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if isinstance(trace, dict) and "traceEvents" in trace:
+            traces.append((os.path.getmtime(file_path), trace.get("otherData", {}).get("session"), file_path))
+
+    if not traces:
+        return session, []
+    if session is None:
+        session = max(traces)[1]
+
+    return session, [file_path for mtime, trace_session, file_path in traces if trace_session == session]
+
+
+def mergeTraces(file_paths, session=None):
+    """Returns Chrome trace dictionary with events of all trace files"""
+    events, dropped = [], 0
+    for file_path in file_paths:
+        with open(file_path, "r") as f:
+            trace = json.load(f)
+        events += trace["traceEvents"]
+        dropped += trace.get("otherData", {}).get("dropped", 0)
+
+    # Metadata first, then events in time order
+    events.sort(key=lambda event: (event["ph"] != "M", event.get("ts", 0)))
+
+    return {"traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"session": session, "files": len(file_paths), "dropped": dropped}}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge trace files of KiCAD and FreeCAD into one Chrome trace")
+    commands = parser.add_subparsers(dest="command", required=True)
+    merge = commands.add_parser("merge", help="merge trace files of session")
+    merge.add_argument("paths", nargs="*", default=[DEFAULT_TRACE_DIR], help="trace files or directories")
+    merge.add_argument("--session", default=None, help="session ID (latest session by default)")
+    merge.add_argument("-o", "--output", default="trace.json")
+    args = parser.parse_args(argv)
+
+    session, file_paths = getTraceFiles(args.paths, args.session)
+    if not file_paths:
+        print("No trace files found")
+        return
+
+    with open(args.output, "w") as f:
+        json.dump(mergeTraces(file_paths, session), f)
+    print(f"Session {session}: {len(file_paths)} trace files merged to {args.output} "
+          f"(open in chrome://tracing or ui.perfetto.dev)")
+
+
+if os.environ.get(TRACE_ENV):
+    enable(None if os.environ[TRACE_ENV].lower() in ("1", "true", "yes") else os.environ[TRACE_ENV])
+    atexit.register(flush)
+
+
+if __name__ == "__main__":
+    main()
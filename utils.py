@@ -22,4 +22,18 @@ def getDictEntryByKIID(list, kiid):
             if entry["kiid"] == kiid:
                 result = entry
 
-    return result
\ No newline at end of file
+    return result
+
+
+def patchPoints(points, points_diff):
+    """
+    Returns copy of vertex list with moved vertices from points diff
+    :param points: list of [x, y]
+    :param points_diff: dict {"changed": [[index, [x, y]], ...], "count": number of vertices}
+    :return: list of [x, y]
+    """
+    points = [list(p) for p in points]
+    for i, p in points_diff["changed"]:
+        points[i] = p
+
+    return points